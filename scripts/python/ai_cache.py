@@ -0,0 +1,198 @@
+"""
+AI Parse Result Cache
+
+Persistent, content-addressed cache for invoice data extracted by Claude AI.
+Entries are keyed by SHA-256 of the normalized invoice text, the model name
+and the prompt version, so re-processing the same PDFs costs no API calls.
+
+The cache is a single SQLite file, safe to share between threads and
+between worker processes of a batch run.
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from logging_config import get_logger
+
+# Initialize logger
+logger = get_logger(__name__)
+
+DEFAULT_AI_CACHE_PATH = "cache/ai_parse_cache.sqlite3"
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600  # 30 days
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_EVICT_INTERVAL = 100  # writes between eviction passes
+
+
+def normalize_text(text: str) -> str:
+    """Normalize extracted text so insignificant whitespace does not change the key."""
+    lines = (re.sub(r'[ \t]+', ' ', line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def make_cache_key(text: str, model: str, prompt_version: str) -> str:
+    """Build the content-addressed key for an AI parse request."""
+    digest = hashlib.sha256()
+    digest.update(model.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(prompt_version.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(normalize_text(text).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class AIParseCache:
+    """SQLite-backed cache of AI parse results with TTL and size eviction."""
+
+    def __init__(
+        self,
+        db_path: str = DEFAULT_AI_CACHE_PATH,
+        ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS,
+        max_entries: Optional[int] = DEFAULT_MAX_ENTRIES,
+        evict_interval: int = DEFAULT_EVICT_INTERVAL
+    ):
+        """Open (and create if needed) the cache database.
+
+        Args:
+            db_path: Path to the SQLite file
+            ttl_seconds: Entries older than this are treated as missing and evicted.
+                         None disables expiry.
+            max_entries: Least recently used entries beyond this count are evicted.
+                         None disables size eviction.
+            evict_interval: Evict on this process's first write, then every this many
+                            writes; between passes the table may exceed max_entries
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.evict_interval = max(1, evict_interval)
+        self._writes_until_evict = 1
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS ai_parse_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                value TEXT NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_ai_parse_cache_last_access ON ai_parse_cache (last_access)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_ai_parse_cache_created_at ON ai_parse_cache (created_at)"
+        )
+        self._conn.commit()
+
+    def get(self, text: str, model: str, prompt_version: str) -> Optional[Dict]:
+        """Return the cached invoice data for this request, or None on a miss."""
+        key = make_cache_key(text, model, prompt_version)
+        now = time.time()
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT created_at, value FROM ai_parse_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is not None and self.ttl_seconds is not None and now - row[0] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM ai_parse_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.evictions += 1
+                row = None
+
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._conn.execute("UPDATE ai_parse_cache SET last_access = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+
+        logger.info(
+            "AI parse cache hit" if row is not None else "AI parse cache miss",
+            extra={'extra_fields': {
+                'cache_key': key,
+                'model': model,
+                'prompt_version': prompt_version,
+                **self.stats(),
+                'event_type': 'ai_cache_hit' if row is not None else 'ai_cache_miss'
+            }}
+        )
+        return json.loads(row[1]) if row is not None else None
+
+    def put(self, text: str, model: str, prompt_version: str, invoice_data: Dict):
+        """Store invoice data for this request and apply eviction."""
+        key = make_cache_key(text, model, prompt_version)
+        now = time.time()
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ai_parse_cache "
+                "(key, model, prompt_version, created_at, last_access, value) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, prompt_version, now, now, json.dumps(invoice_data, ensure_ascii=False))
+            )
+            self.writes += 1
+            self._writes_until_evict -= 1
+            if self._writes_until_evict <= 0:
+                self._evict(now)
+                self._writes_until_evict = self.evict_interval
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        """Drop expired entries, then least recently used ones over max_entries.
+
+        Both deletes walk an index and touch only the rows they remove.
+        """
+        if self.ttl_seconds is not None:
+            cursor = self._conn.execute(
+                "DELETE FROM ai_parse_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+            self.evictions += cursor.rowcount
+
+        if self.max_entries is not None:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM ai_parse_cache").fetchone()
+            if count > self.max_entries:
+                cursor = self._conn.execute(
+                    "DELETE FROM ai_parse_cache WHERE key IN ("
+                    "SELECT key FROM ai_parse_cache ORDER BY last_access LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+                self.evictions += cursor.rowcount
+
+    def stats(self) -> Dict:
+        """Return cache counters for this process."""
+        lookups = self.hits + self.misses
+        return {
+            'cache_hits': self.hits,
+            'cache_misses': self.misses,
+            'cache_writes': self.writes,
+            'cache_evictions': self.evictions,
+            'cache_hit_ratio': round(self.hits / lookups, 4) if lookups else None
+        }
+
+    def clear(self):
+        """Delete every cached entry."""
+        with self._lock:
+            self._conn.execute("DELETE FROM ai_parse_cache")
+            self._conn.commit()
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,183 @@
+"""
+Async Claude AI Client Wrapper
+
+Concurrency-limited, rate-limited access to the Anthropic messages API for
+the AI fallback of KSeFXMLConverter. Requests are bounded by a semaphore,
+paced by a token bucket and retried with jittered exponential backoff on
+429 / 5xx responses and connection errors.
+
+Any object exposing ``client.messages.create(**kwargs)`` as a coroutine can
+be used as the client, so tests can inject a fake client; pointing
+``AsyncAnthropic(base_url=...)`` (or ANTHROPIC_BASE_URL) at a local stub
+server works as well.
+"""
+
+import asyncio
+import random
+import time
+from typing import Optional
+
+import anthropic
+
+from logging_config import get_logger
+
+# Initialize logger
+logger = get_logger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_REQUESTS_PER_SECOND = 4.0
+DEFAULT_BURST = 8
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_DELAY = 0.5  # seconds
+DEFAULT_MAX_DELAY = 30.0  # seconds
+
+
+class TokenBucket:
+    """Asyncio token bucket allowing `rate` acquisitions per second with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: int):
+        """Initialize a full bucket.
+
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum number of stored tokens
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        # Waiters queue on the lock, so tokens are handed out in FIFO order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Return True for rate-limit, server-side and connection errors."""
+    if isinstance(error, (anthropic.APIConnectionError, asyncio.TimeoutError)):
+        return True
+    status_code = getattr(error, 'status_code', None)
+    return status_code is not None and (status_code == 429 or status_code >= 500)
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """Return the server-suggested delay from a Retry-After header, if any."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class AsyncAIParser:
+    """Bounded, rate-limited and retrying wrapper around an async Anthropic client."""
+
+    def __init__(
+        self,
+        client,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+        burst: int = DEFAULT_BURST,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        base_delay: float = DEFAULT_BASE_DELAY,
+        max_delay: float = DEFAULT_MAX_DELAY
+    ):
+        """Initialize the wrapper.
+
+        Args:
+            client: AsyncAnthropic instance (create it with max_retries=0 so
+                    retries are handled here) or a compatible fake
+            max_concurrency: Maximum number of in-flight requests
+            requests_per_second: Sustained request rate
+            burst: Number of requests allowed back-to-back before pacing applies
+            max_retries: Retries after the first attempt for retryable errors
+            base_delay: Backoff base in seconds (doubled per attempt)
+            max_delay: Upper bound for a single backoff delay in seconds
+        """
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limiter = TokenBucket(requests_per_second, burst)
+
+        # asyncio primitives are bound to the loop they are first used in
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Return the concurrency semaphore for the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self.rate_limiter._lock = None
+            self._loop = loop
+        return self._semaphore
+
+    def _backoff_delay(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential backoff, honouring Retry-After when present."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        retry_after = _retry_after_seconds(error)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    async def create_message(self, **kwargs):
+        """Call client.messages.create with concurrency, rate and retry control.
+
+        Raises:
+            The last error once retries are exhausted or on non-retryable errors
+        """
+        async with self._get_semaphore():
+            attempt = 0
+            while True:
+                await self.rate_limiter.acquire()
+                self.requests += 1
+                try:
+                    return await self.client.messages.create(**kwargs)
+                except Exception as e:
+                    if not is_retryable_error(e) or attempt >= self.max_retries:
+                        self.failures += 1
+                        raise
+
+                    delay = self._backoff_delay(attempt, e)
+                    self.retries += 1
+                    attempt += 1
+                    logger.warning(
+                        f"Retrying Claude AI request after error: {e}",
+                        extra={'extra_fields': {
+                            'attempt': attempt,
+                            'delay_s': round(delay, 3),
+                            'status_code': getattr(e, 'status_code', None),
+                            'event_type': 'ai_request_retry'
+                        }}
+                    )
+                    await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        """Return request counters."""
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'failures': self.failures
+        }
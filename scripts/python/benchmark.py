@@ -0,0 +1,1315 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for KSeF Invoice Processing
+
+Micro-benchmarks comparing optimised code paths of the invoice pipeline
+against the implementations they replaced.
+
+Usage:
+    python benchmark.py xml-build -n 2000
+    python benchmark.py xml-build -n 2000 --json results.json
+    python benchmark.py line-items -n 10000
+    python benchmark.py output-modes -n 1000 --positions 1-20
+    python benchmark.py prevalidation -n 2000
+    python benchmark.py bulk-validate -n 5000
+    python benchmark.py rules -r 20
+    python benchmark.py rules --check
+    python benchmark.py extract -r 3
+    python benchmark.py embedded -n 50
+    python benchmark.py pipeline -n 200 --positions 1-20 --json pipeline.json
+    python benchmark.py positions -n 100000
+    python benchmark.py log-format -n 100000
+    python benchmark.py async-ai --check
+"""
+
+import argparse
+import asyncio
+import gzip
+import io
+import json
+import logging
+import os
+import platform
+import re
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Tuple
+from xml.dom import minidom
+from xml.etree import ElementTree as ET
+
+import lxml
+from lxml import etree
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from async_ai import AsyncAIParser
+from generate_invoices import InvoiceGenerator, np
+from invoice_pdf_to_ksef_xml import (
+    MAX_LINE_ITEMS,
+    KSeFXMLConverter,
+    _INVOICE_FIELDS,
+    _LINE_FIELDS,
+    _field_text,
+    _percentile,
+    schema_registry,
+    validate_xml_files,
+    zstandard
+)
+from logging_config import JSONFormatter, correlation_id_var, orjson
+from pdf_generator import PDFInvoiceGenerator
+from pdf_text_backends import DEFAULT_BACKEND, available_backends
+from xsd_facets import SchemaImportError
+
+
+DEFAULT_PDF_DIR = "../../src/test/resources/invoice/input/pdf/pl/fake/generated"
+
+
+# ============================================================================
+# Reference implementations
+# ============================================================================
+
+def legacy_convert_to_ksef_xml(converter: KSeFXMLConverter, invoice_data: Dict) -> str:
+    """Original ElementTree + minidom implementation of convert_to_ksef_xml."""
+    ns = converter.namespace
+    ET.register_namespace('', ns)
+    ET.register_namespace('xsi', converter.namespace_xsi)
+    ET.register_namespace('xsd', converter.namespace_xsd)
+
+    root = ET.Element(
+        f"{{{ns}}}Faktura",
+        attrib={
+            f"{{{converter.namespace_xsi}}}schemaLocation": f"{ns} http://crd.gov.pl/wzor/2023/06/29/12648/schemat.xsd"
+        }
+    )
+
+    naglowek = ET.SubElement(root, f"{{{ns}}}Naglowek")
+    variant_number = converter.schema_type[-1]
+    kod_formularza = ET.SubElement(
+        naglowek,
+        f"{{{ns}}}KodFormularza",
+        attrib={"kodSystemowy": f"FA ({variant_number})", "wersjaSchemy": "1-0E"}
+    )
+    kod_formularza.text = "FA"
+    ET.SubElement(naglowek, f"{{{ns}}}WariantFormularza").text = variant_number
+    ET.SubElement(naglowek, f"{{{ns}}}DataWytworzeniaFa").text = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+
+    podmiot1 = ET.SubElement(root, f"{{{ns}}}Podmiot1")
+    dane_id1 = ET.SubElement(podmiot1, f"{{{ns}}}DaneIdentyfikacyjne")
+    ET.SubElement(dane_id1, f"{{{ns}}}NIP").text = invoice_data['seller_tax_no']
+    ET.SubElement(dane_id1, f"{{{ns}}}Nazwa").text = invoice_data['seller_name']
+    adres1 = ET.SubElement(podmiot1, f"{{{ns}}}Adres")
+    ET.SubElement(adres1, f"{{{ns}}}KodKraju").text = invoice_data.get('seller_country', 'PL')
+    ET.SubElement(adres1, f"{{{ns}}}AdresL1").text = invoice_data['seller_street']
+
+    podmiot2 = ET.SubElement(root, f"{{{ns}}}Podmiot2")
+    dane_id2 = ET.SubElement(podmiot2, f"{{{ns}}}DaneIdentyfikacyjne")
+    ET.SubElement(dane_id2, f"{{{ns}}}NIP").text = invoice_data['buyer_tax_no']
+    ET.SubElement(dane_id2, f"{{{ns}}}Nazwa").text = invoice_data['buyer_name']
+    adres2 = ET.SubElement(podmiot2, f"{{{ns}}}Adres")
+    ET.SubElement(adres2, f"{{{ns}}}KodKraju").text = invoice_data.get('buyer_country', 'PL')
+    ET.SubElement(adres2, f"{{{ns}}}AdresL1").text = (
+        f"{invoice_data['buyer_street']}, {invoice_data['buyer_post_code']} {invoice_data['buyer_city']}"
+    )
+
+    fa = ET.SubElement(root, f"{{{ns}}}Fa")
+    ET.SubElement(fa, f"{{{ns}}}KodWaluty").text = invoice_data['currency']
+    ET.SubElement(fa, f"{{{ns}}}P_1").text = invoice_data['issue_date']
+    ET.SubElement(fa, f"{{{ns}}}P_2").text = invoice_data['number']
+    ET.SubElement(fa, f"{{{ns}}}P_13_1").text = invoice_data['price_net']
+    ET.SubElement(fa, f"{{{ns}}}P_14_1").text = invoice_data['price_tax']
+    ET.SubElement(fa, f"{{{ns}}}P_15").text = invoice_data['price_gross']
+
+    adnotacje = ET.SubElement(fa, f"{{{ns}}}Adnotacje")
+    ET.SubElement(adnotacje, f"{{{ns}}}P_16").text = "2"
+    ET.SubElement(adnotacje, f"{{{ns}}}P_17").text = "2"
+    ET.SubElement(adnotacje, f"{{{ns}}}P_18").text = "2"
+    ET.SubElement(adnotacje, f"{{{ns}}}P_18A").text = "2"
+    zwolnienie = ET.SubElement(adnotacje, f"{{{ns}}}Zwolnienie")
+    ET.SubElement(zwolnienie, f"{{{ns}}}P_19N").text = "1"
+    nowe_srodki = ET.SubElement(adnotacje, f"{{{ns}}}NoweSrodkiTransportu")
+    ET.SubElement(nowe_srodki, f"{{{ns}}}P_22N").text = "1"
+    ET.SubElement(adnotacje, f"{{{ns}}}P_23").text = "2"
+    p_marzy = ET.SubElement(adnotacje, f"{{{ns}}}PMarzy")
+    ET.SubElement(p_marzy, f"{{{ns}}}P_PMarzyN").text = "1"
+
+    ET.SubElement(fa, f"{{{ns}}}RodzajFaktury").text = "VAT"
+
+    xml_str = ET.tostring(root, encoding='utf-8')
+    dom = minidom.parseString(xml_str)
+    return dom.toprettyxml(indent="    ", encoding='utf-8').decode('utf-8')
+
+
+def legacy_parse_invoice_with_rules(text: str) -> Tuple[Dict, bool]:
+    """Original uncompiled implementation of parse_invoice_with_rules (without logging)."""
+    invoice_data = {
+        'seller_name': '',
+        'seller_tax_no': '',
+        'seller_street': '',
+        'seller_country': 'PL',
+        'buyer_name': '',
+        'buyer_tax_no': '',
+        'buyer_street': '',
+        'buyer_post_code': '',
+        'buyer_city': '',
+        'buyer_country': 'PL',
+        'currency': 'PLN',
+        'issue_date': '',
+        'number': '',
+        'price_net': '0.00',
+        'price_tax': '0.00',
+        'price_gross': '0.00'
+    }
+
+    # Normalize text for easier matching
+    text_lines = text.split('\n')
+
+    # Pattern 1: Extract NIP numbers (10 digits, may have dashes or spaces)
+    nip_pattern = r'NIP[:\s]*(\d{3}[-\s]?\d{3}[-\s]?\d{2}[-\s]?\d{2}|\d{10})'
+    nip_matches = re.findall(nip_pattern, text, re.IGNORECASE)
+    if len(nip_matches) >= 2:
+        # First NIP is usually seller, second is buyer
+        invoice_data['seller_tax_no'] = re.sub(r'[-\s]', '', nip_matches[0])
+        invoice_data['buyer_tax_no'] = re.sub(r'[-\s]', '', nip_matches[1])
+    elif len(nip_matches) == 1:
+        invoice_data['seller_tax_no'] = re.sub(r'[-\s]', '', nip_matches[0])
+
+    # Pattern 2: Extract invoice number
+    # Supports both Polish ("Faktura Nr") and English ("INVOICE #") formats
+    invoice_num_patterns = [
+        r'INVOICE\s*#\s*(\d+)',  # English: "INVOICE # 13"
+        r'Invoice\s+(?:Number|No\.?)[:\s]*(\d+)',  # English: "Invoice Number: 13"
+        r'Faktura\s+(?:Nr\.?|numer|VAT)?\s*[:\s]*([A-Z0-9/\-]+)',  # Polish
+        r'(?:FA|FV)[/\-](\d+[/\-]\d+[/\-]\d+)',  # Polish: FA/001/2025
+        r'Numer\s+faktury[:\s]*([A-Z0-9/\-]+)'  # Polish
+    ]
+    for pattern in invoice_num_patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            invoice_data['number'] = match.group(1) if len(match.groups()) == 1 else match.group(0)
+            break
+
+    # Pattern 3: Extract dates
+    # Supports Polish, English, and various numeric formats
+    date_patterns = [
+        r'DATE[:\s]*(\d{1,2})\s+([A-Za-z]+)[,\s]+(\d{4})',  # English: "DATE: 02 April, 2025"
+        r'(?:Invoice\s+)?Date[:\s]*(\d{1,2})\s+([A-Za-z]+)[,\s]+(\d{4})',  # "Invoice Date: 02 April, 2025"
+        r'Data\s+wystawienia[:\s]*(\d{4}-\d{2}-\d{2})',  # Polish: "Data wystawienia: 2025-04-02"
+        r'Data\s+wystawienia[:\s]*(\d{2}[-/.]\d{2}[-/.]\d{4})',  # Polish: "Data wystawienia: 02.04.2025"
+        r'Data\s+sprzedaży[:\s]*(\d{4}-\d{2}-\d{2})',
+        r'Data\s+sprzedaży[:\s]*(\d{2}[-/.]\d{2}[-/.]\d{4})'
+    ]
+
+    month_names = {
+        'january': '01', 'february': '02', 'march': '03', 'april': '04',
+        'may': '05', 'june': '06', 'july': '07', 'august': '08',
+        'september': '09', 'october': '10', 'november': '11', 'december': '12'
+    }
+
+    for pattern in date_patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            groups = match.groups()
+            if len(groups) == 3:  # English date format (day, month name, year)
+                day, month_name, year = groups
+                month = month_names.get(month_name.lower(), '01')
+                date_str = f"{year}-{month}-{day.zfill(2)}"
+            else:  # Numeric date format
+                date_str = groups[0]
+                # Convert DD-MM-YYYY or DD.MM.YYYY to YYYY-MM-DD
+                if re.match(r'\d{2}[-/.]\d{2}[-/.]\d{4}', date_str):
+                    parts = re.split(r'[-/.]', date_str)
+                    date_str = f"{parts[2]}-{parts[1]}-{parts[0]}"
+            invoice_data['issue_date'] = date_str
+            break
+
+    # Pattern 4: Extract amounts
+    # Supports both Polish and English formats (EU invoices only)
+    amount_patterns = [
+        # English patterns with PLN
+        (r'SUBTOTAL[:\s]*([\d,\s]+(?:\.\d{2})?)\s*zł', 'price_net'),  # "SUBTOTAL 22,344.00 zł"
+        (r'VAT\s+\d+%[:\s]*(?:EUR\s+)?([\d,\s]+(?:\.\d{2})?)\s*zł', 'price_tax'),  # "VAT 23% EUR 5,139.12 zł"
+        (r'TOTAL[:\s]*([\d,\s]+(?:\.\d{2})?)\s*zł', 'price_gross'),  # "TOTAL 27,483.12 zł"
+        # Polish patterns
+        (r'(?:Wartość\s+)?[Nn]etto[:\s]*([\d,\s]+)', 'price_net'),
+        (r'(?:Wartość\s+)?VAT[:\s]*([\d,\s]+)', 'price_tax'),
+        (r'(?:Wartość\s+)?[Bb]rutto[:\s]*([\d,\s]+)', 'price_gross'),
+        (r'Razem[:\s]*([\d,\s]+)', 'price_gross'),
+        (r'Do\s+zapłaty[:\s]*([\d,\s]+)', 'price_gross')
+    ]
+
+    for pattern, field in amount_patterns:
+        matches = re.findall(pattern, text, re.IGNORECASE)
+        if matches:
+            # Take the last match (usually the total)
+            amount = matches[-1].replace(' ', '').replace(',', '')
+            # Handle potential decimal formatting
+            if '.' in amount:
+                # Already has decimal point
+                parts = amount.split('.')
+                if len(parts[-1]) == 2:  # e.g., "22344.00"
+                    amount = amount
+                else:  # e.g., "22.344" (thousands separator)
+                    amount = amount.replace('.', '') + '.00'
+            else:
+                amount += '.00'
+            invoice_data[field] = amount
+
+    # Pattern 5: Extract company names
+    # Supports Polish ("Sprzedawca") and English ("Bill To") formats
+
+    # Try Polish format first
+    seller_section = re.search(r'Sprzedawca[:\s]*\n([^\n]+)', text, re.IGNORECASE)
+    if seller_section:
+        invoice_data['seller_name'] = seller_section.group(1).strip()
+
+    # Try English format: look for name after INVOICE and before street address
+    if not invoice_data['seller_name']:
+        # Pattern: INVOICE, then name on next line, then street address
+        seller_eng = re.search(r'INVOICE\s*\n([^\n]+)\s*\n([^\n]+street[^\n]*)', text, re.IGNORECASE)
+        if seller_eng:
+            invoice_data['seller_name'] = seller_eng.group(1).strip()
+            invoice_data['seller_street'] = seller_eng.group(2).strip()
+
+    buyer_section = re.search(r'Nabywca[:\s]*\n([^\n]+)', text, re.IGNORECASE)
+    if buyer_section:
+        invoice_data['buyer_name'] = buyer_section.group(1).strip()
+
+    # Try English format: "Bill To:" followed by company name
+    if not invoice_data['buyer_name']:
+        buyer_eng = re.search(r'Bill\s+To[:\s]*([^\n]+)', text, re.IGNORECASE)
+        if buyer_eng:
+            invoice_data['buyer_name'] = buyer_eng.group(1).strip()
+
+    # Pattern 6: Extract addresses
+    # Polish format: ul., al., pl.
+    street_pattern = r'(?:ul\.|al\.|pl\.)\s+([^\n,]+)'
+    street_matches = re.findall(street_pattern, text, re.IGNORECASE)
+    if len(street_matches) >= 2:
+        invoice_data['seller_street'] = street_matches[0].strip()
+        invoice_data['buyer_street'] = street_matches[1].strip()
+    elif len(street_matches) == 1:
+        if not invoice_data['seller_street']:
+            invoice_data['seller_street'] = street_matches[0].strip()
+
+    # English format: Look for "street" or "Aleja" keyword
+    if not invoice_data['seller_street']:
+        seller_street_eng = re.search(r'([A-ZĄĆĘŁŃÓŚŹŻa-ząćęłńóśźż]+\s+street[^,\n]+)', text, re.IGNORECASE)
+        if seller_street_eng:
+            invoice_data['seller_street'] = seller_street_eng.group(1).strip()
+
+    if not invoice_data['buyer_street']:
+        # Look for address after "Bill To" section
+        buyer_street_eng = re.search(r'Bill\s+To[^\n]*\n[^\n]+\n([^\n]+)', text, re.IGNORECASE)
+        if buyer_street_eng:
+            invoice_data['buyer_street'] = buyer_street_eng.group(1).strip()
+
+    # Pattern 7: Extract postal code and city for buyer
+    postal_pattern = r'(\d{2}-\d{3})[,\s]+([A-ZĄĆĘŁŃÓŚŹŻa-ząćęłńóśźż\s]+)'
+    postal_matches = re.findall(postal_pattern, text)
+    if len(postal_matches) >= 2:
+        invoice_data['buyer_post_code'] = postal_matches[1][0]
+        invoice_data['buyer_city'] = postal_matches[1][1].strip().rstrip(',')
+    elif len(postal_matches) >= 1:
+        # Check if this is near "Bill To" (buyer) or seller section
+        if 'Bill To' in text or not invoice_data['buyer_post_code']:
+            invoice_data['buyer_post_code'] = postal_matches[0][0]
+            invoice_data['buyer_city'] = postal_matches[0][1].strip().rstrip(',')
+
+    required_fields = [
+        'seller_name', 'seller_tax_no', 'buyer_name', 'buyer_tax_no',
+        'number', 'issue_date', 'price_net', 'price_tax', 'price_gross'
+    ]
+    missing_fields = [field for field in required_fields if not invoice_data.get(field) or invoice_data[field] == '0.00']
+    return invoice_data, not missing_fields
+
+
+class LegacyJSONFormatter(logging.Formatter):
+    """Original logging_config.JSONFormatter (utcnow timestamp, stdlib json)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        log_data = {
+            'timestamp': datetime.utcnow().isoformat() + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'function': record.funcName,
+            'line': record.lineno,
+        }
+        correlation_id = correlation_id_var.get()
+        if correlation_id:
+            log_data['correlation_id'] = correlation_id
+        if record.exc_info:
+            log_data['exception'] = self.formatException(record.exc_info)
+        if hasattr(record, 'extra_fields'):
+            log_data.update(record.extra_fields)
+        return json.dumps(log_data)
+
+
+# ============================================================================
+# Helpers
+# ============================================================================
+
+def generate_invoice_data(count: int, config_path: str = 'config.yaml', positions: Optional[Tuple[int, int]] = None) -> List[Dict]:
+    """Generate invoice dictionaries to feed the benchmarks.
+
+    Args:
+        count: Number of invoices
+        config_path: Generator config
+        positions: Optional (min, max) number of line items per invoice,
+                   overriding the config
+    """
+    generator = InvoiceGenerator(config_path)
+    if positions is not None:
+        generation = generator.config.setdefault('generation', {})
+        generation['min_positions'], generation['max_positions'] = positions
+    return generator.generate_invoices(count)
+
+
+def parse_positions(value: str) -> Tuple[int, int]:
+    """Parse a --positions value: 'N' or 'MIN-MAX'."""
+    low, _, high = value.partition('-')
+    try:
+        bounds = (int(low), int(high or low))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected N or MIN-MAX, got {value!r}")
+    if bounds[0] < 1 or bounds[0] > bounds[1]:
+        raise argparse.ArgumentTypeError(f"invalid position range {value!r}")
+    return bounds
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Return the peak resident set size of this process in MB, if known."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    divisor = 1024 * 1024 if platform.system() == 'Darwin' else 1024
+    return round(peak / divisor, 1)
+
+
+def _proc_status_kb(field: str) -> int:
+    """Return a kB field (VmRSS, VmHWM) from /proc/self/status."""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    raise KeyError(field)
+
+
+def peak_rss_growth_mb(func: Callable[[], object]) -> Optional[float]:
+    """Run func in a forked child and return how far its peak RSS rose, in MB.
+
+    A forked child starts with a fresh peak (VmHWM), so memory allocated
+    outside Python, such as lxml trees, is counted too. Returns None where
+    fork or /proc is not available.
+    """
+    if not hasattr(os, 'fork') or not os.path.exists('/proc/self/status'):
+        return None
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            start = _proc_status_kb('VmRSS')
+            func()
+            os.write(write_fd, str(_proc_status_kb('VmHWM') - start).encode())
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        growth_kb = f.read()
+    os.waitpid(pid, 0)
+    return round(int(growth_kb) / 1024, 1) if growth_kb else None
+
+
+def load_pdf_texts(pdf_dir: str) -> List[str]:
+    """Extract text once from every PDF in a directory."""
+    converter = KSeFXMLConverter()
+    return [converter.extract_text_from_pdf(str(p)) for p in sorted(Path(pdf_dir).glob('*.pdf'))]
+
+
+def strip_volatile(xml_content: str) -> str:
+    """Remove the generation timestamp so outputs can be compared."""
+    return re.sub(r'<DataWytworzeniaFa>[^<]*</DataWytworzeniaFa>', '<DataWytworzeniaFa/>', xml_content)
+
+
+def expect_identical(actual: str, expected: str, what: str):
+    """Exit with an error if two outputs differ (unlike assert, kept under python -O)."""
+    if actual != expected:
+        raise SystemExit(f"{what} output differs")
+
+
+def time_per_item(func: Callable[[Dict], object], items: List[Dict], repeat: int = 3) -> float:
+    """Return the best-of-N wall time in seconds for applying func to every item."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def print_results(title: str, count: int, timings: Dict[str, float], unit: str = 'invoice') -> Dict:
+    """Print throughput per variant relative to the first (baseline) entry."""
+    baseline = next(iter(timings.values()))
+    results = {}
+    print(f"\n{'='*60}")
+    print(f"{title} ({count} {unit}s)")
+    print(f"{'='*60}")
+    for name, seconds in timings.items():
+        per_second = count / seconds if seconds else float('inf')
+        speedup = baseline / seconds if seconds else float('inf')
+        print(f"{name:<34} {per_second:>10.0f} {unit[:3]}/s  {speedup:>6.2f}x")
+        results[name] = {
+            'seconds': round(seconds, 6),
+            f'{unit}s_per_second': round(per_second, 1),
+            'speedup': round(speedup, 3)
+        }
+    print(f"{'='*60}\n")
+    return results
+
+
+# ============================================================================
+# Benchmarks
+# ============================================================================
+
+def expect_field_paths(converter: KSeFXMLConverter, invoices: List[Dict]):
+    """Exit with an error unless the pre-validator's field tables match the built documents.
+
+    Every field in _INVOICE_FIELDS / _LINE_FIELDS must be at its path with
+    the text the pre-validator checks, and every element whose text differs
+    between the invoices must be one of those fields, a total, the line
+    number or rate, or the generation time.
+    """
+    ns = converter.namespace
+    unchecked = {'DataWytworzeniaFa', 'NrWierszaFa', 'P_12'}
+    covered = {('Faktura',) + path for path, _ in _INVOICE_FIELDS}
+    covered.update(('Faktura', 'Fa', 'FaWiersz') + path for path, _ in _LINE_FIELDS)
+    texts = []
+    for invoice in invoices:
+        root = converter.build_ksef_tree(invoice)
+        fa_wiersz = root.findall(f"{{{ns}}}Fa/{{{ns}}}FaWiersz")
+        records = [(root, invoice, _INVOICE_FIELDS)]
+        records += [(line, position, _LINE_FIELDS) for line, position in zip(fa_wiersz, invoice.get('positions') or ())]
+        for parent, data, fields in records:
+            for path, field in fields:
+                node = parent.find("/".join(f"{{{ns}}}{tag}" for tag in path))
+                if node is None or (node.text or "") != _field_text(data, field):
+                    raise SystemExit(f"Pre-validator field {field!r} is not at {'/'.join(path)}")
+        texts.append({
+            tuple(etree.QName(node).localname for node in [*reversed(list(leaf.iterancestors())), leaf]): leaf.text
+            for leaf in root.iter() if len(leaf) == 0 and etree.QName(leaf).localname not in unchecked
+        })
+    for path in set().union(*texts) - covered:
+        if path[-1].startswith(('P_13_', 'P_14_', 'P_15')):
+            continue
+        if len({text.get(path) for text in texts}) > 1:
+            raise SystemExit(f"{'/'.join(path)} varies between invoices but is not pre-validated")
+
+
+def bench_xml_build(args) -> Dict:
+    """Compare the legacy ElementTree/minidom builder with the lxml builders.
+
+    Each variant produces XML text and a parsed document ready for XSD
+    validation, which is what convert_pdf_to_ksef_xml needs per invoice.
+    build_ksef_tree() builds an lxml tree; write_ksef_xml() and
+    convert_to_ksef_xml() stream through lxml's xmlfile writer.
+    """
+    converter = KSeFXMLConverter(schema_type=args.schema_type)
+    # The legacy builder has no FaWiersz lines; see the line-items benchmark for those
+    invoices = [
+        {key: value for key, value in invoice.items() if key != 'positions'}
+        for invoice in generate_invoice_data(args.count, args.config)
+    ]
+
+    for invoice in invoices[:10]:
+        legacy = strip_volatile(legacy_convert_to_ksef_xml(converter, invoice))
+        root = converter.build_ksef_tree(invoice)
+        expect_identical(strip_volatile(converter.serialize_ksef_tree(root)), legacy, "lxml tree")
+        expect_identical(strip_volatile(converter.convert_to_ksef_xml(invoice)), legacy, "xmlfile stream")
+    print(f"Output identical for the first {min(10, len(invoices))} invoices")
+    expect_field_paths(converter, generate_invoice_data(10, args.config))
+    print("Pre-validator field paths match the built documents")
+    if args.check:
+        return {}
+
+    def legacy_path(invoice):
+        xml_content = legacy_convert_to_ksef_xml(converter, invoice)
+        return etree.fromstring(xml_content.encode('utf-8'))
+
+    def tree_path(invoice):
+        root = converter.build_ksef_tree(invoice)
+        return root, converter.serialize_ksef_tree(root)
+
+    def stream_path(invoice):
+        converter.write_ksef_xml(invoice, io.BytesIO())
+
+    timings = {
+        'legacy (ET + minidom + reparse)': time_per_item(legacy_path, invoices, args.repeat),
+        'lxml tree (validate-ready)': time_per_item(tree_path, invoices, args.repeat),
+        'lxml xmlfile stream': time_per_item(stream_path, invoices, args.repeat),
+    }
+    return print_results('XML build', len(invoices), timings)
+
+
+def bench_line_items(args) -> Dict:
+    """Compare FaWiersz emission for one invoice with many line items.
+
+    Both builders read the line items into a list, since the totals precede
+    the lines; the stream builder still avoids holding the document tree.
+    Memory is measured first, in forked children, before this process has
+    built and freed any large document. The line count is capped at
+    MAX_LINE_ITEMS, so every variant produces a schema-valid document.
+    """
+    if args.count > MAX_LINE_ITEMS:
+        raise SystemExit(f"KSeF invoices hold at most {MAX_LINE_ITEMS} line items, got -n {args.count}")
+    converter = KSeFXMLConverter(schema_type=args.schema_type)
+    invoice = generate_invoice_data(1, args.config)[0]
+    positions = invoice.pop('positions')
+
+    def iter_positions():
+        for number in range(args.count):
+            yield positions[number % len(positions)]
+
+    def tree(_):
+        converter.build_ksef_tree(invoice, positions=iter_positions())
+
+    def stream(_):
+        with tempfile.TemporaryFile() as f:
+            converter.write_ksef_xml(invoice, f, positions=iter_positions())
+
+    variants = {
+        'lxml tree': tree,
+        'lxml xmlfile stream': stream,
+    }
+    peak_growth = {} if args.check else {name: peak_rss_growth_mb(lambda: func(None)) for name, func in variants.items()}
+
+    output = io.BytesIO()
+    converter.write_ksef_xml(invoice, output, positions=iter_positions())
+    root = converter.build_ksef_tree(invoice, positions=iter_positions())
+    if len(root.findall(f"{{{converter.namespace}}}Fa/{{{converter.namespace}}}FaWiersz")) != args.count:
+        raise SystemExit(f"lxml tree does not hold {args.count} FaWiersz lines")
+    expect_identical(strip_volatile(converter.serialize_ksef_tree(root)), strip_volatile(output.getvalue().decode('utf-8')),
+                     "lxml tree")
+    del root, output
+    print(f"Output identical for {args.count} lines")
+    if args.check:
+        return {}
+
+    timings = {name: time_per_item(func, [None], args.repeat) for name, func in variants.items()}
+    results = print_results('FaWiersz emission', args.count, timings, unit='line')
+
+    print("Peak RSS growth:")
+    for name, growth in peak_growth.items():
+        results[name]['peak_rss_growth_mb'] = growth
+        print(f"  {name:<34} {'n/a' if growth is None else f'{growth:8.1f} MB'}")
+    print()
+    return results
+
+
+def bench_output_modes(args) -> Dict:
+    """Compare output size and throughput of the pretty, compact and compressed modes.
+
+    Every invoice is written with write_ksef_xml to an in-memory buffer;
+    decompressed output must equal the uncompressed output of the same format.
+    """
+    converter = KSeFXMLConverter(schema_type=args.schema_type)
+    invoices = generate_invoice_data(args.count, args.config, args.positions)
+    modes = [
+        ('pretty', 'none'), ('compact', 'none'),
+        ('pretty', 'gzip'), ('compact', 'gzip'),
+    ]
+    if zstandard is not None:
+        modes += [('pretty', 'zstd'), ('compact', 'zstd')]
+    else:
+        print("zstandard is not installed, skipping zstd modes")
+
+    def decompress(data: bytes, compression: str) -> bytes:
+        if compression == 'gzip':
+            return gzip.decompress(data)
+        if compression == 'zstd':
+            return zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data)).read()
+        return data
+
+    sizes = {}
+    timings = {}
+    for output_format, compression in modes:
+        name = output_format if compression == 'none' else f"{output_format} + {compression}"
+        size = 0
+        for invoice in invoices[:10]:
+            buffer = io.BytesIO()
+            converter.write_ksef_xml(invoice, buffer, output_format=output_format, compression=compression)
+            expected = strip_volatile(converter.convert_to_ksef_xml(invoice, output_format))
+            expect_identical(strip_volatile(decompress(buffer.getvalue(), compression).decode('utf-8')), expected, name)
+        if args.check:
+            continue
+
+        def write(invoice, output_format=output_format, compression=compression):
+            converter.write_ksef_xml(invoice, io.BytesIO(), output_format=output_format, compression=compression)
+
+        for invoice in invoices:
+            buffer = io.BytesIO()
+            converter.write_ksef_xml(invoice, buffer, output_format=output_format, compression=compression)
+            size += len(buffer.getvalue())
+        sizes[name] = size
+        timings[name] = time_per_item(write, invoices, args.repeat)
+    print(f"Output identical after decompression for the first {min(10, len(invoices))} invoices")
+    if args.check:
+        return {}
+
+    results = print_results('XML output modes', len(invoices), timings)
+    baseline = next(iter(sizes.values()))
+    print(f"{'mode':<34} {'bytes/invoice':>13}  {'size':>6}")
+    for name, size in sizes.items():
+        results[name]['bytes_per_invoice'] = round(size / len(invoices), 1)
+        results[name]['relative_size'] = round(size / baseline, 3)
+        print(f"{name:<34} {size / len(invoices):>13.0f}  {size / baseline:>6.1%}")
+    print(f"{'='*60}\n")
+    return results
+
+
+def bench_prevalidation(args) -> Dict:
+    """Compare XSD facet pre-validation with building and validating against the full XSD.
+
+    Clean invoices must pass pre-validation and invoices with a typical data
+    error must fail it. When the XSD compiles (its imported schemas must be
+    reachable), full validation has to agree on every sample.
+    """
+    converter = KSeFXMLConverter(schema_type=args.schema_type)
+    invoices = generate_invoice_data(args.count, args.config, args.positions)
+    sample = invoices[0]
+    first_line = sample['positions'][0]
+    header_only = {key: value for key, value in sample.items() if key != 'positions'}
+    broken = {
+        'amount with decimal comma': dict(header_only, price_gross=sample['price_gross'].replace('.', ',')),
+        'unsupported VAT rate': dict(sample, positions=[dict(first_line, tax='24')]),
+        'too many quantity decimals': dict(sample, positions=[dict(first_line, quantity='1.1234567')]),
+        'name over 512 characters': dict(sample, buyer_name='X' * 513),
+        'unknown currency': dict(sample, currency='ZZZ'),
+        'empty unit of measure': dict(sample, positions=[dict(first_line, quantity_unit='')]),
+    }
+
+    def full_validation(invoice):
+        return converter.validate_against_xsd(converter.build_ksef_tree(invoice))[0]
+
+    # Compare validation cost, not log handler cost
+    logging.disable(logging.CRITICAL)
+    try:
+        try:
+            converter.prevalidate_invoice(sample)
+        except SchemaImportError as e:
+            raise SystemExit(f"Pre-validation unavailable: {e}")
+        schema_available = full_validation(sample)
+        for invoice in invoices:
+            errors = converter.prevalidate_invoice(invoice)
+            if errors:
+                raise SystemExit(f"Pre-validation rejected a generated invoice: {errors}")
+        for name, invoice in broken.items():
+            errors = converter.prevalidate_invoice(invoice)
+            if not errors:
+                raise SystemExit(f"Pre-validation accepted an invoice with {name}")
+            if schema_available:
+                try:
+                    valid = full_validation(invoice)
+                except ValueError:
+                    valid = False
+                if valid:
+                    raise SystemExit(f"Full XSD validation accepted an invoice with {name}")
+            print(f"{name:<30} {errors[0]}")
+
+        timings = {}
+        if schema_available:
+            timings['build tree + full XSD'] = time_per_item(full_validation, invoices, args.repeat)
+        else:
+            print("Full XSD validation unavailable (schema or its imports not loadable), timing pre-validation only")
+        timings['facet pre-validation'] = time_per_item(converter.prevalidate_invoice, invoices, args.repeat)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    return print_results('Invoice validation', len(invoices), timings)
+
+
+def bench_bulk_validate(args) -> Dict:
+    """Compare validating XML files one string at a time with validate_xml_files.
+
+    Generated invoices are written to a temporary directory first; every
+    variant must report the same number of valid files.
+    """
+    converter = KSeFXMLConverter(schema_type=args.schema_type)
+    invoices = generate_invoice_data(args.count, args.config, args.positions)
+    workers = os.cpu_count() or 1
+
+    # Compare validation cost, not log handler cost
+    logging.disable(logging.CRITICAL)
+    try:
+        try:
+            schema_registry.get_schema(converter.schema_type, converter.schema_path)
+        except etree.XMLSchemaParseError as e:
+            raise SystemExit(f"XSD schema does not compile here: {e}")
+
+        with tempfile.TemporaryDirectory() as xml_dir:
+            paths = []
+            for index, invoice in enumerate(invoices):
+                path = Path(xml_dir) / f"invoice-{index}.xml"
+                path.write_text(converter.convert_to_ksef_xml(invoice), encoding='utf-8')
+                paths.append(path)
+
+            def one_at_a_time():
+                return sum(converter.validate_against_xsd(path.read_text(encoding='utf-8'))[0] for path in paths)
+
+            variants = {
+                'validate_against_xsd per file': one_at_a_time,
+                'validate_xml_files, 1 worker': lambda: validate_xml_files([xml_dir], args.schema_type, workers=1)['valid'],
+            }
+            if workers > 1:
+                variants[f'validate_xml_files, {workers} workers'] = (
+                    lambda: validate_xml_files([xml_dir], args.schema_type, workers=workers)['valid']
+                )
+
+            timings = {}
+            valid_counts = set()
+            for name, func in variants.items():
+                best = float('inf')
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    valid_counts.add(func())
+                    best = min(best, time.perf_counter() - start)
+                timings[name] = best
+            if len(valid_counts) != 1:
+                raise SystemExit(f"Variants disagree on the number of valid files: {sorted(valid_counts)}")
+            print(f"All variants report {valid_counts.pop()} of {len(paths)} files valid")
+    finally:
+        logging.disable(logging.NOTSET)
+    return print_results('Bulk XSD validation', len(invoices), timings, unit='file')
+
+
+def bench_rules(args) -> Dict:
+    """Compare the legacy regex parser with the precompiled, keyword-gated rule engine.
+
+    Text is extracted once up front so only rule evaluation is timed; output
+    must be identical for every PDF.
+    """
+    converter = KSeFXMLConverter()
+    texts = load_pdf_texts(args.pdf_dir)
+    if not texts:
+        raise SystemExit(f"No PDF files found in {args.pdf_dir}")
+
+    # Compare parsing cost, not log handler cost
+    logging.disable(logging.CRITICAL)
+    try:
+        for text in texts:
+            if converter.parse_invoice_with_rules(text) != legacy_parse_invoice_with_rules(text):
+                raise SystemExit("Rule engine output differs from the legacy parser")
+        print(f"Output identical for all {len(texts)} PDFs")
+        if args.check:
+            return {}
+
+        timings = {
+            'legacy (uncompiled regex)': time_per_item(legacy_parse_invoice_with_rules, texts, args.repeat),
+            'precompiled rule table': time_per_item(converter.parse_invoice_with_rules, texts, args.repeat),
+        }
+    finally:
+        logging.disable(logging.NOTSET)
+    return print_results('Rule-based parsing', len(texts), timings)
+
+
+def bench_extract(args) -> Dict:
+    """Compare PDF text extraction backends on a PDF corpus.
+
+    Parity is reported as the number of PDFs whose whitespace-separated tokens
+    match the default backend (as a multiset) and whose rule-based parse result
+    is identical. Every backend must reach both for every PDF: matching tokens
+    alone would miss a backend that groups them into different lines, which
+    sends its invoices to the AI fallback.
+    """
+    pdf_paths = [str(p) for p in sorted(Path(args.pdf_dir).glob('*.pdf'))]
+    if not pdf_paths:
+        raise SystemExit(f"No PDF files found in {args.pdf_dir}")
+
+    backends = [DEFAULT_BACKEND] + [name for name in available_backends() if name != DEFAULT_BACKEND]
+    converters = {name: KSeFXMLConverter(pdf_backend=name) for name in backends}
+
+    logging.disable(logging.CRITICAL)
+    try:
+        reference = {}
+        parity = {}
+        for name, converter in converters.items():
+            tokens_equal = parse_equal = 0
+            for pdf_path in pdf_paths:
+                text = converter.extract_text_from_pdf(pdf_path)
+                parsed = converter.parse_invoice_with_rules(text)
+                if name == DEFAULT_BACKEND:
+                    reference[pdf_path] = (sorted(text.split()), parsed)
+                ref_tokens, ref_parsed = reference[pdf_path]
+                tokens_equal += sorted(text.split()) == ref_tokens
+                parse_equal += parsed == ref_parsed
+            parity[name] = {'tokens_equal': tokens_equal, 'parse_equal': parse_equal}
+            print(f"{name:<12} tokens equal: {tokens_equal}/{len(pdf_paths)}  "
+                  f"rule parse equal: {parse_equal}/{len(pdf_paths)}")
+            if tokens_equal != len(pdf_paths):
+                raise SystemExit(f"{name} extracts different text than {DEFAULT_BACKEND} "
+                                 f"for {len(pdf_paths) - tokens_equal} PDFs")
+            if parse_equal != len(pdf_paths):
+                raise SystemExit(f"{name} text parses differently than {DEFAULT_BACKEND}'s "
+                                 f"for {len(pdf_paths) - parse_equal} PDFs")
+        if args.check:
+            return {}
+
+        timings = {
+            name: time_per_item(converter.extract_text_from_pdf, pdf_paths, args.repeat)
+            for name, converter in converters.items()
+        }
+    finally:
+        logging.disable(logging.NOTSET)
+
+    results = print_results('PDF text extraction', len(pdf_paths), timings)
+    for name in results:
+        results[name]['parity'] = parity[name]
+    return results
+
+
+def bench_embedded(args) -> Dict:
+    """Compare reading embedded invoice data with text extraction plus rule parsing.
+
+    Generates PDFs with PDFInvoiceGenerator; the embedded data must produce the
+    same KSeF XML as the source invoice dictionary.
+    """
+    converter = KSeFXMLConverter(use_embedded_data=True)
+    invoices = generate_invoice_data(args.count, args.config)
+
+    logging.disable(logging.CRITICAL)
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pdf_generator = PDFInvoiceGenerator()
+            pdf_paths = []
+            for index, invoice in enumerate(invoices):
+                pdf_path = str(Path(tmp_dir) / f"invoice_{index}.pdf")
+                pdf_generator.generate_pdf(invoice, pdf_path)
+                pdf_paths.append(pdf_path)
+
+            for invoice, pdf_path in zip(invoices, pdf_paths):
+                embedded = converter.read_embedded_invoice_data(pdf_path)
+                if embedded is None or (strip_volatile(converter.convert_to_ksef_xml(embedded))
+                                        != strip_volatile(converter.convert_to_ksef_xml(invoice))):
+                    raise SystemExit(f"Embedded data does not round-trip for {invoice['number']}")
+            print(f"Embedded data round-trips for all {len(pdf_paths)} PDFs")
+
+            timings = {
+                'text extraction + rules': time_per_item(converter.extract_and_parse_lazily, pdf_paths, args.repeat),
+                'embedded invoice data': time_per_item(converter.read_embedded_invoice_data, pdf_paths, args.repeat),
+            }
+    finally:
+        logging.disable(logging.NOTSET)
+    return print_results('PDF to invoice data', len(pdf_paths), timings)
+
+
+def bench_pipeline(args) -> Dict:
+    """Time every stage of the PDF to KSeF XML pipeline on a synthetic corpus.
+
+    Invoices from InvoiceGenerator are rendered to PDF without embedded data,
+    then each PDF goes through text extraction, rule-based parsing, XML
+    building, XSD validation and file write. The XML is built from the
+    source invoice so later stages do not depend on parsing success.
+    Reports throughput, latency percentiles and peak RSS after each stage.
+    """
+    converter = KSeFXMLConverter(schema_type=args.schema_type, use_embedded_data=False)
+    invoices = generate_invoice_data(args.count, args.config, args.positions)
+
+    stage_names = ['extract_text', 'parse_rules', 'build_xml', 'validate_xsd', 'write_file']
+    latencies: Dict[str, List[float]] = {name: [] for name in stage_names}
+    best_totals: Dict[str, float] = {name: float('inf') for name in stage_names}
+    peak_rss: Dict[str, Optional[float]] = {}
+    parsed_ok = valid = 0
+
+    logging.disable(logging.CRITICAL)
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pdf_generator = PDFInvoiceGenerator()
+            pdf_paths = []
+            for index, invoice in enumerate(invoices):
+                pdf_path = str(Path(tmp_dir) / f"invoice_{index}.pdf")
+                pdf_generator.generate_pdf(invoice, pdf_path, embed_data=False)
+                pdf_paths.append(pdf_path)
+            baseline_rss = peak_rss_mb()
+
+            for run in range(args.repeat):
+                totals = dict.fromkeys(stage_names, 0.0)
+                for index, (invoice, pdf_path) in enumerate(zip(invoices, pdf_paths)):
+                    stage_start = time.perf_counter()
+                    text = converter.extract_text_from_pdf(pdf_path)
+                    after_extract = time.perf_counter()
+                    _, success = converter.parse_invoice_with_rules(text)
+                    after_parse = time.perf_counter()
+                    xml_content = converter.convert_to_ksef_xml(invoice)
+                    after_build = time.perf_counter()
+                    is_valid, _ = converter.validate_against_xsd(xml_content)
+                    after_validate = time.perf_counter()
+                    with open(Path(tmp_dir) / f"invoice_{index}.xml", 'w', encoding='utf-8') as f:
+                        f.write(xml_content)
+                    after_write = time.perf_counter()
+
+                    timestamps = [stage_start, after_extract, after_parse, after_build, after_validate, after_write]
+                    for name, start, end in zip(stage_names, timestamps, timestamps[1:]):
+                        latencies[name].append((end - start) * 1000)
+                        totals[name] += end - start
+                    if run == 0:
+                        parsed_ok += success
+                        valid += is_valid
+                for name in stage_names:
+                    best_totals[name] = min(best_totals[name], totals[name])
+                    if run == 0:
+                        peak_rss[name] = peak_rss_mb()
+    finally:
+        logging.disable(logging.NOTSET)
+
+    count = len(invoices)
+    position_counts = [len(invoice['positions']) for invoice in invoices]
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'lxml': '.'.join(map(str, lxml.etree.LXML_VERSION)),
+            'platform': platform.platform(),
+            'pdf_backend': converter.pdf_backend.name,
+            'schema_type': args.schema_type
+        },
+        'corpus': {
+            'invoices': count,
+            'positions_min': min(position_counts),
+            'positions_max': max(position_counts),
+            'positions_mean': round(sum(position_counts) / count, 2),
+            'rule_parse_success': parsed_ok,
+            'xsd_valid': valid
+        },
+        'baseline_peak_rss_mb': baseline_rss,
+        'stages': {}
+    }
+
+    print(f"\n{'='*60}")
+    print(f"Pipeline stages ({count} invoices, {min(position_counts)}-{max(position_counts)} positions, best of {args.repeat})")
+    print(f"{'='*60}")
+    print(f"{'stage':<14} {'inv/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'RSS MB':>8}")
+    for name in stage_names:
+        values = latencies[name]
+        stage = {
+            'seconds': round(best_totals[name], 6),
+            'invoices_per_second': round(count / best_totals[name], 1) if best_totals[name] else None,
+            'latency_ms': {
+                'p50': round(_percentile(values, 50), 3),
+                'p95': round(_percentile(values, 95), 3),
+                'p99': round(_percentile(values, 99), 3),
+                'max': round(max(values), 3)
+            },
+            'peak_rss_mb': peak_rss[name]
+        }
+        results['stages'][name] = stage
+        latency = stage['latency_ms']
+        print(f"{name:<14} {stage['invoices_per_second'] or 0:>9.1f} {latency['p50']:>8.2f} {latency['p95']:>8.2f} "
+              f"{latency['p99']:>8.2f} {latency['max']:>8.2f} {peak_rss[name] or 0:>8.1f}")
+    print(f"{'='*60}")
+    print(f"Rule parsing succeeded: {parsed_ok}/{count}, XSD valid: {valid}/{count}")
+    print(f"{'='*60}\n")
+    return results
+
+
+def bench_positions(args) -> Dict:
+    """Compare per-item line generation with NumPy batch generation.
+
+    Every vectorized line must satisfy unit net + VAT = gross and
+    total = unit amount x quantity exactly, in grosze.
+    """
+    if np is None:
+        raise SystemExit("NumPy is not installed: pip install numpy")
+
+    generator = InvoiceGenerator(args.config, seed=0)
+    if args.positions is not None:
+        generation = generator.config.setdefault('generation', {})
+        generation['min_positions'], generation['max_positions'] = args.positions
+
+    def grosze(value: str) -> int:
+        return round(float(value) * 100)
+
+    batch = generator.generate_position_batch(min(args.count, 1000), np.random.default_rng(0))
+    for position in (p for positions in batch for p in positions):
+        quantity = int(float(position['quantity']))
+        unit = [grosze(position[key]) for key in ('price_net', 'price_tax', 'price_gross')]
+        totals = [grosze(position[key]) for key in ('total_price_net', 'total_price_tax', 'total_price_gross')]
+        if unit[0] + unit[1] != unit[2] or totals != [amount * quantity for amount in unit]:
+            raise SystemExit(f"Inconsistent vectorized amounts: {position}")
+    print(f"Amounts consistent for {sum(len(positions) for positions in batch)} vectorized lines")
+
+    invoice_numbers = list(range(args.count))
+
+    def per_item(_):
+        for _ in invoice_numbers:
+            generator.generate_positions()
+
+    def arrays_only(_):
+        generator.generate_position_arrays(args.count, np.random.default_rng(0))
+
+    def vectorized(_):
+        generator.generate_position_batch(args.count, np.random.default_rng(0))
+
+    timings = {
+        'per-item random (generate_positions)': time_per_item(per_item, [None], args.repeat),
+        'NumPy arrays only': time_per_item(arrays_only, [None], args.repeat),
+        'NumPy arrays + dicts': time_per_item(vectorized, [None], args.repeat),
+    }
+    return print_results('Line item generation', args.count, timings)
+
+
+def bench_log_format(args) -> Dict:
+    """Compare the original JSONFormatter with the optimised one (json and orjson).
+
+    Records resemble the converter's structured events. Every formatter must
+    produce the same JSON object apart from the timestamp source, and the json
+    and orjson backends the same text.
+    """
+    logger = logging.getLogger('invoice_pdf_to_ksef_xml')
+    templates = [
+        ('XML validation successful', {'event_type': 'validation_success', 'schema_type': 'FA2'}),
+        ('Successfully parsed invoice with rules', {
+            'invoice_number': 'FV/2025/12/0042', 'seller_nip': '5261040828',
+            'buyer_nip': '7740001454', 'event_type': 'parsing_success'
+        }),
+        ('File operation: write output/faktura-42.xml', {
+            'operation': 'write', 'file_path': 'output/faktura-42.xml',
+            'success': True, 'error': None, 'event_type': 'file_operation'
+        }),
+        ('Rule-based parsing incomplete', {
+            'seller_name': 'Przykładowa Spółka z o.o.', 'missing_fields': ['buyer_city'],
+            'duration_ms': 12.5, 'event_type': 'parsing_incomplete'
+        }),
+    ]
+    records = [
+        logger.makeRecord(logger.name, logging.INFO, __file__, 100 + i, message, None, None,
+                          func='convert_pdf_to_ksef_xml', extra={'extra_fields': fields})
+        for i in range(args.count)
+        for message, fields in [templates[i % len(templates)]]
+    ]
+
+    formatters = {'legacy (utcnow + json.dumps)': LegacyJSONFormatter(), 'optimised (json)': JSONFormatter(use_orjson=False)}
+    if orjson is not None:
+        formatters['optimised (orjson)'] = JSONFormatter(use_orjson=True)
+    else:
+        print("orjson is not installed, skipping the orjson variant")
+
+    token = correlation_id_var.set('3f6c1b9e-8a51-4d3c-9a0e-2b7f0c4d5e61')
+    try:
+        for record in records[:100]:
+            lines = [formatter.format(record) for formatter in formatters.values()]
+            if len(set(lines[1:])) > 1:
+                raise SystemExit("JSONFormatter output depends on whether orjson is used")
+            outputs = [json.loads(line) for line in lines]
+            expected = datetime.utcfromtimestamp(record.created).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+            if any(output.pop('timestamp') != expected for output in outputs[1:]):
+                raise SystemExit("Optimised formatter timestamp differs from the record time")
+            outputs[0].pop('timestamp')
+            if any(output != outputs[0] for output in outputs[1:]):
+                raise SystemExit("Optimised formatter output differs from the legacy formatter")
+        print(f"Output identical for {min(len(records), 100)} records (timestamps excluded)")
+
+        timings = {
+            name: time_per_item(formatter.format, records, args.repeat)
+            for name, formatter in formatters.items()
+        }
+    finally:
+        correlation_id_var.reset(token)
+    return print_results('JSON log formatting', len(records), timings, unit='record')
+
+
+class FakeAPIError(Exception):
+    """Error shaped like anthropic.APIStatusError: a status_code and response headers."""
+
+    def __init__(self, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers={} if retry_after is None else {'retry-after': str(retry_after)})
+
+
+class FakeAsyncAnthropic:
+    """Stand-in for AsyncAnthropic that records concurrency and call times.
+
+    messages.create(request_id=...) raises the scripted errors for that
+    request in order, then succeeds after `latency` seconds.
+    """
+
+    def __init__(self, latency: float = 0.0, errors: Optional[Dict[int, List[Exception]]] = None):
+        self.messages = self
+        self.latency = latency
+        self.errors = {request_id: list(scripted) for request_id, scripted in (errors or {}).items()}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        # (request_id, time.monotonic()) per attempt
+        self.calls: List[Tuple[int, float]] = []
+
+    async def create(self, request_id: int = 0, **kwargs):
+        self.calls.append((request_id, time.monotonic()))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            scripted = self.errors.get(request_id)
+            if scripted:
+                raise scripted.pop(0)
+            return request_id
+        finally:
+            self.in_flight -= 1
+
+
+async def _gather_requests(parser: AsyncAIParser, count: int) -> List:
+    """Send count requests through the parser concurrently; errors are returned, not raised."""
+    return await asyncio.gather(
+        *(parser.create_message(request_id=request_id) for request_id in range(count)), return_exceptions=True
+    )
+
+
+def _attempt_gaps(calls: List[Tuple[int, float]], request_id: int) -> List[float]:
+    """Seconds between successive attempts of one request."""
+    times = [at for call_id, at in calls if call_id == request_id]
+    return [later - earlier for earlier, later in zip(times, times[1:])]
+
+
+def bench_async_ai(args) -> Dict:
+    """Check AsyncAIParser's concurrency limit, retries and rate limit against a fake client.
+
+    No API calls are made. The checks cover:
+    - in-flight requests never exceed max_concurrency
+    - 429 and 529 responses are retried with backoff bounded by max_delay,
+      and Retry-After is honoured
+    - other errors and exhausted retries raise
+    - the token bucket lets a burst through, then paces the rest at
+      requests_per_second
+    Timing compares the wrapper with calling the fake client directly.
+    """
+    # Retry warnings would flood the console
+    logging.disable(logging.WARNING)
+    try:
+        # Concurrency: 64 requests of 20 ms each, at most 4 in flight
+        client = FakeAsyncAnthropic(latency=0.02)
+        parser = AsyncAIParser(client, max_concurrency=4, requests_per_second=10_000, burst=10_000)
+        results = asyncio.run(_gather_requests(parser, 64))
+        if results != list(range(64)) or client.max_in_flight != 4:
+            raise SystemExit(f"Concurrency limit 4 not held: {client.max_in_flight} requests in flight")
+        print(f"{'concurrency limit':<22} 64 requests, at most {client.max_in_flight} in flight")
+
+        # Backoff: 429 then 529 before success; a Retry-After of 40 ms, above the first backoff's
+        # 10 ms jitter range and below max_delay (which caps it); retries exhausted; a 400
+        base_delay, max_delay = 0.01, 0.05
+        client = FakeAsyncAnthropic(errors={
+            **{request_id: [FakeAPIError(429), FakeAPIError(529)] for request_id in range(8)},
+            8: [FakeAPIError(429, retry_after=0.04)],
+            9: [FakeAPIError(529) for _ in range(4)],
+            10: [FakeAPIError(400)],
+        })
+        parser = AsyncAIParser(client, requests_per_second=10_000, burst=10_000,
+                               max_retries=3, base_delay=base_delay, max_delay=max_delay)
+        results = asyncio.run(_gather_requests(parser, 11))
+        if results[:9] != list(range(9)):
+            raise SystemExit(f"Retryable errors were not retried to success: {results[:9]}")
+        if getattr(results[9], 'status_code', None) != 529 or getattr(results[10], 'status_code', None) != 400:
+            raise SystemExit(f"Expected the exhausted 529 and the 400 to raise, got {results[9:]}")
+        attempts = {request_id: len(_attempt_gaps(client.calls, request_id)) + 1 for request_id in range(11)}
+        if [attempts[request_id] for request_id in range(11)] != [3] * 8 + [2, 4, 1]:
+            raise SystemExit(f"Unexpected attempts per request: {attempts}")
+        gaps = [gap for request_id in (*range(8), 9) for gap in _attempt_gaps(client.calls, request_id)]
+        # Sleep overshoot allowance on top of max_delay
+        if max(gaps) > max_delay + 0.05:
+            raise SystemExit(f"Backoff of {max(gaps):.3f}s exceeds max_delay {max_delay}s")
+        if _attempt_gaps(client.calls, 8)[0] < 0.04:
+            raise SystemExit("Retry-After of 0.04s was not honoured")
+        if parser.stats() != {'requests': 31, 'retries': 20, 'failures': 2}:
+            raise SystemExit(f"Unexpected parser counters: {parser.stats()}")
+        print(f"{'429/529 backoff':<22} {parser.stats()}, longest backoff {max(gaps) * 1000:.0f} ms, "
+              f"Retry-After wait {_attempt_gaps(client.calls, 8)[0] * 1000:.0f} ms")
+
+        # Token bucket: a burst of 5, then 50 requests per second
+        rate, burst, count = 50.0, 5, 30
+        client = FakeAsyncAnthropic()
+        parser = AsyncAIParser(client, max_concurrency=count, requests_per_second=rate, burst=burst)
+        asyncio.run(_gather_requests(parser, count))
+        starts = sorted(at for _, at in client.calls)
+        burst_span = starts[burst - 1] - starts[0]
+        paced_span = starts[-1] - starts[0]
+        expected = (count - burst) / rate
+        if burst_span > 0.02 or not expected * 0.95 <= paced_span <= expected + 0.1:
+            raise SystemExit(f"Token bucket: burst took {burst_span:.3f}s, {count} requests took "
+                             f"{paced_span:.3f}s (expected {expected:.3f}s)")
+        print(f"{'token bucket':<22} burst of {burst} in {burst_span * 1000:.1f} ms, "
+              f"{count} requests in {paced_span:.3f}s (expected {expected:.3f}s)")
+        if args.check:
+            return {}
+
+        # Per-request overhead of the wrapper when no limit is hit
+        client = FakeAsyncAnthropic()
+        parser = AsyncAIParser(client, max_concurrency=args.count, requests_per_second=1e9, burst=args.count)
+
+        async def direct():
+            await asyncio.gather(*(client.messages.create(request_id=request_id) for request_id in range(args.count)))
+
+        async def wrapped():
+            parser.rate_limiter._tokens = float(args.count)
+            await _gather_requests(parser, args.count)
+
+        timings = {
+            'fake client directly': time_per_item(lambda _: asyncio.run(direct()), [None], args.repeat),
+            'AsyncAIParser': time_per_item(lambda _: asyncio.run(wrapped()), [None], args.repeat),
+        }
+    finally:
+        logging.disable(logging.NOTSET)
+    return print_results('Async AI requests', args.count, timings, unit='request')
+
+
+BENCHMARKS = {
+    'xml-build': bench_xml_build,
+    'line-items': bench_line_items,
+    'output-modes': bench_output_modes,
+    'prevalidation': bench_prevalidation,
+    'bulk-validate': bench_bulk_validate,
+    'rules': bench_rules,
+    'extract': bench_extract,
+    'embedded': bench_embedded,
+    'pipeline': bench_pipeline,
+    'positions': bench_positions,
+    'log-format': bench_log_format,
+    'async-ai': bench_async_ai,
+}
+
+# Benchmarks whose output parity checks can run alone with --check
+CHECKED_BENCHMARKS = {'xml-build', 'line-items', 'output-modes', 'rules', 'extract', 'async-ai'}
+
+
+def main():
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description='Benchmarks for the KSeF invoice pipeline')
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS), help='Benchmark to run')
+    parser.add_argument('-n', '--count', type=int, default=1000, help='Number of invoices (default: 1000)')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Repetitions, best is reported (default: 3)')
+    parser.add_argument('-c', '--config', type=str, default='config.yaml', help='Generator config (default: config.yaml)')
+    parser.add_argument('--positions', type=parse_positions, help='Line items per generated invoice: N or MIN-MAX (default: from config)')
+    parser.add_argument('--pdf-dir', type=str, default=DEFAULT_PDF_DIR, help=f'PDF corpus for PDF-based benchmarks (default: {DEFAULT_PDF_DIR})')
+    parser.add_argument('--schema-type', choices=['FA2', 'FA3'], default='FA2', help='KSeF schema type (default: FA2)')
+    parser.add_argument('--json', type=str, help='Write results as JSON to this path')
+    parser.add_argument('--check', action='store_true',
+                        help=f"Only run the output parity checks, without timing; exits non-zero on a mismatch "
+                             f"({', '.join(sorted(CHECKED_BENCHMARKS))})")
+
+    args = parser.parse_args()
+    if args.check and args.benchmark not in CHECKED_BENCHMARKS:
+        parser.error(f"--check is not supported by {args.benchmark}")
+    results = BENCHMARKS[args.benchmark](args)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'benchmark': args.benchmark, 'count': args.count, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
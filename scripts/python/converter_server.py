@@ -0,0 +1,551 @@
+#!/usr/bin/env python3
+"""
+KSeF Converter Server
+
+Long-running HTTP service around KSeFXMLConverter. Worker processes are
+started once and each keeps a warm converter (imports, Anthropic client,
+compiled XSD schema), so on-demand conversions from other services do not
+pay the start-up cost of invoice_pdf_to_ksef_xml.py on every call.
+
+Endpoints:
+    POST /convert   PDF bytes (Content-Type: application/pdf, ?force_ai=1) or
+                    JSON {"pdf_path": "...", "force_ai": false} (only with --pdf-root;
+                    the path must lie inside that directory)
+                    -> JSON with xml, schema_validated, parsing_method; 422 if the
+                    conversion failed, including pre-validation or XSD errors
+    GET  /metrics   Queue depth, request counters, latency percentiles and
+                    per-stage histograms
+    GET  /health    Pool state: 200 if workers can take requests, 503 after a
+                    worker crash (the pool is restarted)
+
+Usage:
+    python converter_server.py --port 8765 -w 4
+    python converter_server.py --unix-socket /tmp/ksef-converter.sock
+
+    curl --data-binary @invoice.pdf -H 'Content-Type: application/pdf' localhost:8765/convert
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import invoice_pdf_to_ksef_xml
+from invoice_pdf_to_ksef_xml import _init_batch_worker, _percentile
+from pdf_text_backends import DEFAULT_BACKEND
+from logging_config import (
+    setup_logging,
+    get_logger,
+    parse_sample_rates,
+    LatencyHistogram,
+    get_stage_timings
+)
+
+# Initialize logger
+logger = get_logger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_QUEUE = 256
+DEFAULT_MAX_BODY_BYTES = 50 * 1024 * 1024  # 50 MB
+LATENCY_WINDOW = 10_000  # most recent requests used for percentiles
+
+
+# ============================================================================
+# Worker side
+# ============================================================================
+
+def _init_server_worker(converter_kwargs: Dict, logging_kwargs: Optional[Dict]):
+    """Configure logging in a spawned worker, then build its converter."""
+    if logging_kwargs is not None:
+        setup_logging(**logging_kwargs)
+    _init_batch_worker(converter_kwargs)
+
+
+def _warm_worker() -> int:
+    """Compile the XSD schema in this worker ahead of the first request."""
+    converter = invoice_pdf_to_ksef_xml._batch_converter
+    try:
+        invoice_pdf_to_ksef_xml.schema_registry.get_schema(converter.schema_type, converter.schema_path)
+    except Exception as e:
+        logger.warning(
+            f"Could not pre-compile XSD schema: {e}",
+            extra={'extra_fields': {'event_type': 'server_worker_warmup_failed'}}
+        )
+    return os.getpid()
+
+
+def _convert_request(pdf_path: Optional[str], pdf_bytes: Optional[bytes], force_ai: bool) -> Dict:
+    """Convert one PDF in a worker process and report the outcome instead of raising.
+
+    Runs the converter's own pipeline, so pre-validation, XSD sampling and the
+    rejection of invalid XML match the CLI and batch modes.
+    """
+    started = time.time()
+    converter = invoice_pdf_to_ksef_xml._batch_converter
+    result = {
+        'success': False,
+        'xml': None,
+        'schema_validated': None,
+        'parsing_method': None,
+        'error': None,
+        'worker_pid': os.getpid(),
+        'started_at': started
+    }
+
+    temp_path = None
+    try:
+        if pdf_bytes is not None:
+            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+                f.write(pdf_bytes)
+                temp_path = f.name
+            pdf_path = temp_path
+
+        result['xml'] = converter.convert_pdf_to_ksef_xml(pdf_path, force_ai=force_ai)
+        result['success'] = True
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    finally:
+        if temp_path:
+            os.unlink(temp_path)
+
+    result['parsing_method'] = converter.last_parsing_method
+    result['schema_validated'] = converter.last_schema_validated
+    result['convert_ms'] = round((time.time() - started) * 1000, 3)
+    result['stage_ms'] = get_stage_timings()
+    return result
+
+
+# ============================================================================
+# Server side
+# ============================================================================
+
+class ConverterPool:
+    """Process pool of warm converters with admission control and metrics."""
+
+    def __init__(self, workers: int, converter_kwargs: Optional[Dict] = None, max_queue: int = DEFAULT_MAX_QUEUE,
+                 logging_kwargs: Optional[Dict] = None):
+        """Start the worker processes and warm them up.
+
+        Args:
+            workers: Number of worker processes
+            converter_kwargs: Keyword arguments for each worker's KSeFXMLConverter
+            max_queue: Maximum number of accepted, unfinished requests; more are rejected
+            logging_kwargs: setup_logging() arguments for the workers (default: unconfigured)
+        """
+        self.workers = workers
+        self.max_queue = max_queue
+        self.converter_kwargs = converter_kwargs or {}
+        self.logging_kwargs = logging_kwargs
+        self.executor = self._start_executor()
+        # One warm-up task per worker also starts every process now
+        worker_pids = {future.result() for future in self._warm_up(self.executor)}
+
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.in_flight = 0
+        self.counters = {
+            'requests': 0,
+            'succeeded': 0,
+            'failed': 0,
+            'rejected': 0,
+            'worker_crashes': 0
+        }
+        self.parsing_methods: Dict[str, int] = {}
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._queue_waits = deque(maxlen=LATENCY_WINDOW)
+        # Worker stage timings, aggregated since start-up
+        self._stage_histograms: Dict[str, LatencyHistogram] = {}
+
+        logger.info(
+            "Converter pool started",
+            extra={'extra_fields': {
+                'workers': workers,
+                'worker_pids': sorted(worker_pids),
+                'max_queue': max_queue,
+                'event_type': 'server_pool_started'
+            }}
+        )
+
+    def _start_executor(self) -> ProcessPoolExecutor:
+        """Create a process pool whose workers each build a converter.
+
+        Workers are spawned rather than forked: a pool replaced after a crash is
+        created once the HTTP socket is open, and forked workers would inherit
+        it and keep the port bound after the server exits.
+        """
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_server_worker,
+            initargs=(self.converter_kwargs, self.logging_kwargs)
+        )
+
+    def _warm_up(self, executor: ProcessPoolExecutor) -> list:
+        """Submit one warm-up task per worker and return their futures."""
+        return [executor.submit(_warm_worker) for _ in range(self.workers)]
+
+    def _replace_broken_executor(self, broken: ProcessPoolExecutor, error: BaseException):
+        """Replace an executor whose worker died, unless another thread already did."""
+        with self._lock:
+            if self.executor is not broken:
+                return
+            self.executor = self._start_executor()
+            self.counters['worker_crashes'] += 1
+            # Not waited on; the new workers warm up while requests queue behind them
+            self._warm_up(self.executor)
+        broken.shutdown(wait=False, cancel_futures=True)
+        logger.error(
+            f"Converter worker died, restarted the pool: {error}",
+            extra={'extra_fields': {'workers': self.workers, 'event_type': 'server_pool_restarted'}}
+        )
+
+    def convert(self, pdf_path: Optional[str], pdf_bytes: Optional[bytes], force_ai: bool) -> Optional[Dict]:
+        """Run a conversion on the pool, or return None if the queue is full.
+
+        Raises:
+            BrokenProcessPool: If a worker died during the request; the pool is
+                               replaced, so the request can be retried
+        """
+        with self._lock:
+            if self.in_flight >= self.max_queue:
+                self.counters['rejected'] += 1
+                return None
+            self.in_flight += 1
+            self.counters['requests'] += 1
+            executor = self.executor
+
+        submitted = time.time()
+        try:
+            result = executor.submit(_convert_request, pdf_path, pdf_bytes, force_ai).result()
+        except BrokenProcessPool as e:
+            with self._lock:
+                self.counters['failed'] += 1
+            self._replace_broken_executor(executor, e)
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+        result['queue_ms'] = round(max(0.0, result.pop('started_at') - submitted) * 1000, 3)
+        result['duration_ms'] = round((time.time() - submitted) * 1000, 3)
+
+        with self._lock:
+            self._latencies.append(result['duration_ms'])
+            self._queue_waits.append(result['queue_ms'])
+            for stage, duration_ms in result['stage_ms'].items():
+                self._stage_histograms.setdefault(stage, LatencyHistogram()).add(duration_ms)
+            if result['success']:
+                self.counters['succeeded'] += 1
+                method = result['parsing_method']
+                self.parsing_methods[method] = self.parsing_methods.get(method, 0) + 1
+            else:
+                self.counters['failed'] += 1
+        return result
+
+    def health(self) -> Dict:
+        """Report whether the workers can take requests.
+
+        A dead worker breaks the whole executor, and submitting to a broken
+        executor fails at once, so a no-op submission checks the real state.
+        A broken pool is replaced, and the next check reports it healthy again.
+        """
+        with self._lock:
+            executor = self.executor
+            in_flight = self.in_flight
+            worker_crashes = self.counters['worker_crashes']
+        try:
+            executor.submit(os.getpid)
+        except BrokenProcessPool as e:
+            self._replace_broken_executor(executor, e)
+            return {'status': 'unavailable', 'error': f"Converter worker died: {e}", 'worker_crashes': worker_crashes + 1}
+        except RuntimeError as e:
+            # Submitting after shutdown
+            return {'status': 'unavailable', 'error': str(e), 'worker_crashes': worker_crashes}
+        return {'status': 'ok', 'workers': self.workers, 'in_flight': in_flight, 'worker_crashes': worker_crashes}
+
+    def metrics(self) -> Dict:
+        """Return queue depth, counters and latency percentiles."""
+        with self._lock:
+            latencies = list(self._latencies)
+            queue_waits = list(self._queue_waits)
+            in_flight = self.in_flight
+            counters = dict(self.counters)
+            parsing_methods = dict(self.parsing_methods)
+            stage_histograms = dict(self._stage_histograms)
+
+        def percentiles(values):
+            return {
+                'p50': _percentile(values, 50),
+                'p95': _percentile(values, 95),
+                'p99': _percentile(values, 99),
+                'max': max(values) if values else None
+            }
+
+        return {
+            'uptime_s': round(time.time() - self.started_at, 3),
+            'workers': self.workers,
+            'in_flight': in_flight,
+            'queue_depth': max(0, in_flight - self.workers),
+            'max_queue': self.max_queue,
+            **counters,
+            'parsing_methods': parsing_methods,
+            'latency_ms': percentiles(latencies),
+            'queue_wait_ms': percentiles(queue_waits),
+            'stages_ms': {stage: histogram.summary() for stage, histogram in sorted(stage_histograms.items())}
+        }
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+class ConverterRequestHandler(BaseHTTPRequestHandler):
+    """HTTP front end for ConverterPool."""
+
+    server_version = "KSeFConverter/1.0"
+
+    def _send_json(self, status: int, payload: Dict):
+        """Send a JSON response."""
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Route access logs to the structured logger."""
+        logger.debug(format % args, extra={'extra_fields': {'event_type': 'server_access'}})
+
+    def do_GET(self):
+        """Serve /health and /metrics."""
+        path = urlparse(self.path).path
+        if path == '/health':
+            health = self.server.pool.health()
+            self._send_json(200 if health['status'] == 'ok' else 503, health)
+        elif path == '/metrics':
+            self._send_json(200, self.server.pool.metrics())
+        else:
+            self._send_json(404, {'error': f"Unknown endpoint: {path}"})
+
+    def _read_request(self) -> Tuple[Optional[str], Optional[bytes], bool]:
+        """Parse a /convert request into (pdf_path, pdf_bytes, force_ai).
+
+        Raises:
+            ValueError: If the request is malformed
+            PermissionError: If a pdf_path is sent but not allowed
+        """
+        length = int(self.headers.get('Content-Length') or 0)
+        if length <= 0:
+            raise ValueError("Empty request body")
+        if length > self.server.max_body_bytes:
+            raise OverflowError(f"Request body exceeds {self.server.max_body_bytes} bytes")
+        body = self.rfile.read(length)
+
+        query = parse_qs(urlparse(self.path).query)
+        force_ai = query.get('force_ai', ['0'])[0].lower() in ('1', 'true', 'yes')
+
+        content_type = (self.headers.get('Content-Type') or '').split(';')[0].strip().lower()
+        if content_type == 'application/json':
+            request = json.loads(body)
+            if not isinstance(request, dict) or not request.get('pdf_path'):
+                raise ValueError("JSON body must contain 'pdf_path'")
+            return self._resolve_pdf_path(str(request['pdf_path'])), None, bool(request.get('force_ai', force_ai))
+        if content_type in ('application/pdf', 'application/octet-stream'):
+            return None, body, force_ai
+        raise ValueError(f"Unsupported Content-Type: {content_type or 'none'}")
+
+    def _resolve_pdf_path(self, pdf_path: str) -> str:
+        """Resolve a requested PDF path against --pdf-root.
+
+        Relative paths are taken from the root; symlinks are resolved before
+        the check, so they cannot point outside it.
+
+        Raises:
+            PermissionError: If no root is configured or the path is outside it
+        """
+        pdf_root = self.server.pdf_root
+        if pdf_root is None:
+            raise PermissionError("pdf_path requests are disabled; start the server with --pdf-root")
+        resolved = os.path.realpath(os.path.join(pdf_root, pdf_path))
+        if os.path.commonpath([resolved, pdf_root]) != pdf_root:
+            raise PermissionError(f"pdf_path is outside the allowed directory: {pdf_path}")
+        return resolved
+
+    def do_POST(self):
+        """Serve /convert."""
+        path = urlparse(self.path).path
+        if path != '/convert':
+            self._send_json(404, {'error': f"Unknown endpoint: {path}"})
+            return
+
+        try:
+            pdf_path, pdf_bytes, force_ai = self._read_request()
+        except OverflowError as e:
+            self._send_json(413, {'success': False, 'error': str(e)})
+            return
+        except PermissionError as e:
+            logger.warning(
+                f"Rejected pdf_path request: {e}",
+                extra={'extra_fields': {'client': self.client_address[0], 'event_type': 'pdf_path_rejected'}}
+            )
+            self._send_json(403, {'success': False, 'error': str(e)})
+            return
+        except ValueError as e:
+            self._send_json(400, {'success': False, 'error': str(e)})
+            return
+
+        try:
+            result = self.server.pool.convert(pdf_path, pdf_bytes, force_ai)
+        except BrokenProcessPool as e:
+            self._send_json(503, {'success': False, 'error': f"Converter worker died, retry later: {e}"})
+            return
+        except Exception as e:
+            logger.error(
+                f"Conversion request failed: {e}",
+                extra={'extra_fields': {'event_type': 'server_request_failed'}},
+                exc_info=True
+            )
+            self._send_json(500, {'success': False, 'error': f"{type(e).__name__}: {e}"})
+            return
+        if result is None:
+            self._send_json(503, {'success': False, 'error': "Conversion queue is full, retry later"})
+        else:
+            self._send_json(200 if result['success'] else 422, result)
+
+
+class ConverterHTTPServer(ThreadingHTTPServer):
+    """Threaded HTTP server; each request thread waits on the process pool."""
+
+    daemon_threads = True
+
+    def __init__(self, server_address, pool: ConverterPool, max_body_bytes: int = DEFAULT_MAX_BODY_BYTES,
+                 pdf_root: Optional[str] = None):
+        self.pool = pool
+        self.max_body_bytes = max_body_bytes
+        # Directory JSON pdf_path requests may read from; None disables them
+        self.pdf_root = os.path.realpath(pdf_root) if pdf_root else None
+        super().__init__(server_address, ConverterRequestHandler)
+
+
+class UnixConverterHTTPServer(ConverterHTTPServer):
+    """ConverterHTTPServer listening on a Unix domain socket."""
+
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        # HTTPServer.server_bind expects a (host, port) address
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        return request, ('unix', 0)
+
+
+def _exit_on_signal(signum, frame):
+    """Signal handler that unwinds main() through its cleanup."""
+    raise SystemExit(128 + signum)
+
+
+def main():
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(
+        description='Serve PDF to KSeF XML conversions from a pool of warm converters'
+    )
+    parser.add_argument('--host', type=str, default=DEFAULT_HOST, help=f'Bind address (default: {DEFAULT_HOST})')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'TCP port (default: {DEFAULT_PORT})')
+    parser.add_argument('--unix-socket', type=str, help='Listen on this Unix socket instead of TCP')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help='Worker processes (default: CPU count)')
+    parser.add_argument('--pdf-root', type=str, help='Allow JSON pdf_path requests for PDFs inside this directory (disabled by default)')
+    parser.add_argument('--max-queue', type=int, default=DEFAULT_MAX_QUEUE, help=f'Maximum unfinished requests before 503 (default: {DEFAULT_MAX_QUEUE})')
+    parser.add_argument('--api-key', type=str, help='Anthropic API key (or set ANTHROPIC_API_KEY env var)')
+    parser.add_argument('--schema-type', choices=['FA2', 'FA3'], default='FA2', help='KSeF schema type (default: FA2)')
+    parser.add_argument('--pdf-backend', type=str, default=DEFAULT_BACKEND, help=f'PDF text extraction backend: pdfplumber, pypdfium2, pymupdf or auto (default: {DEFAULT_BACKEND})')
+    parser.add_argument('--no-prevalidate', action='store_true', help='Skip the fast XSD facet check of parsed invoice data')
+    parser.add_argument('--xsd-sample-rate', type=float, default=1.0, help='Fraction of conversions validated against the full XSD schema, 0.0-1.0 (default: 1.0)')
+    parser.add_argument('--no-ai-cache', action='store_true', help='Disable the Claude AI parse cache')
+    parser.add_argument('--use-embedded', action='store_true', help='Use invoice data embedded by the PDF generator (only for PDFs you generated)')
+    parser.add_argument('--sync-logging', action='store_true', help='Write logs on the request threads instead of a background thread')
+    parser.add_argument('--log-sample', action='append', default=[], metavar='EVENT=RATE', help="Keep this fraction of an event type's INFO records; 'batch' for the batch presets (can be repeated)")
+    parser.add_argument('--log-rate-limit', type=float, help='Maximum INFO records per second per logger')
+
+    args = parser.parse_args()
+    try:
+        sample_rates = parse_sample_rates(args.log_sample)
+    except ValueError as e:
+        parser.error(str(e))
+    if not 0.0 <= args.xsd_sample_rate <= 1.0:
+        parser.error('--xsd-sample-rate must be between 0.0 and 1.0')
+
+    # Initialize logging; request threads only enqueue records unless --sync-logging
+    logging_kwargs = {
+        'log_level': "INFO",
+        'log_file': "logs/converter_server.log",
+        'log_format': "json",
+        'async_logging': not args.sync_logging,
+        'sample_rates': sample_rates,
+        'rate_limit': args.log_rate_limit
+    }
+    setup_logging(**logging_kwargs)
+
+    converter_kwargs = {
+        'anthropic_api_key': args.api_key,
+        'schema_type': args.schema_type,
+        'pdf_backend': args.pdf_backend,
+        'use_ai_cache': not args.no_ai_cache,
+        'use_embedded_data': args.use_embedded,
+        'prevalidate': not args.no_prevalidate,
+        'xsd_sample_rate': args.xsd_sample_rate
+    }
+    pool = ConverterPool(args.workers, converter_kwargs, args.max_queue, logging_kwargs)
+
+    if args.unix_socket:
+        if os.path.exists(args.unix_socket):
+            os.unlink(args.unix_socket)
+        server = UnixConverterHTTPServer(args.unix_socket, pool, pdf_root=args.pdf_root)
+        address = args.unix_socket
+    else:
+        server = ConverterHTTPServer((args.host, args.port), pool, pdf_root=args.pdf_root)
+        address = f"http://{args.host}:{server.server_port}"
+
+    print(f"\n{'='*60}")
+    print(f"KSeF converter server listening on {address}")
+    print(f"Workers: {args.workers}, max queue: {args.max_queue}")
+    print(f"{'='*60}\n")
+    logger.info(
+        "Converter server started",
+        extra={'extra_fields': {'address': address, 'workers': args.workers, 'event_type': 'server_started'}}
+    )
+
+    # Stop on SIGTERM like on Ctrl-C, so the workers are shut down too
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.shutdown()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.unlink(args.unix_socket)
+        logger.info("Converter server stopped", extra={'extra_fields': {'event_type': 'server_stopped'}})
+
+
+if __name__ == '__main__':
+    main()
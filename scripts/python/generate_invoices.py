@@ -10,26 +10,53 @@ import json
 import yaml
 import random
 import argparse
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Tuple
 import os
+from invoice_pdf_to_ksef_xml import KSeFXMLConverter
 from pdf_generator import PDFInvoiceGenerator
 
+try:
+    import numpy as np
+except ImportError:  # optional, only needed for vectorized generation
+    np = None
+
 # Import logging configuration
-from logging_config import setup_logging, get_logger, set_correlation_id
+from logging_config import setup_logging, get_logger, set_correlation_id, parse_sample_rates
 
 # Initialize logger
 logger = get_logger(__name__)
 
+# Invoices per NumPy batch in vectorized generation
+DEFAULT_BATCH_SIZE = 10_000
+
 
 class InvoiceGenerator:
     """Generate random invoices based on configuration."""
 
-    def __init__(self, config_path: str = "config.yaml"):
-        """Initialize generator with config file."""
+    def __init__(self, config_path: str = "config.yaml", seed: Optional[int] = None):
+        """Initialize generator with config file.
+
+        Args:
+            config_path: Path to the YAML config
+            seed: Optional seed. Each invoice's content is then derived from
+                  (seed, invoice index) only, so any subset of the corpus can
+                  be regenerated identically. Without a seed the global
+                  `random` module is used.
+        """
+        self.seed = seed
+        # Random source for the invoice being generated
+        self.random = random if seed is None else random.Random(f"{seed}:config")
         self.config = self.load_config(config_path)
 
+    def invoice_random(self, invoice_number: int):
+        """Return the random source for one invoice (global `random` if unseeded)."""
+        if self.seed is None:
+            return random
+        return random.Random(f"{self.seed}:{invoice_number}")
+
     def load_config(self, config_path: str) -> Dict:
         """Load configuration from YAML file."""
         config_file = Path(config_path)
@@ -45,7 +72,7 @@ class InvoiceGenerator:
         return {
             'seller': {
                 'name': 'DEFAULT SELLER',
-                'tax_no': self.generate_nip(),
+                'tax_no': self.generate_nip(self.random),
                 'street': 'ul. Testowa 1',
                 'post_code': '00-000',
                 'city': 'Warszawa',
@@ -54,7 +81,7 @@ class InvoiceGenerator:
                 'phone': '+48123456789',
                 'person': 'Jan Kowalski',
                 'bank': 'PKO BP',
-                'bank_account': self.generate_bank_account()
+                'bank_account': self.generate_bank_account(self.random)
             },
             'buyer': {},
             'invoice': {
@@ -81,15 +108,15 @@ class InvoiceGenerator:
         }
 
     @staticmethod
-    def generate_nip() -> str:
+    def generate_nip(rng=random) -> str:
         """Generate random valid NIP number."""
         # Simple random 10-digit NIP (not validated)
-        return ''.join([str(random.randint(0, 9)) for _ in range(10)])
+        return ''.join([str(rng.randint(0, 9)) for _ in range(10)])
 
     @staticmethod
-    def generate_bank_account() -> str:
+    def generate_bank_account(rng=random) -> str:
         """Generate random bank account number (26 digits for Polish IBAN)."""
-        return ''.join([str(random.randint(0, 9)) for _ in range(26)])
+        return ''.join([str(rng.randint(0, 9)) for _ in range(26)])
 
     def generate_buyer(self) -> Dict:
         """Generate random buyer or use from config."""
@@ -99,7 +126,7 @@ class InvoiceGenerator:
         if buyer_config.get('name'):
             return {
                 'buyer_name': buyer_config['name'],
-                'buyer_tax_no': buyer_config.get('tax_no') or self.generate_nip(),
+                'buyer_tax_no': buyer_config.get('tax_no') or self.generate_nip(self.random),
                 'buyer_street': buyer_config.get('street', 'ul. Kupujacego 10'),
                 'buyer_post_code': buyer_config.get('post_code', '00-001'),
                 'buyer_city': buyer_config.get('city', 'Warszawa'),
@@ -119,11 +146,11 @@ class InvoiceGenerator:
             cities = ['Warszawa', 'Krakow', 'Wroclaw', 'Poznan', 'Gdansk']
 
             return {
-                'buyer_name': random.choice(companies),
-                'buyer_tax_no': self.generate_nip(),
-                'buyer_street': f'ul. {random.choice(["Wielka", "Mala", "Nowa", "Stara"])} {random.randint(1, 100)}',
-                'buyer_post_code': f'{random.randint(10, 99)}-{random.randint(100, 999)}',
-                'buyer_city': random.choice(cities),
+                'buyer_name': self.random.choice(companies),
+                'buyer_tax_no': self.generate_nip(self.random),
+                'buyer_street': f'ul. {self.random.choice(["Wielka", "Mala", "Nowa", "Stara"])} {self.random.randint(1, 100)}',
+                'buyer_post_code': f'{self.random.randint(10, 99)}-{self.random.randint(100, 999)}',
+                'buyer_city': self.random.choice(cities),
                 'buyer_country': 'PL',
                 'buyer_email': '',
                 'buyer_phone': '',
@@ -135,7 +162,7 @@ class InvoiceGenerator:
         seller = self.config.get('seller', {})
         return {
             'seller_name': seller.get('name', 'DEFAULT SELLER'),
-            'seller_tax_no': seller.get('tax_no', self.generate_nip()),
+            'seller_tax_no': seller.get('tax_no', self.generate_nip(self.random)),
             'seller_street': seller.get('street', 'ul. Sprzedawcy 1'),
             'seller_post_code': seller.get('post_code', '00-000'),
             'seller_city': seller.get('city', 'Warszawa'),
@@ -146,7 +173,7 @@ class InvoiceGenerator:
             'seller_www': '',
             'seller_person': seller.get('person', ''),
             'seller_bank': seller.get('bank', 'PKO BP'),
-            'seller_bank_account': seller.get('bank_account', self.generate_bank_account())
+            'seller_bank_account': seller.get('bank_account', self.generate_bank_account(self.random))
         }
 
     def generate_positions(self) -> List[Dict]:
@@ -159,7 +186,7 @@ class InvoiceGenerator:
         min_qty = gen_config.get('min_quantity', 1)
         max_qty = gen_config.get('max_quantity', 10)
 
-        num_positions = random.randint(min_pos, max_pos)
+        num_positions = self.random.randint(min_pos, max_pos)
         positions = []
 
         invoice_config = self.config.get('invoice', {})
@@ -167,10 +194,10 @@ class InvoiceGenerator:
         quantity_unit = invoice_config.get('quantity_unit', 'szt')
 
         for _ in range(num_positions):
-            product = random.choice(products)
-            quantity = random.randint(min_qty, max_qty)
+            product = self.random.choice(products)
+            quantity = self.random.randint(min_qty, max_qty)
 
-            price_net = round(random.uniform(
+            price_net = round(self.random.uniform(
                 product['price_net_min'],
                 product['price_net_max']
             ), 2)
@@ -182,29 +209,141 @@ class InvoiceGenerator:
             total_price_tax = round(price_tax * quantity, 2)
             total_price_gross = round(price_gross * quantity, 2)
 
-            position = {
-                'name': product['name'],
-                'price_net': str(price_net),
-                'quantity': str(float(quantity)),
-                'total_price_gross': str(total_price_gross),
-                'total_price_net': str(total_price_net),
-                'additional_info': '',
-                'quantity_unit': quantity_unit,
-                'tax': str(tax_rate),
-                'price_gross': str(price_gross),
-                'price_tax': str(price_tax),
-                'total_price_tax': str(total_price_tax),
-                'discount': None,
-                'discount_percent': None,
-                'tax2': '0',
-                'code': None
-            }
-            positions.append(position)
+            positions.append(self._make_position(
+                product['name'], quantity, quantity_unit, tax_rate,
+                price_net, price_tax, price_gross,
+                total_price_net, total_price_tax, total_price_gross
+            ))
 
         return positions
 
-    def generate_invoice(self, invoice_number: int, date: datetime = None) -> Dict:
-        """Generate a single invoice."""
+    @staticmethod
+    def _make_position(name: str, quantity: int, quantity_unit: str, tax_rate,
+                       price_net: float, price_tax: float, price_gross: float,
+                       total_price_net: float, total_price_tax: float, total_price_gross: float) -> Dict:
+        """Build a position dictionary from already rounded amounts."""
+        return {
+            'name': name,
+            'price_net': str(price_net),
+            'quantity': str(float(quantity)),
+            'total_price_gross': str(total_price_gross),
+            'total_price_net': str(total_price_net),
+            'additional_info': '',
+            'quantity_unit': quantity_unit,
+            'tax': str(tax_rate),
+            'price_gross': str(price_gross),
+            'price_tax': str(price_tax),
+            'total_price_tax': str(total_price_tax),
+            'discount': None,
+            'discount_percent': None,
+            'tax2': '0',
+            'code': None
+        }
+
+    def generate_position_arrays(self, invoice_count: int, rng) -> Dict[str, Any]:
+        """Draw line items for a batch of invoices as NumPy arrays.
+
+        Product indices, quantities and prices for the whole batch are drawn at
+        once and all amounts are computed in integer grosze, with VAT rounded
+        half up to the grosz per unit and line totals exact multiples of it.
+
+        Args:
+            invoice_count: Number of invoices in the batch
+            rng: numpy.random.Generator
+
+        Returns:
+            Columnar batch: 'counts' (lines per invoice), 'product_index',
+            'quantity' and grosze amounts 'price_net', 'price_tax', 'price_gross',
+            'total_price_net', 'total_price_tax', 'total_price_gross' (one entry per line)
+        """
+        if np is None:
+            raise ImportError("Vectorized generation requires NumPy: pip install numpy")
+
+        gen_config = self.config.get('generation', {})
+        products = self.config.get('products', [])
+        tax_rate = self.config.get('invoice', {}).get('tax_rate', 23)
+
+        counts = rng.integers(gen_config.get('min_positions', 1), gen_config.get('max_positions', 5),
+                              size=invoice_count, endpoint=True)
+        total = int(counts.sum())
+
+        product_index = rng.integers(0, len(products), size=total)
+        quantity = rng.integers(gen_config.get('min_quantity', 1), gen_config.get('max_quantity', 10),
+                                size=total, endpoint=True)
+
+        price_min = np.array([round(p['price_net_min'] * 100) for p in products], dtype=np.int64)
+        price_max = np.array([round(p['price_net_max'] * 100) for p in products], dtype=np.int64)
+        price_net = rng.integers(price_min[product_index], price_max[product_index], endpoint=True)
+        price_tax = np.floor(price_net * tax_rate / 100 + 0.5).astype(np.int64)
+        price_gross = price_net + price_tax
+
+        return {
+            'counts': counts,
+            'product_index': product_index,
+            'quantity': quantity,
+            'price_net': price_net,
+            'price_tax': price_tax,
+            'price_gross': price_gross,
+            'total_price_net': price_net * quantity,
+            'total_price_tax': price_tax * quantity,
+            'total_price_gross': price_gross * quantity
+        }
+
+    def materialize_positions(self, arrays: Dict[str, Any]) -> List[List[Dict]]:
+        """Turn a batch from generate_position_arrays() into position dictionaries."""
+        invoice_config = self.config.get('invoice', {})
+        tax_rate = invoice_config.get('tax_rate', 23)
+        quantity_unit = invoice_config.get('quantity_unit', 'szt')
+        names = [p['name'] for p in self.config.get('products', [])]
+
+        amounts = [
+            (arrays[key] / 100).tolist() for key in (
+                'price_net', 'price_tax', 'price_gross',
+                'total_price_net', 'total_price_tax', 'total_price_gross'
+            )
+        ]
+        rows = list(zip(arrays['product_index'].tolist(), arrays['quantity'].tolist(), *amounts))
+
+        batch = []
+        offset = 0
+        for count in arrays['counts'].tolist():
+            batch.append([
+                self._make_position(names[row[0]], row[1], quantity_unit, tax_rate, *row[2:])
+                for row in rows[offset:offset + count]
+            ])
+            offset += count
+        return batch
+
+    def generate_position_batch(self, invoice_count: int, rng) -> List[List[Dict]]:
+        """Generate positions for a batch of invoices with NumPy.
+
+        Returns:
+            One list of positions per invoice
+        """
+        return self.materialize_positions(self.generate_position_arrays(invoice_count, rng))
+
+    def _iter_position_batches(self, first: int, last: int, batch_size: int) -> Iterator[List[Dict]]:
+        """Yield vectorized positions for invoices first..last (inclusive).
+
+        Batches are aligned to absolute invoice indices and, with a seed, drawn
+        from numpy.random.default_rng((seed, batch number)), so every shard sees
+        the same positions for the same invoice index.
+        """
+        if np is None:
+            raise ImportError("Vectorized generation requires NumPy: pip install numpy")
+
+        for batch_number in range((first - 1) // batch_size, (last - 1) // batch_size + 1):
+            if self.seed is None:
+                rng = np.random.default_rng()
+            else:
+                rng = np.random.default_rng([self.seed & 0xFFFFFFFFFFFFFFFF, batch_number])
+            batch_first = batch_number * batch_size + 1
+            batch = self.generate_position_batch(batch_size, rng)
+            for i in range(max(first, batch_first), min(last, batch_first + batch_size - 1) + 1):
+                yield batch[i - batch_first]
+
+    def generate_invoice(self, invoice_number: int, date: datetime = None, positions: Optional[List[Dict]] = None) -> Dict:
+        """Generate a single invoice (with the given positions, if provided)."""
         if date is None:
             date = datetime.now()
 
@@ -216,7 +355,8 @@ class InvoiceGenerator:
         payment_to = (date + timedelta(days=payment_days)).strftime('%Y-%m-%d')
 
         # Generate positions
-        positions = self.generate_positions()
+        if positions is None:
+            positions = self.generate_positions()
 
         # Calculate totals
         price_net = sum(float(p['total_price_net']) for p in positions)
@@ -276,57 +416,176 @@ class InvoiceGenerator:
 
         return invoice
 
-    def generate_invoices(self, count: int, start_date: datetime = None) -> List[Dict]:
-        """Generate N invoices."""
+    def iter_invoices(
+        self,
+        count: int,
+        start_date: datetime = None,
+        shard: Tuple[int, int] = (0, 1),
+        vectorized: bool = False,
+        batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> Iterator[Dict]:
+        """Generate N invoices lazily, one at a time.
+
+        Args:
+            count: Size of the whole logical corpus
+            start_date: Latest issue date (default: now). Pass a fixed date for
+                        reproducible output.
+            shard: (index, total) - only yield the index-th of `total` contiguous
+                   slices of the corpus. With a seed, the shards of N nodes
+                   together are identical to a single-node run.
+            vectorized: Draw positions for `batch_size` invoices at a time with
+                        NumPy (see generate_position_batch). Output differs from
+                        the pure Python path but is equally reproducible.
+            batch_size: Invoices per NumPy batch
+        """
         if start_date is None:
             start_date = datetime.now()
 
-        invoices = []
-        for i in range(1, count + 1):
-            # Vary dates slightly
-            invoice_date = start_date - timedelta(days=random.randint(0, 30))
-            invoice = self.generate_invoice(i, invoice_date)
-            invoices.append(invoice)
+        shard_index, shard_count = shard
+        first = count * shard_index // shard_count + 1
+        last = count * (shard_index + 1) // shard_count
 
-        return invoices
+        position_batches = self._iter_position_batches(first, last, batch_size) if vectorized else None
 
-    def save_invoices(self, invoices: List[Dict]):
-        """Save invoices to files."""
+        for i in range(first, last + 1):
+            self.random = self.invoice_random(i)
+            # Vary dates slightly
+            invoice_date = start_date - timedelta(days=self.random.randint(0, 30))
+            positions = next(position_batches) if position_batches is not None else None
+            yield self.generate_invoice(i, invoice_date, positions)
+
+    def generate_invoices(self, count: int, start_date: datetime = None) -> List[Dict]:
+        """Generate N invoices."""
+        return list(self.iter_invoices(count, start_date))
+
+    def save_invoices(
+        self,
+        invoices: Iterable[Dict],
+        workers: int = 1,
+        max_in_flight: Optional[int] = None,
+        output_format: Optional[str] = None,
+        schema_type: str = 'FA2',
+        validate_xml: bool = False
+    ) -> int:
+        """Save invoices to files.
+
+        Invoices are consumed lazily, so an iter_invoices() generator can be
+        passed without building the whole corpus in memory. Their content is
+        generated in this process, so output does not depend on `workers`.
+
+        Args:
+            invoices: Invoice dictionaries (list or iterator)
+            workers: Number of rendering processes, each with its own
+                     PDFInvoiceGenerator. 1 renders in-process.
+            max_in_flight: Maximum number of invoices queued to the pool
+                           (default: 4 per worker)
+            output_format: 'pdf', 'json' or 'xml' (default: generation.output_format from config)
+            schema_type: KSeF schema type for XML output ('FA2' or 'FA3')
+            validate_xml: Validate every XML invoice against the XSD schema
+
+        Returns:
+            Number of invoices saved
+
+        Raises:
+            ValueError: If XML validation fails for an invoice
+        """
         gen_config = self.config.get('generation', {})
         output_dir = Path(gen_config.get('output_dir', './generated'))
-        output_format = gen_config.get('output_format', 'pdf')
+        output_format = output_format or gen_config.get('output_format', 'pdf')
 
         # Create output directory
         output_dir.mkdir(parents=True, exist_ok=True)
 
-        # Initialize PDF generator if needed
-        if output_format == 'pdf':
-            pdf_gen = PDFInvoiceGenerator()
-
-        for invoice in invoices:
-            filename = f"faktura-{invoice['number'].replace('/', '-')}.{output_format}"
-            filepath = output_dir / filename
-
-            if output_format == 'json':
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    json.dump(invoice, f, indent=2, ensure_ascii=False)
-            elif output_format == 'pdf':
-                pdf_gen.generate_pdf(invoice, str(filepath))
-            elif output_format == 'xml':
-                # XML generation can be added later
-                logger.warning("XML format not yet implemented, saving as JSON instead", extra={'extra_fields': {'invoice_number': invoice.get('number')}})
-                filepath = output_dir / filename.replace('.xml', '.json')
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    json.dump(invoice, f, indent=2, ensure_ascii=False)
-
-            logger.info(f"Invoice generated successfully", extra={'extra_fields': {'filepath': str(filepath), 'invoice_number': invoice.get('number'), 'event_type': 'invoice_generated'}})
+        # Seeded corpora are rendered byte-for-byte reproducibly
+        invariant = self.seed is not None
+        worker_args = (output_format, invariant, schema_type, validate_xml)
+
+        saved = 0
+        if workers <= 1:
+            _init_render_worker(*worker_args)
+            for invoice in invoices:
+                _render_invoice(invoice, str(output_dir), output_format)
+                saved += 1
+            return saved
+
+        max_in_flight = max_in_flight or workers * 4
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_render_worker,
+            initargs=worker_args
+        ) as executor:
+            in_flight = set()
+            for invoice in invoices:
+                # Bound queued work so memory stays flat for large corpora
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                        saved += 1
+                in_flight.add(executor.submit(_render_invoice, invoice, str(output_dir), output_format))
+
+            for future in wait(in_flight).done:
+                future.result()
+                saved += 1
+
+        return saved
+
+
+# PDF generator / XML converter reused by every invoice rendered in this (worker) process
+_pdf_generator: Optional[PDFInvoiceGenerator] = None
+_xml_converter: Optional[KSeFXMLConverter] = None
+_validate_xml = False
+_invariant = False
+
+
+def _init_render_worker(output_format: str, invariant: bool = False, schema_type: str = 'FA2', validate_xml: bool = False):
+    """Create the generator/converter reused by every task in this worker process."""
+    global _pdf_generator, _xml_converter, _validate_xml, _invariant
+    _invariant = invariant
+    if output_format == 'pdf':
+        _pdf_generator = PDFInvoiceGenerator(invariant=invariant)
+    elif output_format == 'xml':
+        # One converter per process, so the compiled XSD schema is reused; like full
+        # validation, pre-validation needs the imported schemas, so it only runs with --validate
+        _xml_converter = KSeFXMLConverter(schema_type=schema_type, prevalidate=validate_xml)
+        _validate_xml = validate_xml
+
+
+def _render_invoice(invoice: Dict, output_dir: str, output_format: str) -> str:
+    """Write one invoice in the configured format and return its path."""
+    filename = f"faktura-{invoice['number'].replace('/', '-')}.{output_format}"
+    filepath = Path(output_dir) / filename
+
+    if output_format == 'json':
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(invoice, f, indent=2, ensure_ascii=False)
+    elif output_format == 'pdf':
+        _pdf_generator.generate_pdf(invoice, str(filepath))
+    elif output_format == 'xml':
+        # Seeded corpora take the generation time from the (seed-derived) issue date
+        generated_at = f"{invoice['issue_date']}T00:00:00" if _invariant else None
+        _xml_converter.save_ksef_xml(invoice, str(filepath), validate=_validate_xml, generated_at=generated_at)
+    else:
+        raise ValueError(f"Unsupported output format: {output_format}")
+
+    logger.info(f"Invoice generated successfully", extra={'extra_fields': {'filepath': str(filepath), 'invoice_number': invoice.get('number'), 'event_type': 'invoice_generated'}})
+    return str(filepath)
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """Parse a --shard value 'I/N' into (I, N)."""
+    index, _, total = value.partition('/')
+    try:
+        shard = (int(index), int(total))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected I/N, got {value!r}")
+    if shard[1] < 1 or not 0 <= shard[0] < shard[1]:
+        raise argparse.ArgumentTypeError(f"shard index must be in 0..N-1, got {value!r}")
+    return shard
 
 
 def main():
     """Main entry point."""
-    # Initialize logging
-    setup_logging(log_level="INFO", log_file="logs/invoice_generator.log", log_format="json")
-
     parser = argparse.ArgumentParser(
         description='Generate random invoices for testing'
     )
@@ -342,23 +601,111 @@ def main():
         default='config.yaml',
         help='Path to config file (default: config.yaml)'
     )
+    parser.add_argument(
+        '-f', '--format',
+        choices=['pdf', 'json', 'xml'],
+        help='Output format (default: generation.output_format from config)'
+    )
+    parser.add_argument(
+        '--schema-type',
+        choices=['FA2', 'FA3'],
+        default='FA2',
+        help='KSeF schema type for XML output (default: FA2)'
+    )
+    parser.add_argument(
+        '--validate',
+        action='store_true',
+        help='Validate every XML invoice against the KSeF XSD schema'
+    )
+    parser.add_argument(
+        '-w', '--workers',
+        type=int,
+        default=1,
+        help='Number of processes rendering files (default: 1, 0 = CPU count)'
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        help='Seed for reproducible output; each invoice is derived from (seed, index)'
+    )
+    parser.add_argument(
+        '--shard',
+        type=parse_shard,
+        default=(0, 1),
+        metavar='I/N',
+        help='Generate only slice I of N (0-based) of the corpus, e.g. 0/4 .. 3/4'
+    )
+    parser.add_argument(
+        '--vectorized',
+        action='store_true',
+        help='Generate line items in NumPy batches (requires numpy)'
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f'Invoices per NumPy batch with --vectorized (default: {DEFAULT_BATCH_SIZE})'
+    )
+    parser.add_argument(
+        '--start-date',
+        type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+        help='Latest issue date as YYYY-MM-DD (default: today); fix it for reproducible output'
+    )
+    parser.add_argument(
+        '--async-logging',
+        action='store_true',
+        help='Write logs from a background thread so generation never waits on log I/O'
+    )
+    parser.add_argument(
+        '--log-sample',
+        action='append',
+        default=[],
+        metavar='EVENT=RATE',
+        help="Keep this fraction of an event type's INFO records; 'batch' for the batch presets (can be repeated)"
+    )
+    parser.add_argument(
+        '--log-rate-limit',
+        type=float,
+        help='Maximum INFO records per second per logger'
+    )
 
     args = parser.parse_args()
+    workers = args.workers or os.cpu_count() or 1
+    try:
+        sample_rates = parse_sample_rates(args.log_sample)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # Initialize logging
+    setup_logging(
+        log_level="INFO",
+        log_file="logs/invoice_generator.log",
+        log_format="json",
+        async_logging=args.async_logging,
+        sample_rates=sample_rates,
+        rate_limit=args.log_rate_limit
+    )
 
     # Set correlation ID for this batch
     correlation_id = set_correlation_id()
 
     print(f"Generating {args.count} invoices...")
-    logger.info(f"Starting invoice generation batch", extra={'extra_fields': {'count': args.count, 'config': args.config, 'event_type': 'batch_start'}})
+    logger.info(f"Starting invoice generation batch", extra={'extra_fields': {'count': args.count, 'config': args.config, 'workers': workers, 'seed': args.seed, 'shard': f'{args.shard[0]}/{args.shard[1]}', 'event_type': 'batch_start'}})
 
     try:
-        generator = InvoiceGenerator(args.config)
-        invoices = generator.generate_invoices(args.count)
-        generator.save_invoices(invoices)
-
-        print(f"\nSuccessfully generated {len(invoices)} invoices!")
+        generator = InvoiceGenerator(args.config, seed=args.seed)
+        invoices = generator.iter_invoices(args.count, args.start_date, args.shard, args.vectorized, args.batch_size)
+        saved = generator.save_invoices(
+            invoices,
+            workers=workers,
+            output_format=args.format,
+            schema_type=args.schema_type,
+            validate_xml=args.validate
+        )
+
+        print(f"\nSuccessfully generated {saved} invoices!")
         print(f"Output directory: {generator.config['generation']['output_dir']}")
-        logger.info(f"Invoice generation batch completed", extra={'extra_fields': {'count': len(invoices), 'output_dir': generator.config['generation']['output_dir'], 'event_type': 'batch_complete'}})
+        logger.info(f"Invoice generation batch completed", extra={'extra_fields': {'count': saved, 'output_dir': generator.config['generation']['output_dir'], 'event_type': 'batch_complete'}})
     except Exception as e:
         logger.error(f"Invoice generation failed: {str(e)}", extra={'extra_fields': {'event_type': 'batch_failed'}}, exc_info=True)
         raise
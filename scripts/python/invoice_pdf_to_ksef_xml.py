@@ -12,40 +12,828 @@ Official KSeF documentation: https://github.com/CIRFMF/ksef-docs
 """
 
 import os
+import asyncio
+import copy
+import glob
+import gzip
+import io
+import itertools
 import json
+import math
 import re
+import tarfile
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, Optional, Tuple, Literal
-from xml.etree import ElementTree as ET
-from xml.dom import minidom
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Literal, Union
 from pathlib import Path
-import pdfplumber
-from anthropic import Anthropic
+from anthropic import Anthropic, AsyncAnthropic
 from lxml import etree
 
+from ai_cache import AIParseCache, DEFAULT_AI_CACHE_PATH
+from async_ai import AsyncAIParser
+from pdf_text_backends import DEFAULT_BACKEND, INVOICE_DATA_ATTACHMENT, PDFTextDocument, get_backend
+from xsd_facets import facet_registry
+
 # Import logging configuration
+try:
+    import zstandard
+except ImportError:  # optional, only needed for zstd output
+    zstandard = None
+
 from logging_config import (
     get_logger,
     set_correlation_id,
     log_file_operation,
     log_api_call,
-    log_invoice_processing
+    log_invoice_processing,
+    LatencyHistogram,
+    timed_stage,
+    start_stage_timings,
+    get_stage_timings
 )
 
 # Initialize logger
 logger = get_logger(__name__)
 
 
+def default_schema_path(schema_type: str) -> Path:
+    """Return the path of the bundled XSD for a schema type ('FA2' or 'FA3')."""
+    script_dir = Path(__file__).parent.parent.parent  # Go up to project root
+    return script_dir / 'src' / 'main' / 'resources' / f'schemat_FA({schema_type[-1]})_v1-0E.xsd'
+
+
+class XSDSchemaRegistry:
+    """Process-wide cache of compiled KSeF XSD schemas.
+
+    Each schema is compiled once per (schema_type, path, mtime) and shared by
+    all converters in the process. A changed file mtime invalidates the entry.
+    Failed compiles are cached the same way: the first call raises the
+    original error, later ones a one-line XMLSchemaParseError without
+    recompiling. clear() forgets them, e.g. once a missing import is in place.
+    """
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], Tuple[int, etree.XMLSchema, threading.Lock]] = {}
+        # (schema_type, path) -> (mtime_ns, first line of the compile error)
+        self._failures: Dict[Tuple[str, str], Tuple[int, str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.failed_compiles = 0
+        self.compile_time_ms = 0.0
+
+    def _get_entry(self, schema_type: str, schema_path: Path) -> Tuple[etree.XMLSchema, threading.Lock]:
+        """Return the compiled schema and its validation lock, compiling on first use."""
+        key = (schema_type, str(schema_path))
+        mtime_ns = os.stat(schema_path).st_mtime_ns
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == mtime_ns:
+                self.hits += 1
+                return entry[1], entry[2]
+
+            failure = self._failures.get(key)
+            if failure is not None and failure[0] == mtime_ns:
+                self.hits += 1
+                raise etree.XMLSchemaParseError(f"{schema_type} XSD schema {schema_path} does not compile: {failure[1]}")
+
+            if entry is not None or failure is not None:
+                self.invalidations += 1
+            self.misses += 1
+
+            # Compile while holding the lock so concurrent callers never compile twice
+            start = time.perf_counter()
+            try:
+                with open(schema_path, 'rb') as schema_file:
+                    schema = etree.XMLSchema(etree.parse(schema_file))
+            except etree.XMLSchemaParseError as e:
+                message = (str(e).splitlines() or [type(e).__name__])[0]
+                self._failures[key] = (mtime_ns, message)
+                self._entries.pop(key, None)
+                self.failed_compiles += 1
+                logger.error(
+                    f"Could not compile {schema_type} XSD schema: {message}",
+                    extra={'extra_fields': {
+                        'schema_type': schema_type,
+                        'schema_path': str(schema_path),
+                        'event_type': 'schema_compile_failed'
+                    }}
+                )
+                raise
+            finally:
+                duration_ms = (time.perf_counter() - start) * 1000
+                self.compile_time_ms += duration_ms
+            self._failures.pop(key, None)
+
+            validation_lock = threading.Lock()
+            self._entries[key] = (mtime_ns, schema, validation_lock)
+
+        logger.info(
+            f"Compiled {schema_type} XSD schema",
+            extra={'extra_fields': {
+                'schema_type': schema_type,
+                'schema_path': str(schema_path),
+                'duration_ms': round(duration_ms, 3),
+                'event_type': 'schema_compiled'
+            }}
+        )
+        return schema, validation_lock
+
+    def get_schema(self, schema_type: str, schema_path: Path) -> etree.XMLSchema:
+        """Get the compiled XMLSchema for the given schema type and file.
+
+        Args:
+            schema_type: Schema type ('FA2' or 'FA3')
+            schema_path: Path to the XSD file
+
+        Returns:
+            Compiled lxml XMLSchema
+
+        Raises:
+            etree.XMLSchemaParseError: If the XSD cannot be compiled; a one-line
+                                       error once the failure is cached
+        """
+        return self._get_entry(schema_type, schema_path)[0]
+
+    def validate(self, schema_type: str, schema_path: Path, xml_doc) -> Tuple[bool, list]:
+        """Validate a parsed document against the cached schema.
+
+        The schema's error log is per-object in lxml, so validation of a shared
+        schema is serialised per schema to keep error reports consistent.
+
+        Args:
+            schema_type: Schema type ('FA2' or 'FA3')
+            schema_path: Path to the XSD file
+            xml_doc: Parsed lxml element or element tree
+
+        Returns:
+            Tuple of (is_valid, list of "Line N: message" error strings)
+        """
+        schema, validation_lock = self._get_entry(schema_type, schema_path)
+        with validation_lock:
+            if schema.validate(xml_doc):
+                return True, []
+            return False, [f"Line {error.line}: {error.message}" for error in schema.error_log]
+
+    def stats(self) -> Dict:
+        """Return cache counters."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'failed_compiles': self.failed_compiles,
+                'compiled_schemas': len(self._entries),
+                'compile_time_ms': round(self.compile_time_ms, 3)
+            }
+
+    def clear(self):
+        """Drop all compiled schemas and cached failures, and reset counters."""
+        with self._lock:
+            self._entries.clear()
+            self._failures.clear()
+            self.hits = 0
+            self.misses = 0
+            self.invalidations = 0
+            self.failed_compiles = 0
+            self.compile_time_ms = 0.0
+
+
+# Shared by all KSeFXMLConverter instances in this process
+schema_registry = XSDSchemaRegistry()
+
+# Claude model and prompt revision used for AI parsing. Bump AI_PROMPT_VERSION
+# whenever the prompt changes so cached AI results are not reused.
+AI_MODEL = "claude-3-5-sonnet-20241022"
+AI_PROMPT_VERSION = "1"
+
+
+class AIConfigurationError(ValueError):
+    """Claude AI parsing is needed but no Anthropic API key is configured."""
+
+# Serialization settings shared by the tree and stream output paths
+XML_DECLARATION = '<?xml version="1.0" encoding="utf-8"?>\n'
+XML_INDENT = "    "
+
+# Output modes: 'pretty' indents elements with XML_INDENT, 'compact' writes no
+# whitespace between them. Either can be compressed; the suffix follows '.xml'.
+OUTPUT_FORMATS = ('pretty', 'compact')
+COMPRESSION_SUFFIXES = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def check_output_mode(output_format: str, compression: str):
+    """Check that an output format and compression mode can be used.
+
+    Raises:
+        ValueError: If either mode is unknown
+        ImportError: If zstd compression is requested but zstandard is not installed
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}', expected one of {', '.join(OUTPUT_FORMATS)}")
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(f"Unknown compression '{compression}', expected one of {', '.join(COMPRESSION_SUFFIXES)}")
+    if compression == 'zstd' and zstandard is None:
+        raise ImportError("zstd output requires zstandard: pip install zstandard")
+
+
+def xml_output_suffix(compression: str = 'none') -> str:
+    """Return the output file suffix for a compression mode, e.g. '.xml.gz'."""
+    return '.xml' + COMPRESSION_SUFFIXES[compression]
+
+
+@contextmanager
+def compressed_writer(output: BinaryIO, compression: str = 'none') -> Iterator[BinaryIO]:
+    """Wrap a binary stream so that data written to it is compressed on the fly.
+
+    gzip output has a zero timestamp, so identical XML gives identical files.
+
+    Args:
+        output: Writable binary stream; left open
+        compression: 'none', 'gzip' or 'zstd'
+    """
+    check_output_mode(OUTPUT_FORMATS[0], compression)
+    if compression == 'none':
+        yield output
+    elif compression == 'gzip':
+        with gzip.GzipFile(filename='', mode='wb', fileobj=output, compresslevel=GZIP_LEVEL, mtime=0) as gz:
+            yield gz
+    else:
+        writer = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(output)
+        yield writer
+        writer.flush(zstandard.FLUSH_FRAME)
+
+
+@contextmanager
+def open_xml_output(path: Union[str, Path], compression: str = 'none') -> Iterator[BinaryIO]:
+    """Open a file for writing XML, compressed on the fly if requested."""
+    with open(path, 'wb') as f:
+        with compressed_writer(f, compression) as writer:
+            yield writer
+
+
+class _TreeEmitter:
+    """Emit XML elements into an in-memory lxml tree."""
+
+    def __init__(self):
+        self.root: Optional[etree._Element] = None
+        self._stack: List[etree._Element] = []
+
+    @contextmanager
+    def element(self, tag: str, attrib: Optional[Dict] = None, nsmap: Optional[Dict] = None):
+        """Open a container element; children are emitted inside the with-block."""
+        if self._stack:
+            node = etree.SubElement(self._stack[-1], tag, attrib or {})
+        else:
+            node = etree.Element(tag, attrib or {}, nsmap=nsmap)
+            self.root = node
+        self._stack.append(node)
+        try:
+            yield node
+        finally:
+            self._stack.pop()
+
+    def leaf(self, tag: str, text: Optional[str], attrib: Optional[Dict] = None):
+        """Emit an element with text content and no children."""
+        node = etree.SubElement(self._stack[-1], tag, attrib or {})
+        node.text = text
+
+    def subtree(self, node: etree._Element):
+        """Emit a prebuilt subtree; it is copied, so it can be reused."""
+        self._stack[-1].append(copy.deepcopy(node))
+
+
+class _StreamEmitter:
+    """Emit XML elements incrementally through an lxml xmlfile writer.
+
+    Args:
+        xf: Open etree.xmlfile context
+        indent: Indentation unit for pretty-printing, or None for compact output
+    """
+
+    def __init__(self, xf, indent: Optional[str] = XML_INDENT):
+        self._xf = xf
+        self._indent = indent
+        # One flag per open element: has it received child elements yet?
+        self._has_children: List[bool] = []
+
+    def _break_line(self):
+        """Write the newline and indentation that precede a child element."""
+        if self._has_children:
+            self._has_children[-1] = True
+            if self._indent is not None:
+                self._xf.write("\n" + self._indent * len(self._has_children))
+
+    @contextmanager
+    def element(self, tag: str, attrib: Optional[Dict] = None, nsmap: Optional[Dict] = None):
+        """Open a container element; children are emitted inside the with-block."""
+        self._break_line()
+        with self._xf.element(tag, attrib or {}, nsmap=nsmap):
+            self._has_children.append(False)
+            try:
+                yield
+            finally:
+                had_children = self._has_children.pop()
+            if had_children and self._indent is not None:
+                self._xf.write("\n" + self._indent * len(self._has_children))
+
+    def leaf(self, tag: str, text: Optional[str], attrib: Optional[Dict] = None):
+        """Emit an element with text content and no children."""
+        self._break_line()
+        with self._xf.element(tag, attrib or {}):
+            if text:
+                self._xf.write(text)
+
+    def subtree(self, node: etree._Element):
+        """Emit a prebuilt subtree element by element.
+
+        xmlfile.write() would serialize it with its own namespace declarations.
+        """
+        if len(node):
+            with self.element(node.tag, dict(node.attrib)):
+                for child in node:
+                    self.subtree(child)
+        else:
+            self.leaf(node.tag, node.text, dict(node.attrib))
+
+
+# Adnotacje subtrees, keyed by namespace; the element is the same for every invoice
+_adnotacje_subtrees: Dict[str, etree._Element] = {}
+
+
+# Line item VAT rates (P_12 values) -> the P_13_x / P_14_x totals they add up to, in schema
+# order. FA(3) splits the 0% and "np" rates into the kinds FA(2) sums together.
+_RATE_TOTAL_FIELDS = {
+    'FA2': [
+        (('23', '22'), 'P_13_1', 'P_14_1'),
+        (('8', '7'), 'P_13_2', 'P_14_2'),
+        (('5',), 'P_13_3', 'P_14_3'),
+        (('4', '3'), 'P_13_4', 'P_14_4'),
+        (('0',), 'P_13_6_1', None),
+        (('zw',), 'P_13_7', None),
+        (('np',), 'P_13_8', None),
+        (('oo',), 'P_13_10', None),
+    ],
+    'FA3': [
+        (('23', '22'), 'P_13_1', 'P_14_1'),
+        (('8', '7'), 'P_13_2', 'P_14_2'),
+        (('5',), 'P_13_3', 'P_14_3'),
+        (('4', '3'), 'P_13_4', 'P_14_4'),
+        (('0 KR',), 'P_13_6_1', None),
+        (('0 WDT',), 'P_13_6_2', None),
+        (('0 EX',), 'P_13_6_3', None),
+        (('zw',), 'P_13_7', None),
+        (('np I',), 'P_13_8', None),
+        (('np II',), 'P_13_9', None),
+        (('oo',), 'P_13_10', None),
+    ],
+}
+# Schema type -> lowercased rate -> (P_12 value, index into _RATE_TOTAL_FIELDS)
+_RATE_TOTAL_INDEX = {
+    schema_type: {rate.lower(): (rate, index) for index, (rates, _, _) in enumerate(fields) for rate in rates}
+    for schema_type, fields in _RATE_TOTAL_FIELDS.items()
+}
+# maxOccurs of FaWiersz in both FA(2) and FA(3)
+MAX_LINE_ITEMS = 10000
+_CENT = Decimal('0.01')
+
+
+def _normalize_tax_rate(value, schema_type: str) -> str:
+    """Normalize a line item VAT rate ('23', 23, '23.0', '23%', 'ZW', '0 kr') to its P_12 value.
+
+    Raises:
+        ValueError: If the rate is not one KSeF totals can be reported for in this schema type
+    """
+    rate = " ".join(str(value).strip().rstrip('%').split()).lower()
+    try:
+        number = Decimal(rate)
+    except InvalidOperation:
+        pass
+    else:
+        if number.is_finite() and number == number.to_integral_value():
+            rate = str(int(number))
+    try:
+        return _RATE_TOTAL_INDEX[schema_type][rate][0]
+    except KeyError:
+        raise ValueError(f"Unsupported {schema_type} VAT rate: {value!r}") from None
+
+
+class _RateTotals:
+    """Net and VAT totals per rate group (P_13_x / P_14_x), accumulated line by line.
+
+    Args:
+        schema_type: Schema type ('FA2' or 'FA3'); selects the rates and total fields
+    """
+
+    def __init__(self, schema_type: str):
+        self.count = 0
+        self._fields = _RATE_TOTAL_FIELDS[schema_type]
+        self._index = _RATE_TOTAL_INDEX[schema_type]
+        self._schema_type = schema_type
+        self._net: Dict[int, Decimal] = {}
+        self._tax: Dict[int, Decimal] = {}
+
+    def add(self, position: Dict) -> str:
+        """Add a line item to the totals.
+
+        Returns:
+            The line's normalized VAT rate
+
+        Raises:
+            ValueError: If the rate or an amount is invalid, or the invoice exceeds MAX_LINE_ITEMS lines
+        """
+        if self.count == MAX_LINE_ITEMS:
+            raise ValueError(f"Too many line items: KSeF allows at most {MAX_LINE_ITEMS} FaWiersz elements")
+        rate = _normalize_tax_rate(position['tax'], self._schema_type)
+        index = self._index[rate.lower()][1]
+        self._net[index] = self._net.get(index, 0) + self._amount(position, 'total_price_net')
+        if self._fields[index][2] is not None:
+            self._tax[index] = self._tax.get(index, 0) + self._amount(position, 'total_price_tax')
+        self.count += 1
+        return rate
+
+    @staticmethod
+    def _amount(position: Dict, field: str) -> Decimal:
+        """Return a line item amount as a Decimal.
+
+        Raises:
+            ValueError: If the amount is not a finite decimal number
+        """
+        value = position[field]
+        try:
+            amount = Decimal(str(value))
+        except InvalidOperation:
+            amount = None
+        if amount is None or not amount.is_finite():
+            raise ValueError(f"Invalid amount in {field}: {value!r}")
+        return amount
+
+    def fields(self) -> List[Tuple[str, str]]:
+        """Return (element name, amount) pairs in schema order, ending with P_15.
+
+        P_15 (total due) is the sum of the rounded P_13_x and P_14_x amounts,
+        so the document's totals always add up.
+        """
+        fields = []
+        gross = Decimal(0)
+        for index in sorted(self._net):
+            _, net_tag, tax_tag = self._fields[index]
+            net = self._net[index].quantize(_CENT, rounding=ROUND_HALF_UP)
+            fields.append((net_tag, str(net)))
+            gross += net
+            if tax_tag is not None:
+                tax = self._tax[index].quantize(_CENT, rounding=ROUND_HALF_UP)
+                fields.append((tax_tag, str(tax)))
+                gross += tax
+        fields.append(('P_15', str(gross)))
+        return fields
+
+
+def _header_totals(invoice_data: Dict) -> List[Tuple[str, str]]:
+    """Totals of an invoice without line items: everything at the basic rate."""
+    return [
+        ('P_13_1', invoice_data['price_net']),
+        ('P_14_1', invoice_data['price_tax']),
+        ('P_15', invoice_data['price_gross']),
+    ]
+
+
+def _invoice_totals(invoice_data: Dict, positions: List[Dict], schema_type: str) -> List[Tuple[str, str]]:
+    """Per-rate totals of the line items, or the header totals if there are none."""
+    if not positions:
+        return _header_totals(invoice_data)
+    totals = _RateTotals(schema_type)
+    for position in positions:
+        totals.add(position)
+    return totals.fields()
+
+
+# Invoice fields KSeFXMLConverter._emit_faktura writes, by element path below
+# Faktura, for _PreValidator. A field is a key of invoice_data, or a format
+# string for text combining several keys. benchmark.py xml-build checks this
+# table against the built document.
+_INVOICE_FIELDS = [
+    (('Podmiot1', 'DaneIdentyfikacyjne', 'NIP'), 'seller_tax_no'),
+    (('Podmiot1', 'DaneIdentyfikacyjne', 'Nazwa'), 'seller_name'),
+    (('Podmiot1', 'Adres', 'KodKraju'), 'seller_country'),
+    (('Podmiot1', 'Adres', 'AdresL1'), 'seller_street'),
+    (('Podmiot2', 'DaneIdentyfikacyjne', 'NIP'), 'buyer_tax_no'),
+    (('Podmiot2', 'DaneIdentyfikacyjne', 'Nazwa'), 'buyer_name'),
+    (('Podmiot2', 'Adres', 'KodKraju'), 'buyer_country'),
+    (('Podmiot2', 'Adres', 'AdresL1'), '{buyer_street}, {buyer_post_code} {buyer_city}'),
+    (('Fa', 'KodWaluty'), 'currency'),
+    (('Fa', 'P_1'), 'issue_date'),
+    (('Fa', 'P_2'), 'number'),
+]
+# Line item fields KSeFXMLConverter._emit_fa_wiersz writes, by element path below FaWiersz
+_LINE_FIELDS = [
+    (('P_7',), 'name'),
+    (('P_8A',), 'quantity_unit'),
+    (('P_8B',), 'quantity'),
+    (('P_9A',), 'price_net'),
+    (('P_11',), 'total_price_net'),
+]
+# Fields the builders fill in when they are missing
+_FIELD_DEFAULTS = {'seller_country': 'PL', 'buyer_country': 'PL', 'quantity_unit': 'szt'}
+
+
+def _field_text(data: Dict, field: str) -> Optional[str]:
+    """Element text the builders write for a field, or None if they reject the value.
+
+    Like lxml, the builders only accept strings (and None for an empty
+    element) as whole-element text; combined fields are formatted with str().
+
+    Args:
+        data: Invoice data or line item dictionary
+        field: Key of data, or a format string combining several keys
+
+    Raises:
+        KeyError: If a field without a default is missing
+    """
+    if '{' in field:
+        return field.format_map(data)
+    value = data.get(field, _FIELD_DEFAULTS[field]) if field in _FIELD_DEFAULTS else data[field]
+    if value is None:
+        return ""
+    return value if isinstance(value, str) else None
+
+
+class _PreValidator:
+    """Checks the fields an invoice fills in against the XSD facets.
+
+    The rules come from xsd_facets, compiled once per schema file for the
+    element paths in _INVOICE_FIELDS and _LINE_FIELDS and the P_13_x /
+    P_14_x / P_15 totals. Fields without a rule (types that could not be resolved)
+    and the constant parts of the document are left to full XSD validation.
+
+    Args:
+        schema_type: Schema type ('FA2' or 'FA3'); selects the totals fields
+        schema_path: Path to the XSD file
+    """
+
+    def __init__(self, schema_type: str, schema_path: Path):
+        self._schema_type = schema_type
+        self._schema_path = schema_path
+        self._invoice_paths = [(('Faktura',) + path, field) for path, field in _INVOICE_FIELDS]
+        self._line_paths = [(('Faktura', 'Fa', 'FaWiersz') + path, field) for path, field in _LINE_FIELDS]
+        self._line_keys = {field for _, field in _LINE_FIELDS}
+        self._totals_paths = {
+            tag: ('Faktura', 'Fa', tag) for _, net_tag, tax_tag in _RATE_TOTAL_FIELDS[schema_type]
+            for tag in (net_tag, tax_tag) if tag
+        }
+        self._totals_paths['P_15'] = ('Faktura', 'Fa', 'P_15')
+        self._paths = ([path for path, _ in self._invoice_paths] + [path for path, _ in self._line_paths]
+                       + list(self._totals_paths.values()))
+        self._mtime_ns = None
+
+    def _bind(self, table: Dict):
+        """Pair each field with its compiled rule (None if it is not checked)."""
+        self._invoice = [('/'.join(path), field, table[path]) for path, field in self._invoice_paths]
+        self._line = [(path[-1], field, table[path]) for path, field in self._line_paths]
+        self._totals = {tag: ('/'.join(path), table[path]) for tag, path in self._totals_paths.items()}
+
+    @staticmethod
+    def _check_fields(bindings: List, data: Dict, record: str, prefix: str, errors: List[str]):
+        """Check the fields of one record (the invoice or a line item)."""
+        for path, field, rule in bindings:
+            try:
+                text = _field_text(data, field)
+            except KeyError as e:
+                errors.append(f"{record}: missing field {e}")
+                continue
+            if text is None:
+                errors.append(f"{prefix}{path}: expected a string, got {type(data[field]).__name__}")
+                continue
+            message = rule.check(text) if rule else None
+            if message is not None:
+                errors.append(f"{prefix}{path}: {message}")
+
+    def check(self, invoice_data: Dict, positions: Optional[Iterable[Dict]] = None) -> List[str]:
+        """Check invoice data, its line items and their totals.
+
+        Args:
+            invoice_data: Invoice data dictionary
+            positions: Line items; defaults to invoice_data['positions']. Iterated
+                       once, so pass a list if it is also used to build the XML.
+
+        Returns:
+            Error messages, one per failing field; empty if every checked field passes
+
+        Raises:
+            FileNotFoundError: If XSD schema file not found
+            SchemaImportError: If a schema the XSD imports cannot be loaded
+        """
+        try:
+            mtime_ns = os.stat(self._schema_path).st_mtime_ns
+        except FileNotFoundError:
+            raise FileNotFoundError(f"XSD schema file not found: {self._schema_path}") from None
+        # A changed schema file recompiles the table
+        if mtime_ns != self._mtime_ns:
+            self._bind(facet_registry.get_table(self._schema_path, self._paths))
+            self._mtime_ns = mtime_ns
+
+        errors: List[str] = []
+        self._check_fields(self._invoice, invoice_data, 'Invoice', '', errors)
+
+        if positions is None:
+            positions = invoice_data.get('positions') or ()
+        totals = _RateTotals(self._schema_type)
+        for number, position in enumerate(positions, 1):
+            record = f"Faktura/Fa/FaWiersz[{number}]"
+            if number > MAX_LINE_ITEMS:
+                errors.append(f"{record}: too many line items, KSeF allows at most {MAX_LINE_ITEMS}")
+                break
+            try:
+                totals.add(position)
+            except KeyError as e:
+                # Fields of the line itself are reported by _check_fields
+                if e.args[0] not in self._line_keys:
+                    errors.append(f"{record}: missing field {e}")
+            except ValueError as e:
+                errors.append(f"{record}: {e}")
+            self._check_fields(self._line, position, record, f"{record}/", errors)
+
+        try:
+            fields = totals.fields() if totals.count else _header_totals(invoice_data)
+        except KeyError as e:
+            errors.append(f"Invoice: missing field {e}")
+            fields = []
+        for tag, amount in fields:
+            path, rule = self._totals[tag]
+            text = _field_text({tag: amount}, tag)
+            if text is None:
+                errors.append(f"{path}: expected a string, got {type(amount).__name__}")
+                continue
+            message = rule.check(text) if rule else None
+            if message is not None:
+                errors.append(f"{path}: {message}")
+        return errors
+
+
+# Pre-validators, keyed by (schema type, schema path)
+_pre_validators: Dict[Tuple[str, str], _PreValidator] = {}
+
+
+# ============================================================================
+# Rule-based parsing tables
+# ============================================================================
+#
+# Patterns are compiled once at import. Each rule carries the lowercase
+# literals one of which every match must contain; a rule is only evaluated
+# when one of its keywords occurs in the text, so absent sections cost a
+# substring check instead of a regex scan. Rules with no keywords always run.
+
+_NIP_RULE = (
+    re.compile(r'NIP[:\s]*(\d{3}[-\s]?\d{3}[-\s]?\d{2}[-\s]?\d{2}|\d{10})', re.IGNORECASE),
+    ('nip',)
+)
+_NIP_SEPARATORS_RE = re.compile(r'[-\s]')
+
+# Supports both Polish ("Faktura Nr") and English ("INVOICE #") formats; first match wins
+_INVOICE_NUMBER_RULES = [
+    (re.compile(r'INVOICE\s*#\s*(\d+)', re.IGNORECASE), ('invoice',)),  # English: "INVOICE # 13"
+    (re.compile(r'Invoice\s+(?:Number|No\.?)[:\s]*(\d+)', re.IGNORECASE), ('invoice',)),  # English: "Invoice Number: 13"
+    (re.compile(r'Faktura\s+(?:Nr\.?|numer|VAT)?\s*[:\s]*([A-Z0-9/\-]+)', re.IGNORECASE), ('faktura',)),  # Polish
+    (re.compile(r'(?:FA|FV)[/\-](\d+[/\-]\d+[/\-]\d+)', re.IGNORECASE), ('fa/', 'fa-', 'fv/', 'fv-')),  # Polish: FA/001/2025
+    (re.compile(r'Numer\s+faktury[:\s]*([A-Z0-9/\-]+)', re.IGNORECASE), ('numer',)),  # Polish
+]
+
+# Supports Polish, English, and various numeric formats; first match wins
+_DATE_RULES = [
+    (re.compile(r'DATE[:\s]*(\d{1,2})\s+([A-Za-z]+)[,\s]+(\d{4})', re.IGNORECASE), ('date',)),  # English: "DATE: 02 April, 2025"
+    (re.compile(r'(?:Invoice\s+)?Date[:\s]*(\d{1,2})\s+([A-Za-z]+)[,\s]+(\d{4})', re.IGNORECASE), ('date',)),  # "Invoice Date: 02 April, 2025"
+    (re.compile(r'Data\s+wystawienia[:\s]*(\d{4}-\d{2}-\d{2})', re.IGNORECASE), ('wystawienia',)),  # Polish: "Data wystawienia: 2025-04-02"
+    (re.compile(r'Data\s+wystawienia[:\s]*(\d{2}[-/.]\d{2}[-/.]\d{4})', re.IGNORECASE), ('wystawienia',)),  # Polish: "Data wystawienia: 02.04.2025"
+    (re.compile(r'Data\s+sprzedaży[:\s]*(\d{4}-\d{2}-\d{2})', re.IGNORECASE), ('sprzedaży',)),
+    (re.compile(r'Data\s+sprzedaży[:\s]*(\d{2}[-/.]\d{2}[-/.]\d{4})', re.IGNORECASE), ('sprzedaży',)),
+]
+_NUMERIC_DATE_RE = re.compile(r'\d{2}[-/.]\d{2}[-/.]\d{4}')
+_DATE_SEPARATORS_RE = re.compile(r'[-/.]')
+
+_MONTH_NAMES = {
+    'january': '01', 'february': '02', 'march': '03', 'april': '04',
+    'may': '05', 'june': '06', 'july': '07', 'august': '08',
+    'september': '09', 'october': '10', 'november': '11', 'december': '12'
+}
+
+# Supports both Polish and English formats (EU invoices only); every rule runs
+# in order and the last match of a later rule overrides an earlier one
+_AMOUNT_RULES = [
+    # English patterns with PLN
+    (re.compile(r'SUBTOTAL[:\s]*([\d,\s]+(?:\.\d{2})?)\s*zł', re.IGNORECASE), 'price_net', ('subtotal',)),  # "SUBTOTAL 22,344.00 zł"
+    (re.compile(r'VAT\s+\d+%[:\s]*(?:EUR\s+)?([\d,\s]+(?:\.\d{2})?)\s*zł', re.IGNORECASE), 'price_tax', ('vat',)),  # "VAT 23% EUR 5,139.12 zł"
+    (re.compile(r'TOTAL[:\s]*([\d,\s]+(?:\.\d{2})?)\s*zł', re.IGNORECASE), 'price_gross', ('total',)),  # "TOTAL 27,483.12 zł"
+    # Polish patterns
+    (re.compile(r'(?:Wartość\s+)?[Nn]etto[:\s]*([\d,\s]+)', re.IGNORECASE), 'price_net', ('netto',)),
+    (re.compile(r'(?:Wartość\s+)?VAT[:\s]*([\d,\s]+)', re.IGNORECASE), 'price_tax', ('vat',)),
+    (re.compile(r'(?:Wartość\s+)?[Bb]rutto[:\s]*([\d,\s]+)', re.IGNORECASE), 'price_gross', ('brutto',)),
+    (re.compile(r'Razem[:\s]*([\d,\s]+)', re.IGNORECASE), 'price_gross', ('razem',)),
+    (re.compile(r'Do\s+zapłaty[:\s]*([\d,\s]+)', re.IGNORECASE), 'price_gross', ('zapłaty',)),
+]
+
+# Company names: Polish ("Sprzedawca"/"Nabywca") and English ("INVOICE ... street", "Bill To")
+_SELLER_NAME_RULE = (re.compile(r'Sprzedawca[:\s]*\n([^\n]+)', re.IGNORECASE), ('sprzedawca',))
+_SELLER_NAME_ENG_RULE = (re.compile(r'INVOICE\s*\n([^\n]+)\s*\n([^\n]+street[^\n]*)', re.IGNORECASE), ('street',))
+_BUYER_NAME_RULE = (re.compile(r'Nabywca[:\s]*\n([^\n]+)', re.IGNORECASE), ('nabywca',))
+_BUYER_NAME_ENG_RULE = (re.compile(r'Bill\s+To[:\s]*([^\n]+)', re.IGNORECASE), ('bill',))
+
+# Addresses: Polish "ul.", "al.", "pl." prefixes, English "street" and "Bill To" blocks
+_STREET_RULE = (re.compile(r'(?:ul\.|al\.|pl\.)\s+([^\n,]+)', re.IGNORECASE), ('ul.', 'al.', 'pl.'))
+_SELLER_STREET_ENG_RULE = (re.compile(r'([A-ZĄĆĘŁŃÓŚŹŻa-ząćęłńóśźż]+\s+street[^,\n]+)', re.IGNORECASE), ('street',))
+_BUYER_STREET_ENG_RULE = (re.compile(r'Bill\s+To[^\n]*\n[^\n]+\n([^\n]+)', re.IGNORECASE), ('bill',))
+
+# Postal code and city (case-sensitive, no keyword gate)
+_POSTAL_RULE = (re.compile(r'(\d{2}-\d{3})[,\s]+([A-ZĄĆĘŁŃÓŚŹŻa-ząćęłńóśźż\s]+)'), ())
+
+# Fields that must be filled for rule-based parsing to count as successful
+_REQUIRED_FIELDS = [
+    'seller_name', 'seller_tax_no', 'buyer_name', 'buyer_tax_no',
+    'number', 'issue_date', 'price_net', 'price_tax', 'price_gross'
+]
+
+# Fields embedded invoice data must carry to build the KSeF XML
+_EMBEDDED_REQUIRED_FIELDS = _REQUIRED_FIELDS + [
+    'seller_street', 'buyer_street', 'buyer_post_code', 'buyer_city', 'currency'
+]
+
+
+def _rule_applies(keywords: Tuple[str, ...], lowered_text: str) -> bool:
+    """Return True if a rule's keyword gate lets it run on this text."""
+    return not keywords or any(keyword in lowered_text for keyword in keywords)
+
+
+def _normalize_amount(raw_amount: str) -> str:
+    """Normalize a captured amount to 'digits.dd' form."""
+    amount = raw_amount.replace(' ', '').replace(',', '')
+    # Handle potential decimal formatting
+    if '.' in amount:
+        # Already has decimal point
+        parts = amount.split('.')
+        if len(parts[-1]) != 2:  # e.g., "22.344" (thousands separator)
+            amount = amount.replace('.', '') + '.00'
+    else:
+        amount += '.00'
+    return amount
+
+
 class KSeFXMLConverter:
     """Convert invoice data to KSeF XML format."""
 
-    def __init__(self, anthropic_api_key: Optional[str] = None, schema_type: Literal['FA2', 'FA3'] = 'FA2'):
+    def __init__(
+        self,
+        anthropic_api_key: Optional[str] = None,
+        schema_type: Literal['FA2', 'FA3'] = 'FA2',
+        use_ai_cache: bool = True,
+        ai_cache_path: str = DEFAULT_AI_CACHE_PATH,
+        async_ai_parser: Optional[AsyncAIParser] = None,
+        lazy_pdf_extraction: bool = True,
+        pdf_backend: str = DEFAULT_BACKEND,
+        use_embedded_data: bool = False,
+        output_format: str = 'pretty',
+        compression: str = 'none',
+        prevalidate: bool = True,
+        xsd_sample_rate: float = 1.0
+    ):
         """Initialize converter.
 
         Args:
             anthropic_api_key: Optional API key for Claude AI. If not provided,
                              will look for ANTHROPIC_API_KEY environment variable.
             schema_type: Type of KSeF schema to use ('FA2' or 'FA3'). Default is 'FA2'.
+            use_ai_cache: If True, reuse cached Claude AI results for identical invoice text.
+            ai_cache_path: Path to the SQLite AI parse cache.
+            async_ai_parser: Optional AsyncAIParser for the async AI path. If not provided,
+                             one is created from the API key on first use.
+            lazy_pdf_extraction: If True, extract the first and last PDF pages first and
+                                 stop early when rule-based parsing already succeeds.
+            pdf_backend: PDF text extraction backend name ('pdfplumber', 'pypdfium2',
+                         'pymupdf' or 'auto' for the fastest installed one).
+            use_embedded_data: If True, use invoice data embedded by PDFInvoiceGenerator
+                               and skip text extraction and parsing for such PDFs. The
+                               attachment is not checked against the printed invoice,
+                               so only enable this for PDFs you generated yourself.
+            output_format: Default XML layout, 'pretty' (indented) or 'compact'.
+            compression: Default compression of XML files written to a path:
+                         'none', 'gzip' or 'zstd' (requires zstandard).
+            prevalidate: If True, check parsed invoice data against the XSD facets of
+                         the fields it fills in before building the XML.
+            xsd_sample_rate: Fraction of PDF conversions validated against the full XSD
+                             schema, 0.0 to 1.0. Sampling is deterministic: with 0.01 the
+                             1st, 101st, 201st, ... conversion is validated.
+
+        Raises:
+            ValueError: If the PDF backend is unknown or not installed, an output mode is
+                        unknown or xsd_sample_rate is outside 0.0-1.0
+            ImportError: If zstd compression is requested but zstandard is not installed
         """
         self.namespace = "http://crd.gov.pl/wzor/2023/06/29/12648/"
         self.namespace_xsi = "http://www.w3.org/2001/XMLSchema-instance"
@@ -53,153 +841,306 @@ class KSeFXMLConverter:
         self.schema_type = schema_type
 
         # Determine schema file path
-        script_dir = Path(__file__).parent.parent.parent  # Go up to project root
-        self.schema_path = script_dir / 'src' / 'main' / 'resources' / f'schemat_FA({schema_type[-1]})_v1-0E.xsd'
+        self.schema_path = default_schema_path(schema_type)
 
         # Initialize Anthropic client for PDF parsing
         api_key = anthropic_api_key or os.environ.get('ANTHROPIC_API_KEY')
+        self._api_key = api_key
+        self._async_ai_parser = async_ai_parser
         if api_key:
             self.anthropic_client = Anthropic(api_key=api_key)
         else:
             self.anthropic_client = None
 
-    def convert_to_ksef_xml(self, invoice_data: Dict) -> str:
-        """Convert invoice data to KSeF XML string."""
-        # Register namespaces
-        ET.register_namespace('', self.namespace)
-        ET.register_namespace('xsi', self.namespace_xsi)
-        ET.register_namespace('xsd', self.namespace_xsd)
-
-        # Create root element
-        root = ET.Element(
-            f"{{{self.namespace}}}Faktura",
-            attrib={
-                f"{{{self.namespace_xsi}}}schemaLocation": f"{self.namespace} http://crd.gov.pl/wzor/2023/06/29/12648/schemat.xsd"
-            }
-        )
-
-        # Naglowek (Header)
-        naglowek = ET.SubElement(root, f"{{{self.namespace}}}Naglowek")
-
-        # Use schema_type to determine variant (2 or 3)
-        variant_number = self.schema_type[-1]  # Extract '2' from 'FA2' or '3' from 'FA3'
+        self.lazy_pdf_extraction = lazy_pdf_extraction
+        self.pdf_backend = get_backend(pdf_backend)
+        self.use_embedded_data = use_embedded_data
 
-        kod_formularza = ET.SubElement(
-            naglowek,
-            f"{{{self.namespace}}}KodFormularza",
-            attrib={
-                "kodSystemowy": f"FA ({variant_number})",
-                "wersjaSchemy": "1-0E"
-            }
-        )
-        kod_formularza.text = "FA"
-
-        wariant = ET.SubElement(naglowek, f"{{{self.namespace}}}WariantFormularza")
-        wariant.text = variant_number
-
-        data_wytworzenia = ET.SubElement(naglowek, f"{{{self.namespace}}}DataWytworzeniaFa")
-        data_wytworzenia.text = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
-
-        # Podmiot1 (Seller)
-        podmiot1 = ET.SubElement(root, f"{{{self.namespace}}}Podmiot1")
-        dane_id1 = ET.SubElement(podmiot1, f"{{{self.namespace}}}DaneIdentyfikacyjne")
-
-        nip1 = ET.SubElement(dane_id1, f"{{{self.namespace}}}NIP")
-        nip1.text = invoice_data['seller_tax_no']
-
-        nazwa1 = ET.SubElement(dane_id1, f"{{{self.namespace}}}Nazwa")
-        nazwa1.text = invoice_data['seller_name']
+        check_output_mode(output_format, compression)
+        self.output_format = output_format
+        self.compression = compression
 
-        adres1 = ET.SubElement(podmiot1, f"{{{self.namespace}}}Adres")
-        kod_kraju1 = ET.SubElement(adres1, f"{{{self.namespace}}}KodKraju")
-        kod_kraju1.text = invoice_data.get('seller_country', 'PL')
+        if not 0.0 <= xsd_sample_rate <= 1.0:
+            raise ValueError(f"XSD sample rate must be between 0 and 1, got {xsd_sample_rate}")
+        self.prevalidate = prevalidate
+        self.xsd_sample_rate = xsd_sample_rate
+        self._xsd_sample_counter = itertools.count()
 
-        adres_l1_1 = ET.SubElement(adres1, f"{{{self.namespace}}}AdresL1")
-        # For seller, use only street address
-        adres_l1_1.text = invoice_data['seller_street']
+        # AI parse cache is opened lazily, on the first AI fallback
+        self.use_ai_cache = use_ai_cache
+        self.ai_cache_path = ai_cache_path
+        self._ai_cache: Optional[AIParseCache] = None
+        # The async path opens it from worker threads
+        self._ai_cache_lock = threading.Lock()
 
-        # Podmiot2 (Buyer)
-        podmiot2 = ET.SubElement(root, f"{{{self.namespace}}}Podmiot2")
-        dane_id2 = ET.SubElement(podmiot2, f"{{{self.namespace}}}DaneIdentyfikacyjne")
+        # Parsing method used by the most recent convert_pdf_to_ksef_xml call; set
+        # before the AI fallback, so it also reports a failed Claude AI attempt
+        self.last_parsing_method: Optional[str] = None
+        # Whether that call's XML was sampled for full XSD validation
+        self.last_schema_validated: Optional[bool] = None
 
-        nip2 = ET.SubElement(dane_id2, f"{{{self.namespace}}}NIP")
-        nip2.text = invoice_data['buyer_tax_no']
+    def _emit_faktura(self, emitter, invoice_data: Dict, generated_at: Optional[str] = None,
+                      positions: Optional[Iterable[Dict]] = None, totals: Optional[List[Tuple[str, str]]] = None):
+        """Emit the Faktura document through a tree or stream emitter.
 
-        nazwa2 = ET.SubElement(dane_id2, f"{{{self.namespace}}}Nazwa")
-        nazwa2.text = invoice_data['buyer_name']
+        The document structure is defined only here; _TreeEmitter turns it into
+        an lxml tree and _StreamEmitter writes it straight to an output stream.
 
-        adres2 = ET.SubElement(podmiot2, f"{{{self.namespace}}}Adres")
-        kod_kraju2 = ET.SubElement(adres2, f"{{{self.namespace}}}KodKraju")
-        kod_kraju2.text = invoice_data.get('buyer_country', 'PL')
-
-        adres_l1_2 = ET.SubElement(adres2, f"{{{self.namespace}}}AdresL1")
-        adres_l1_2.text = f"{invoice_data['buyer_street']}, {invoice_data['buyer_post_code']} {invoice_data['buyer_city']}"
-
-        # Fa (Invoice details)
-        fa = ET.SubElement(root, f"{{{self.namespace}}}Fa")
-
-        kod_waluty = ET.SubElement(fa, f"{{{self.namespace}}}KodWaluty")
-        kod_waluty.text = invoice_data['currency']
-
-        p_1 = ET.SubElement(fa, f"{{{self.namespace}}}P_1")
-        p_1.text = invoice_data['issue_date']
+        Args:
+            emitter: _TreeEmitter or _StreamEmitter
+            invoice_data: Invoice data dictionary
+            generated_at: DataWytworzeniaFa value; defaults to the current time
+            positions: Line items emitted as FaWiersz; defaults to invoice_data['positions'].
+                       Read twice (totals precede the lines), so iterables are copied to a list.
+            totals: (element name, amount) pairs for P_13_x / P_14_x / P_15; defaults to the
+                    per-rate totals of the line items and their sum, or
+                    price_net/price_tax/price_gross without them
+        """
+        ns = self.namespace
+        positions = list(invoice_data.get('positions') or () if positions is None else positions)
+        if totals is None:
+            totals = _invoice_totals(invoice_data, positions, self.schema_type)
 
-        p_2 = ET.SubElement(fa, f"{{{self.namespace}}}P_2")
-        p_2.text = invoice_data['number']
+        with emitter.element(
+            f"{{{ns}}}Faktura",
+            attrib={
+                f"{{{self.namespace_xsi}}}schemaLocation": f"{ns} http://crd.gov.pl/wzor/2023/06/29/12648/schemat.xsd"
+            },
+            nsmap={None: ns, 'xsi': self.namespace_xsi}
+        ):
+            # Naglowek (Header)
+            with emitter.element(f"{{{ns}}}Naglowek"):
+                # Use schema_type to determine variant (2 or 3)
+                variant_number = self.schema_type[-1]  # Extract '2' from 'FA2' or '3' from 'FA3'
+
+                emitter.leaf(
+                    f"{{{ns}}}KodFormularza",
+                    "FA",
+                    attrib={
+                        "kodSystemowy": f"FA ({variant_number})",
+                        "wersjaSchemy": "1-0E"
+                    }
+                )
+                emitter.leaf(f"{{{ns}}}WariantFormularza", variant_number)
+                emitter.leaf(
+                    f"{{{ns}}}DataWytworzeniaFa",
+                    generated_at or datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+                )
 
-        p_13_1 = ET.SubElement(fa, f"{{{self.namespace}}}P_13_1")
-        p_13_1.text = invoice_data['price_net']
+            # Podmiot1 (Seller)
+            with emitter.element(f"{{{ns}}}Podmiot1"):
+                with emitter.element(f"{{{ns}}}DaneIdentyfikacyjne"):
+                    emitter.leaf(f"{{{ns}}}NIP", invoice_data['seller_tax_no'])
+                    emitter.leaf(f"{{{ns}}}Nazwa", invoice_data['seller_name'])
+                with emitter.element(f"{{{ns}}}Adres"):
+                    emitter.leaf(f"{{{ns}}}KodKraju", invoice_data.get('seller_country', 'PL'))
+                    # For seller, use only street address
+                    emitter.leaf(f"{{{ns}}}AdresL1", invoice_data['seller_street'])
+
+            # Podmiot2 (Buyer)
+            with emitter.element(f"{{{ns}}}Podmiot2"):
+                with emitter.element(f"{{{ns}}}DaneIdentyfikacyjne"):
+                    emitter.leaf(f"{{{ns}}}NIP", invoice_data['buyer_tax_no'])
+                    emitter.leaf(f"{{{ns}}}Nazwa", invoice_data['buyer_name'])
+                with emitter.element(f"{{{ns}}}Adres"):
+                    emitter.leaf(f"{{{ns}}}KodKraju", invoice_data.get('buyer_country', 'PL'))
+                    emitter.leaf(
+                        f"{{{ns}}}AdresL1",
+                        f"{invoice_data['buyer_street']}, {invoice_data['buyer_post_code']} {invoice_data['buyer_city']}"
+                    )
+
+            # Fa (Invoice details)
+            with emitter.element(f"{{{ns}}}Fa"):
+                emitter.leaf(f"{{{ns}}}KodWaluty", invoice_data['currency'])
+                emitter.leaf(f"{{{ns}}}P_1", invoice_data['issue_date'])
+                emitter.leaf(f"{{{ns}}}P_2", invoice_data['number'])
+                for tag, amount in totals:
+                    emitter.leaf(f"{{{ns}}}{tag}", amount)
+
+                # Adnotacje (Annotations)
+                emitter.subtree(self._adnotacje())
+
+                # RodzajFaktury (Invoice type)
+                emitter.leaf(f"{{{ns}}}RodzajFaktury", "VAT")
+
+                # FaWiersz (Line items)
+                for number, position in enumerate(positions, 1):
+                    rate = _normalize_tax_rate(position['tax'], self.schema_type)
+                    self._emit_fa_wiersz(emitter, str(number), position, rate)
+
+    def _adnotacje(self) -> etree._Element:
+        """Return the Adnotacje subtree, built once per namespace.
+
+        It holds only fixed values, so the tree builder copies it instead
+        of creating its ten elements for every invoice.
+        """
+        ns = self.namespace
+        subtree = _adnotacje_subtrees.get(ns)
+        if subtree is not None:
+            return subtree
+
+        emitter = _TreeEmitter()
+        with emitter.element(f"{{{ns}}}Adnotacje", nsmap={None: ns}):
+            emitter.leaf(f"{{{ns}}}P_16", "2")
+            emitter.leaf(f"{{{ns}}}P_17", "2")
+            emitter.leaf(f"{{{ns}}}P_18", "2")
+            emitter.leaf(f"{{{ns}}}P_18A", "2")
+            with emitter.element(f"{{{ns}}}Zwolnienie"):
+                emitter.leaf(f"{{{ns}}}P_19N", "1")
+            with emitter.element(f"{{{ns}}}NoweSrodkiTransportu"):
+                emitter.leaf(f"{{{ns}}}P_22N", "1")
+            emitter.leaf(f"{{{ns}}}P_23", "2")
+            with emitter.element(f"{{{ns}}}PMarzy"):
+                emitter.leaf(f"{{{ns}}}P_PMarzyN", "1")
+        return _adnotacje_subtrees.setdefault(ns, emitter.root)
+
+    def _emit_fa_wiersz(self, emitter, number: str, position: Dict, rate: str):
+        """Emit one FaWiersz line item.
 
-        p_14_1 = ET.SubElement(fa, f"{{{self.namespace}}}P_14_1")
-        p_14_1.text = invoice_data['price_tax']
+        Args:
+            emitter: _TreeEmitter or _StreamEmitter
+            number: Line number (NrWierszaFa)
+            position: Line item dictionary as produced by InvoiceGenerator
+            rate: Normalized VAT rate (P_12)
+        """
+        ns = self.namespace
 
-        p_15 = ET.SubElement(fa, f"{{{self.namespace}}}P_15")
-        p_15.text = invoice_data['price_gross']
+        with emitter.element(f"{{{ns}}}FaWiersz"):
+            emitter.leaf(f"{{{ns}}}NrWierszaFa", number)
+            emitter.leaf(f"{{{ns}}}P_7", position['name'])
+            emitter.leaf(f"{{{ns}}}P_8A", position.get('quantity_unit', 'szt'))
+            emitter.leaf(f"{{{ns}}}P_8B", position['quantity'])
+            emitter.leaf(f"{{{ns}}}P_9A", position['price_net'])
+            emitter.leaf(f"{{{ns}}}P_11", position['total_price_net'])
+            emitter.leaf(f"{{{ns}}}P_12", rate)
 
-        # Adnotacje (Annotations)
-        adnotacje = ET.SubElement(fa, f"{{{self.namespace}}}Adnotacje")
+    def build_ksef_tree(self, invoice_data: Dict, positions: Optional[Iterable[Dict]] = None,
+                        generated_at: Optional[str] = None) -> etree._Element:
+        """Build the KSeF XML document as a live lxml tree.
 
-        p_16 = ET.SubElement(adnotacje, f"{{{self.namespace}}}P_16")
-        p_16.text = "2"
+        The tree can be passed to validate_against_xsd() and
+        serialize_ksef_tree() without re-parsing any XML text.
 
-        p_17 = ET.SubElement(adnotacje, f"{{{self.namespace}}}P_17")
-        p_17.text = "2"
+        Args:
+            invoice_data: Invoice data dictionary
+            positions: Line items emitted as FaWiersz; defaults to invoice_data['positions']
+            generated_at: DataWytworzeniaFa value; defaults to the current time
 
-        p_18 = ET.SubElement(adnotacje, f"{{{self.namespace}}}P_18")
-        p_18.text = "2"
+        Returns:
+            Root Faktura element
+        """
+        emitter = _TreeEmitter()
+        self._emit_faktura(emitter, invoice_data, generated_at, positions)
+        return emitter.root
 
-        p_18a = ET.SubElement(adnotacje, f"{{{self.namespace}}}P_18A")
-        p_18a.text = "2"
+    def serialize_ksef_tree(self, root: etree._Element, output_format: Optional[str] = None) -> str:
+        """Serialize a tree from build_ksef_tree() to an XML string.
 
-        zwolnienie = ET.SubElement(adnotacje, f"{{{self.namespace}}}Zwolnienie")
-        p_19n = ET.SubElement(zwolnienie, f"{{{self.namespace}}}P_19N")
-        p_19n.text = "1"
+        Args:
+            root: Root Faktura element
+            output_format: 'pretty' or 'compact'; defaults to the converter's output format
+        """
+        output_format = output_format or self.output_format
+        check_output_mode(output_format, 'none')
+        if output_format == 'pretty':
+            etree.indent(root, space=XML_INDENT)
+        return XML_DECLARATION + etree.tostring(root, encoding='unicode') + "\n"
+
+    def write_ksef_xml(self, invoice_data: Dict, output: Union[str, Path, BinaryIO],
+                       positions: Optional[Iterable[Dict]] = None,
+                       output_format: Optional[str] = None, compression: Optional[str] = None,
+                       generated_at: Optional[str] = None):
+        """Write invoice XML directly to a file or binary buffer.
+
+        Elements are written incrementally with lxml's xmlfile writer, so no
+        document tree or intermediate string is built. The totals precede the
+        lines in the document, so line items are read into a list first; at
+        most MAX_LINE_ITEMS of them fit in an invoice.
 
-        nowe_srodki = ET.SubElement(adnotacje, f"{{{self.namespace}}}NoweSrodkiTransportu")
-        p_22n = ET.SubElement(nowe_srodki, f"{{{self.namespace}}}P_22N")
-        p_22n.text = "1"
+        Args:
+            invoice_data: Invoice data dictionary
+            output: File path or writable binary file object
+            positions: Line items emitted as FaWiersz, e.g. a generator; defaults
+                       to invoice_data['positions']
+            output_format: 'pretty' or 'compact'; defaults to the converter's output format
+            compression: 'none', 'gzip' or 'zstd'; defaults to the converter's compression
+                         for file paths and to 'none' for file objects
+            generated_at: DataWytworzeniaFa value; defaults to the current time
 
-        p_23 = ET.SubElement(adnotacje, f"{{{self.namespace}}}P_23")
-        p_23.text = "2"
+        Raises:
+            ValueError: If a line item has an unsupported VAT rate
+        """
+        if isinstance(output, (str, Path)):
+            with open_xml_output(output, compression or self.compression) as f:
+                self.write_ksef_xml(invoice_data, f, positions, output_format, generated_at=generated_at)
+            return
+
+        output_format = output_format or self.output_format
+        check_output_mode(output_format, 'none')
+        indent = XML_INDENT if output_format == 'pretty' else None
+        with compressed_writer(output, compression or 'none') as writer:
+            writer.write(XML_DECLARATION.encode('utf-8'))
+            with etree.xmlfile(writer, encoding='utf-8') as xf:
+                self._emit_faktura(_StreamEmitter(xf, indent), invoice_data, generated_at, positions)
+            writer.write(b"\n")
+
+    def convert_to_ksef_xml(self, invoice_data: Dict, output_format: Optional[str] = None) -> str:
+        """Convert invoice data to KSeF XML string.
 
-        p_marzy = ET.SubElement(adnotacje, f"{{{self.namespace}}}PMarzy")
-        p_marzy_n = ET.SubElement(p_marzy, f"{{{self.namespace}}}P_PMarzyN")
-        p_marzy_n.text = "1"
+        Args:
+            invoice_data: Invoice data dictionary
+            output_format: 'pretty' or 'compact'; defaults to the converter's output format
+        """
+        buffer = io.BytesIO()
+        self.write_ksef_xml(invoice_data, buffer, output_format=output_format)
+        return buffer.getvalue().decode('utf-8')
+
+    def _pre_validator(self) -> _PreValidator:
+        """Return the pre-validator for this schema type and file."""
+        key = (self.schema_type, str(self.schema_path))
+        pre_validator = _pre_validators.get(key)
+        if pre_validator is None:
+            pre_validator = _pre_validators.setdefault(key, _PreValidator(self.schema_type, self.schema_path))
+        return pre_validator
+
+    def prevalidate_invoice(self, invoice_data: Dict, positions: Optional[Iterable[Dict]] = None) -> List[str]:
+        """Check invoice data against the XSD facets of the fields it fills in.
+
+        Patterns, length limits, enumerations, digit counts and value ranges of
+        the populated elements are compiled from the XSD once per process, so
+        this takes microseconds per invoice and needs no XML. It catches the
+        common failures (amount formats, VAT rates, dates, string lengths) but
+        not structural ones; full validation stays with validate_against_xsd().
 
-        # RodzajFaktury (Invoice type)
-        rodzaj = ET.SubElement(fa, f"{{{self.namespace}}}RodzajFaktury")
-        rodzaj.text = "VAT"
+        Args:
+            invoice_data: Invoice data dictionary
+            positions: Line items; defaults to invoice_data['positions']
 
-        # Convert to pretty XML string
-        xml_str = ET.tostring(root, encoding='utf-8')
-        dom = minidom.parseString(xml_str)
-        return dom.toprettyxml(indent="    ", encoding='utf-8').decode('utf-8')
+        Returns:
+            Error messages, one per failing field; empty if the data passes
 
-    def validate_against_xsd(self, xml_content: str) -> Tuple[bool, Optional[str]]:
+        Raises:
+            FileNotFoundError: If XSD schema file not found
+            SchemaImportError: If a schema the XSD imports cannot be loaded, so
+                               its types (NIP, dates, ...) could not be checked
+        """
+        return self._pre_validator().check(invoice_data, positions)
+
+    def _sample_xsd_validation(self) -> bool:
+        """Decide whether the next conversion is validated against the full XSD."""
+        rate = self.xsd_sample_rate
+        if rate >= 1.0:
+            return True
+        seen = next(self._xsd_sample_counter)
+        # Same rounding as logging_config.SamplingFilter: the first conversion is always validated
+        return math.ceil((seen + 1) * rate) > math.ceil(seen * rate)
+
+    def validate_against_xsd(self, xml_content: Union[str, etree._Element]) -> Tuple[bool, Optional[str]]:
         """Validate XML content against KSeF XSD schema.
 
         Args:
-            xml_content: XML string to validate
+            xml_content: XML string to validate, or a live tree from build_ksef_tree()
+                         (validated directly, without re-parsing)
 
         Returns:
             Tuple of (is_valid: bool, error_message: Optional[str])
@@ -224,43 +1165,44 @@ class KSeFXMLConverter:
             raise FileNotFoundError(error_msg)
 
         try:
-            # Parse XSD schema
-            with open(self.schema_path, 'rb') as schema_file:
-                schema_doc = etree.parse(schema_file)
-                schema = etree.XMLSchema(schema_doc)
-
-            # Parse XML content
-            xml_doc = etree.fromstring(xml_content.encode('utf-8'))
+            # Parse XML content unless we were handed a live tree
+            if isinstance(xml_content, etree._Element):
+                xml_doc = xml_content
+            else:
+                xml_doc = etree.fromstring(xml_content.encode('utf-8'))
 
-            # Validate
-            is_valid = schema.validate(xml_doc)
+            # Validate against the compiled schema from the process-wide cache
+            with timed_stage('xsd_validation') as timer:
+                is_valid, errors = schema_registry.validate(self.schema_type, self.schema_path, xml_doc)
 
             if is_valid:
                 logger.info(
                     "XML validation successful",
                     extra={'extra_fields': {
                         'schema_type': self.schema_type,
+                        'duration_ms': timer.duration_ms,
                         'event_type': 'validation_success'
                     }}
                 )
                 return True, None
             else:
-                # Collect all validation errors
-                errors = []
-                for error in schema.error_log:
-                    errors.append(f"Line {error.line}: {error.message}")
-
                 error_message = "\n".join(errors)
                 logger.error(
                     "XML validation failed",
                     extra={'extra_fields': {
                         'schema_type': self.schema_type,
                         'validation_errors': errors,
+                        'duration_ms': timer.duration_ms,
                         'event_type': 'validation_failed'
                     }}
                 )
                 return False, error_message
 
+        except etree.XMLSchemaParseError as e:
+            # Logged with its details by the schema registry on the first failure
+            error_msg = f"Validation error: {str(e)}"
+            logger.error(error_msg, extra={'extra_fields': {'event_type': 'validation_error'}})
+            return False, error_msg
         except etree.XMLSyntaxError as e:
             error_msg = f"XML syntax error: {str(e)}"
             logger.error(
@@ -278,27 +1220,78 @@ class KSeFXMLConverter:
             )
             return False, error_msg
 
-    def save_ksef_xml(self, invoice_data: Dict, output_path: str, validate: bool = True):
+    def save_ksef_xml(self, invoice_data: Dict, output_path: str, validate: bool = True,
+                      output_format: Optional[str] = None, compression: Optional[str] = None,
+                      generated_at: Optional[str] = None):
         """Save invoice as KSeF XML file with optional validation.
 
         Args:
             invoice_data: Invoice data dictionary
             output_path: Path to save XML file
-            validate: If True, validate against XSD schema before saving (default: True)
+            validate: If True, pre-validate the invoice data and validate against the XSD
+                      schema before saving (default: True)
+            output_format: 'pretty' or 'compact'; defaults to the converter's output format
+            compression: 'none', 'gzip' or 'zstd'; defaults to the converter's compression.
+                         output_path is used as given, see xml_output_suffix().
+            generated_at: DataWytworzeniaFa value (YYYY-MM-DDTHH:MM:SS); defaults to the
+                          current time. Pass a fixed value for reproducible output.
 
         Raises:
             ValueError: If validation fails
         """
-        xml_content = self.convert_to_ksef_xml(invoice_data)
-
+        compression = compression or self.compression
         # Validate before saving if requested
         if validate:
-            is_valid, error_message = self.validate_against_xsd(xml_content)
+            if self.prevalidate:
+                with timed_stage('prevalidation'):
+                    errors = self.prevalidate_invoice(invoice_data)
+                if errors:
+                    raise ValueError("Invoice data does not conform to KSeF schema:\n" + "\n".join(errors))
+            with timed_stage('xml_build'):
+                root = self.build_ksef_tree(invoice_data, generated_at=generated_at)
+            is_valid, error_message = self.validate_against_xsd(root)
             if not is_valid:
                 raise ValueError(f"XML validation failed:\n{error_message}")
 
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(xml_content)
+            with timed_stage('xml_build'):
+                xml_content = self.serialize_ksef_tree(root, output_format)
+            with timed_stage('file_save'):
+                with open_xml_output(output_path, compression) as f:
+                    f.write(xml_content.encode('utf-8'))
+        else:
+            # Built and written in one streaming pass
+            with timed_stage('file_save'):
+                self.write_ksef_xml(invoice_data, output_path, output_format=output_format, compression=compression,
+                                    generated_at=generated_at)
+
+    def iter_pdf_pages(self, pdf_path: str, page_indices: Optional[Iterable[int]] = None) -> Iterator[Tuple[int, str]]:
+        """Lazily extract text from PDF pages, one page per iteration.
+
+        Pages are only parsed when the generator is advanced, using the
+        converter's text extraction backend (see pdf_text_backends).
+
+        Args:
+            pdf_path: Path to the PDF file
+            page_indices: Zero-based page indices in the order to extract them.
+                          Defaults to every page in document order.
+
+        Yields:
+            Tuples of (page_index, page_text); page_text is '' for pages without text
+
+        Raises:
+            FileNotFoundError: If PDF file doesn't exist
+        """
+        if not os.path.exists(pdf_path):
+            raise FileNotFoundError(f"PDF file not found: {pdf_path}")
+
+        with self.pdf_backend.open(pdf_path) as document:
+            yield from self._iter_document_pages(document, page_indices)
+
+    @staticmethod
+    def _iter_document_pages(document: PDFTextDocument, page_indices: Optional[Iterable[int]] = None) -> Iterator[Tuple[int, str]]:
+        """Yield (page_index, page_text) from an open PDF document."""
+        for index in (range(document.page_count) if page_indices is None else page_indices):
+            yield index, document.page_text(index)
 
     def extract_text_from_pdf(self, pdf_path: str) -> str:
         """Extract text content from PDF file.
@@ -309,24 +1302,117 @@ class KSeFXMLConverter:
         Returns:
             Extracted text content from the PDF
 
+        Raises:
+            FileNotFoundError: If PDF file doesn't exist
+        """
+        return "\n\n".join(text for _, text in self.iter_pdf_pages(pdf_path) if text)
+
+    def read_embedded_invoice_data(self, pdf_path: str) -> Optional[Dict]:
+        """Return invoice data embedded in the PDF by PDFInvoiceGenerator, if any.
+
+        The payload is the generator's source dictionary stored as the
+        'invoice.json' attachment. Malformed or incomplete payloads are
+        ignored so the caller falls back to text parsing.
+
+        Args:
+            pdf_path: Path to the PDF file
+
+        Returns:
+            Invoice data dictionary or None
+
         Raises:
             FileNotFoundError: If PDF file doesn't exist
         """
         if not os.path.exists(pdf_path):
             raise FileNotFoundError(f"PDF file not found: {pdf_path}")
 
-        text_content = []
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    text_content.append(text)
+        with self.pdf_backend.open(pdf_path) as document:
+            payload = document.attachment(INVOICE_DATA_ATTACHMENT)
+        if payload is None:
+            return None
 
-        return "\n\n".join(text_content)
+        try:
+            invoice_data = json.loads(payload)
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            invoice_data = None
+            error = str(e)
+        else:
+            error = None
+            if not isinstance(invoice_data, dict):
+                invoice_data, error = None, "payload is not a JSON object"
+            else:
+                missing_fields = [field for field in _EMBEDDED_REQUIRED_FIELDS if not invoice_data.get(field)]
+                if missing_fields:
+                    invoice_data, error = None, f"missing fields: {', '.join(missing_fields)}"
 
+        if invoice_data is None:
+            logger.warning(
+                "Ignoring invalid embedded invoice data",
+                extra={'extra_fields': {
+                    'pdf_path': pdf_path,
+                    'error': error,
+                    'event_type': 'embedded_data_invalid'
+                }}
+            )
+        return invoice_data
+
+    def extract_and_parse_lazily(self, pdf_path: str) -> Tuple[str, Dict, bool]:
+        """Extract PDF text page by page, stopping once rule-based parsing succeeds.
+
+        Header fields (NIP, number, dates, parties) live on the first page and
+        totals on the last, so those two pages are extracted and parsed first.
+        Only if that is not enough are the remaining pages extracted and the
+        full document text parsed, exactly as with full extraction.
+
+        Args:
+            pdf_path: Path to the PDF file
+
+        Returns:
+            Tuple of (text that was parsed, invoice_data, success)
+
+        Raises:
+            FileNotFoundError: If PDF file doesn't exist
+        """
+        if not os.path.exists(pdf_path):
+            raise FileNotFoundError(f"PDF file not found: {pdf_path}")
+
+        page_texts: Dict[int, str] = {}
+        with self.pdf_backend.open(pdf_path) as document:
+            page_count = document.page_count
+            probe_pages = [0, page_count - 1] if page_count > 2 else list(range(page_count))
+            for index, text in self._iter_document_pages(document, probe_pages):
+                page_texts[index] = text
+
+            if page_count > 2:
+                partial_text = "\n\n".join(page_texts[i] for i in sorted(page_texts) if page_texts[i])
+                invoice_data, success = self.parse_invoice_with_rules(partial_text)
+                if success:
+                    logger.info(
+                        "Rule-based parsing completed from first and last page",
+                        extra={'extra_fields': {
+                            'pages_extracted': len(page_texts),
+                            'page_count': page_count,
+                            'event_type': 'lazy_extraction_early_stop'
+                        }}
+                    )
+                    return partial_text, invoice_data, True
+
+                # Fall back to the full document
+                remaining_pages = [i for i in range(page_count) if i not in page_texts]
+                for index, text in self._iter_document_pages(document, remaining_pages):
+                    page_texts[index] = text
+
+        text = "\n\n".join(page_texts[i] for i in range(page_count) if page_texts[i])
+        invoice_data, success = self.parse_invoice_with_rules(text)
+        return text, invoice_data, success
+
+    @timed_stage('rule_parsing')
     def parse_invoice_with_rules(self, text: str) -> Tuple[Dict, bool]:
         """Parse invoice data from text using rule-based pattern matching.
 
+        Rules come from the precompiled tables above; a rule is skipped without
+        scanning when none of its keywords occur in the text.
+
         Args:
             text: Text content extracted from invoice
 
@@ -356,130 +1442,87 @@ class KSeFXMLConverter:
             'price_gross': '0.00'
         }
 
-        # Normalize text for easier matching
-        text_lines = text.split('\n')
+        # Single lowercase pass used by every keyword gate
+        lowered = text.lower()
 
         # Pattern 1: Extract NIP numbers (10 digits, may have dashes or spaces)
-        nip_pattern = r'NIP[:\s]*(\d{3}[-\s]?\d{3}[-\s]?\d{2}[-\s]?\d{2}|\d{10})'
-        nip_matches = re.findall(nip_pattern, text, re.IGNORECASE)
+        pattern, keywords = _NIP_RULE
+        nip_matches = pattern.findall(text) if _rule_applies(keywords, lowered) else []
         if len(nip_matches) >= 2:
             # First NIP is usually seller, second is buyer
-            invoice_data['seller_tax_no'] = re.sub(r'[-\s]', '', nip_matches[0])
-            invoice_data['buyer_tax_no'] = re.sub(r'[-\s]', '', nip_matches[1])
+            invoice_data['seller_tax_no'] = _NIP_SEPARATORS_RE.sub('', nip_matches[0])
+            invoice_data['buyer_tax_no'] = _NIP_SEPARATORS_RE.sub('', nip_matches[1])
         elif len(nip_matches) == 1:
-            invoice_data['seller_tax_no'] = re.sub(r'[-\s]', '', nip_matches[0])
+            invoice_data['seller_tax_no'] = _NIP_SEPARATORS_RE.sub('', nip_matches[0])
 
         # Pattern 2: Extract invoice number
-        # Supports both Polish ("Faktura Nr") and English ("INVOICE #") formats
-        invoice_num_patterns = [
-            r'INVOICE\s*#\s*(\d+)',  # English: "INVOICE # 13"
-            r'Invoice\s+(?:Number|No\.?)[:\s]*(\d+)',  # English: "Invoice Number: 13"
-            r'Faktura\s+(?:Nr\.?|numer|VAT)?\s*[:\s]*([A-Z0-9/\-]+)',  # Polish
-            r'(?:FA|FV)[/\-](\d+[/\-]\d+[/\-]\d+)',  # Polish: FA/001/2025
-            r'Numer\s+faktury[:\s]*([A-Z0-9/\-]+)'  # Polish
-        ]
-        for pattern in invoice_num_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for pattern, keywords in _INVOICE_NUMBER_RULES:
+            if not _rule_applies(keywords, lowered):
+                continue
+            match = pattern.search(text)
             if match:
                 invoice_data['number'] = match.group(1) if len(match.groups()) == 1 else match.group(0)
                 break
 
         # Pattern 3: Extract dates
-        # Supports Polish, English, and various numeric formats
-        date_patterns = [
-            r'DATE[:\s]*(\d{1,2})\s+([A-Za-z]+)[,\s]+(\d{4})',  # English: "DATE: 02 April, 2025"
-            r'(?:Invoice\s+)?Date[:\s]*(\d{1,2})\s+([A-Za-z]+)[,\s]+(\d{4})',  # "Invoice Date: 02 April, 2025"
-            r'Data\s+wystawienia[:\s]*(\d{4}-\d{2}-\d{2})',  # Polish: "Data wystawienia: 2025-04-02"
-            r'Data\s+wystawienia[:\s]*(\d{2}[-/.]\d{2}[-/.]\d{4})',  # Polish: "Data wystawienia: 02.04.2025"
-            r'Data\s+sprzedaży[:\s]*(\d{4}-\d{2}-\d{2})',
-            r'Data\s+sprzedaży[:\s]*(\d{2}[-/.]\d{2}[-/.]\d{4})'
-        ]
-
-        month_names = {
-            'january': '01', 'february': '02', 'march': '03', 'april': '04',
-            'may': '05', 'june': '06', 'july': '07', 'august': '08',
-            'september': '09', 'october': '10', 'november': '11', 'december': '12'
-        }
-
-        for pattern in date_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for pattern, keywords in _DATE_RULES:
+            if not _rule_applies(keywords, lowered):
+                continue
+            match = pattern.search(text)
             if match:
                 groups = match.groups()
                 if len(groups) == 3:  # English date format (day, month name, year)
                     day, month_name, year = groups
-                    month = month_names.get(month_name.lower(), '01')
+                    month = _MONTH_NAMES.get(month_name.lower(), '01')
                     date_str = f"{year}-{month}-{day.zfill(2)}"
                 else:  # Numeric date format
                     date_str = groups[0]
                     # Convert DD-MM-YYYY or DD.MM.YYYY to YYYY-MM-DD
-                    if re.match(r'\d{2}[-/.]\d{2}[-/.]\d{4}', date_str):
-                        parts = re.split(r'[-/.]', date_str)
+                    if _NUMERIC_DATE_RE.match(date_str):
+                        parts = _DATE_SEPARATORS_RE.split(date_str)
                         date_str = f"{parts[2]}-{parts[1]}-{parts[0]}"
                 invoice_data['issue_date'] = date_str
                 break
 
         # Pattern 4: Extract amounts
-        # Supports both Polish and English formats (EU invoices only)
-        amount_patterns = [
-            # English patterns with PLN
-            (r'SUBTOTAL[:\s]*([\d,\s]+(?:\.\d{2})?)\s*zł', 'price_net'),  # "SUBTOTAL 22,344.00 zł"
-            (r'VAT\s+\d+%[:\s]*(?:EUR\s+)?([\d,\s]+(?:\.\d{2})?)\s*zł', 'price_tax'),  # "VAT 23% EUR 5,139.12 zł"
-            (r'TOTAL[:\s]*([\d,\s]+(?:\.\d{2})?)\s*zł', 'price_gross'),  # "TOTAL 27,483.12 zł"
-            # Polish patterns
-            (r'(?:Wartość\s+)?[Nn]etto[:\s]*([\d,\s]+)', 'price_net'),
-            (r'(?:Wartość\s+)?VAT[:\s]*([\d,\s]+)', 'price_tax'),
-            (r'(?:Wartość\s+)?[Bb]rutto[:\s]*([\d,\s]+)', 'price_gross'),
-            (r'Razem[:\s]*([\d,\s]+)', 'price_gross'),
-            (r'Do\s+zapłaty[:\s]*([\d,\s]+)', 'price_gross')
-        ]
-
-        for pattern, field in amount_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
+        for pattern, field, keywords in _AMOUNT_RULES:
+            if not _rule_applies(keywords, lowered):
+                continue
+            matches = pattern.findall(text)
             if matches:
                 # Take the last match (usually the total)
-                amount = matches[-1].replace(' ', '').replace(',', '')
-                # Handle potential decimal formatting
-                if '.' in amount:
-                    # Already has decimal point
-                    parts = amount.split('.')
-                    if len(parts[-1]) == 2:  # e.g., "22344.00"
-                        amount = amount
-                    else:  # e.g., "22.344" (thousands separator)
-                        amount = amount.replace('.', '') + '.00'
-                else:
-                    amount += '.00'
-                invoice_data[field] = amount
+                invoice_data[field] = _normalize_amount(matches[-1])
 
         # Pattern 5: Extract company names
-        # Supports Polish ("Sprzedawca") and English ("Bill To") formats
-
         # Try Polish format first
-        seller_section = re.search(r'Sprzedawca[:\s]*\n([^\n]+)', text, re.IGNORECASE)
+        pattern, keywords = _SELLER_NAME_RULE
+        seller_section = pattern.search(text) if _rule_applies(keywords, lowered) else None
         if seller_section:
             invoice_data['seller_name'] = seller_section.group(1).strip()
 
-        # Try English format: look for name after INVOICE and before street address
+        # Try English format: INVOICE, then name on next line, then street address
         if not invoice_data['seller_name']:
-            # Pattern: INVOICE, then name on next line, then street address
-            seller_eng = re.search(r'INVOICE\s*\n([^\n]+)\s*\n([^\n]+street[^\n]*)', text, re.IGNORECASE)
+            pattern, keywords = _SELLER_NAME_ENG_RULE
+            seller_eng = pattern.search(text) if _rule_applies(keywords, lowered) else None
             if seller_eng:
                 invoice_data['seller_name'] = seller_eng.group(1).strip()
                 invoice_data['seller_street'] = seller_eng.group(2).strip()
 
-        buyer_section = re.search(r'Nabywca[:\s]*\n([^\n]+)', text, re.IGNORECASE)
+        pattern, keywords = _BUYER_NAME_RULE
+        buyer_section = pattern.search(text) if _rule_applies(keywords, lowered) else None
         if buyer_section:
             invoice_data['buyer_name'] = buyer_section.group(1).strip()
 
         # Try English format: "Bill To:" followed by company name
         if not invoice_data['buyer_name']:
-            buyer_eng = re.search(r'Bill\s+To[:\s]*([^\n]+)', text, re.IGNORECASE)
+            pattern, keywords = _BUYER_NAME_ENG_RULE
+            buyer_eng = pattern.search(text) if _rule_applies(keywords, lowered) else None
             if buyer_eng:
                 invoice_data['buyer_name'] = buyer_eng.group(1).strip()
 
         # Pattern 6: Extract addresses
-        # Polish format: ul., al., pl.
-        street_pattern = r'(?:ul\.|al\.|pl\.)\s+([^\n,]+)'
-        street_matches = re.findall(street_pattern, text, re.IGNORECASE)
+        pattern, keywords = _STREET_RULE
+        street_matches = pattern.findall(text) if _rule_applies(keywords, lowered) else []
         if len(street_matches) >= 2:
             invoice_data['seller_street'] = street_matches[0].strip()
             invoice_data['buyer_street'] = street_matches[1].strip()
@@ -487,21 +1530,23 @@ class KSeFXMLConverter:
             if not invoice_data['seller_street']:
                 invoice_data['seller_street'] = street_matches[0].strip()
 
-        # English format: Look for "street" or "Aleja" keyword
+        # English format: Look for "street" keyword
         if not invoice_data['seller_street']:
-            seller_street_eng = re.search(r'([A-ZĄĆĘŁŃÓŚŹŻa-ząćęłńóśźż]+\s+street[^,\n]+)', text, re.IGNORECASE)
+            pattern, keywords = _SELLER_STREET_ENG_RULE
+            seller_street_eng = pattern.search(text) if _rule_applies(keywords, lowered) else None
             if seller_street_eng:
                 invoice_data['seller_street'] = seller_street_eng.group(1).strip()
 
         if not invoice_data['buyer_street']:
             # Look for address after "Bill To" section
-            buyer_street_eng = re.search(r'Bill\s+To[^\n]*\n[^\n]+\n([^\n]+)', text, re.IGNORECASE)
+            pattern, keywords = _BUYER_STREET_ENG_RULE
+            buyer_street_eng = pattern.search(text) if _rule_applies(keywords, lowered) else None
             if buyer_street_eng:
                 invoice_data['buyer_street'] = buyer_street_eng.group(1).strip()
 
         # Pattern 7: Extract postal code and city for buyer
-        postal_pattern = r'(\d{2}-\d{3})[,\s]+([A-ZĄĆĘŁŃÓŚŹŻa-ząćęłńóśźż\s]+)'
-        postal_matches = re.findall(postal_pattern, text)
+        pattern, _ = _POSTAL_RULE
+        postal_matches = pattern.findall(text)
         if len(postal_matches) >= 2:
             invoice_data['buyer_post_code'] = postal_matches[1][0]
             invoice_data['buyer_city'] = postal_matches[1][1].strip().rstrip(',')
@@ -512,12 +1557,7 @@ class KSeFXMLConverter:
                 invoice_data['buyer_city'] = postal_matches[0][1].strip().rstrip(',')
 
         # Validate required fields
-        required_fields = [
-            'seller_name', 'seller_tax_no', 'buyer_name', 'buyer_tax_no',
-            'number', 'issue_date', 'price_net', 'price_tax', 'price_gross'
-        ]
-
-        missing_fields = [field for field in required_fields if not invoice_data.get(field) or invoice_data[field] == '0.00']
+        missing_fields = [field for field in _REQUIRED_FIELDS if not invoice_data.get(field) or invoice_data[field] == '0.00']
 
         if missing_fields:
             logger.warning(
@@ -539,26 +1579,40 @@ class KSeFXMLConverter:
             )
             return invoice_data, True
 
-    def parse_invoice_from_text(self, text: str) -> Dict:
-        """Parse invoice data from text using Claude AI.
-
-        Args:
-            text: Text content extracted from invoice
-
-        Returns:
-            Dictionary containing parsed invoice data
-
-        Raises:
-            ValueError: If Anthropic API key is not configured
-            Exception: If parsing fails
+    @property
+    def ai_cache(self) -> Optional[AIParseCache]:
+        """AI parse cache, or None if caching is disabled."""
+        if self.use_ai_cache and self._ai_cache is None:
+            with self._ai_cache_lock:
+                if self._ai_cache is None:
+                    self._ai_cache = AIParseCache(self.ai_cache_path)
+        return self._ai_cache
+
+    def _store_ai_result(self, ai_cache: AIParseCache, text: str, invoice_data: Dict):
+        """Cache AI-parsed invoice data if it passes pre-validation.
+
+        A bad parse would otherwise be served from the cache until it expires,
+        and retries would never reach the API. The check runs even when
+        pre-validation of conversions is turned off.
         """
-        if not self.anthropic_client:
-            raise ValueError(
-                "Anthropic API key not configured. "
-                "Set ANTHROPIC_API_KEY environment variable or pass api_key to constructor."
+        try:
+            errors = self.prevalidate_invoice(invoice_data)
+        except Exception as e:
+            errors = [f"{type(e).__name__}: {e}"]
+        if errors:
+            logger.warning(
+                "Not caching AI parse result that fails pre-validation",
+                extra={'extra_fields': {
+                    'validation_errors': errors,
+                    'event_type': 'ai_cache_skipped'
+                }}
             )
+            return
+        ai_cache.put(text, AI_MODEL, AI_PROMPT_VERSION, invoice_data)
 
-        prompt = f"""Extract invoice data from the following Polish invoice text and return it as a JSON object.
+    def _build_ai_prompt(self, text: str) -> str:
+        """Build the Claude AI extraction prompt for invoice text."""
+        return f"""Extract invoice data from the following Polish invoice text and return it as a JSON object.
 
 Invoice Text:
 {text}
@@ -589,56 +1643,135 @@ Important:
 - All price fields should be strings with 2 decimal places
 - If any field is not found, use empty string "" for text fields or "0.00" for price fields"""
 
-        try:
-            message = self.anthropic_client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=2000,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
+    @staticmethod
+    def _parse_ai_response(message) -> Dict:
+        """Extract the invoice JSON object from a Claude messages API response.
+
+        Raises:
+            json.JSONDecodeError: If the response does not contain valid JSON
+        """
+        response_text = message.content[0].text.strip()
+
+        # Try to find JSON in the response
+        if response_text.startswith('```'):
+            # Remove markdown code blocks
+            response_text = response_text.split('```')[1]
+            if response_text.startswith('json'):
+                response_text = response_text[4:]
+            response_text = response_text.strip()
+
+        return json.loads(response_text)
+
+    def parse_invoice_from_text(self, text: str) -> Dict:
+        """Parse invoice data from text using Claude AI.
+
+        Args:
+            text: Text content extracted from invoice
+
+        Results that pass pre-validation are cached by content (see ai_cache),
+        so identical text is only sent to the API once while the entry is alive.
+
+        Returns:
+            Dictionary containing parsed invoice data
+
+        Raises:
+            AIConfigurationError: If Anthropic API key is not configured
+            Exception: If parsing fails
+        """
+        if not self.anthropic_client:
+            raise AIConfigurationError(
+                "Anthropic API key not configured. "
+                "Set ANTHROPIC_API_KEY environment variable or pass api_key to constructor."
             )
 
-            # Extract JSON from response
-            response_text = message.content[0].text.strip()
+        # Only opened once AI is configured, so runs without a key create no cache file
+        ai_cache = self.ai_cache
+        if ai_cache is not None:
+            cached = ai_cache.get(text, AI_MODEL, AI_PROMPT_VERSION)
+            if cached is not None:
+                return cached
 
-            # Try to find JSON in the response
-            if response_text.startswith('```'):
-                # Remove markdown code blocks
-                response_text = response_text.split('```')[1]
-                if response_text.startswith('json'):
-                    response_text = response_text[4:]
-                response_text = response_text.strip()
+        try:
+            with timed_stage('ai_parsing') as timer:
+                message = self.anthropic_client.messages.create(
+                    model=AI_MODEL,
+                    max_tokens=2000,
+                    messages=[
+                        {"role": "user", "content": self._build_ai_prompt(text)}
+                    ]
+                )
+            log_api_call(logger, '/messages', 'POST', 200, timer.duration_ms)
 
-            invoice_data = json.loads(response_text)
+            invoice_data = self._parse_ai_response(message)
+            if ai_cache is not None:
+                self._store_ai_result(ai_cache, text, invoice_data)
             return invoice_data
 
         except json.JSONDecodeError as e:
-            raise Exception(f"Failed to parse JSON from AI response: {e}\nResponse: {response_text}")
+            raise Exception(f"Failed to parse JSON from AI response: {e}\nResponse: {e.doc}")
         except Exception as e:
             raise Exception(f"Failed to parse invoice data: {e}")
 
-    def convert_pdf_to_ksef_xml(self, pdf_path: str, output_path: Optional[str] = None, force_ai: bool = False) -> str:
-        """Convert PDF invoice to KSeF XML format using hybrid approach.
+    @property
+    def async_ai_parser(self) -> Optional[AsyncAIParser]:
+        """Concurrency-limited async Claude AI client, or None if no API key is configured."""
+        if self._async_ai_parser is None and self._api_key:
+            self._async_ai_parser = AsyncAIParser(AsyncAnthropic(api_key=self._api_key, max_retries=0))
+        return self._async_ai_parser
 
-        This method first attempts rule-based parsing. If that fails or if force_ai is True,
-        it falls back to Claude AI for intelligent parsing.
+    async def parse_invoice_from_text_async(self, text: str) -> Dict:
+        """Parse invoice data from text using Claude AI without blocking the event loop.
 
-        Args:
-            pdf_path: Path to the PDF invoice file
-            output_path: Optional path to save the XML file. If not provided, only returns XML string.
-            force_ai: If True, skip rule-based parsing and use Claude AI directly
-
-        Returns:
-            KSeF XML string
+        Same contract and caching as parse_invoice_from_text(), but requests go
+        through AsyncAIParser, which bounds concurrency, rate-limits and retries
+        429/5xx responses with jittered backoff.
 
         Raises:
-            FileNotFoundError: If PDF file doesn't exist
-            ValueError: If API key is not configured when AI parsing is needed
-            Exception: If both parsing methods fail
+            AIConfigurationError: If Anthropic API key is not configured
+            Exception: If parsing fails
         """
-        # Set correlation ID for this conversion
-        correlation_id = set_correlation_id()
+        parser = self.async_ai_parser
+        if parser is None:
+            raise AIConfigurationError(
+                "Anthropic API key not configured. "
+                "Set ANTHROPIC_API_KEY environment variable or pass api_key to constructor."
+            )
+
+        # SQLite cache lookups block, so they run in a worker thread
+        ai_cache = await asyncio.to_thread(lambda: self.ai_cache)
+        if ai_cache is not None:
+            cached = await asyncio.to_thread(ai_cache.get, text, AI_MODEL, AI_PROMPT_VERSION)
+            if cached is not None:
+                return cached
+
+        try:
+            with timed_stage('ai_parsing') as timer:
+                message = await parser.create_message(
+                    model=AI_MODEL,
+                    max_tokens=2000,
+                    messages=[
+                        {"role": "user", "content": self._build_ai_prompt(text)}
+                    ]
+                )
+            log_api_call(logger, '/messages', 'POST', 200, timer.duration_ms)
+
+            invoice_data = self._parse_ai_response(message)
+            if ai_cache is not None:
+                await asyncio.to_thread(self._store_ai_result, ai_cache, text, invoice_data)
+            return invoice_data
 
+        except json.JSONDecodeError as e:
+            raise Exception(f"Failed to parse JSON from AI response: {e}\nResponse: {e.doc}")
+        except Exception as e:
+            raise Exception(f"Failed to parse invoice data: {e}")
+
+    def _extract_and_parse_with_rules(self, pdf_path: str, output_path: Optional[str], force_ai: bool) -> Tuple[str, Optional[Dict], str]:
+        """Run the conversion stages before the AI fallback.
+
+        Returns:
+            Tuple of (extracted text, invoice data or None if AI parsing is needed,
+            parsing method of the returned invoice data)
+        """
         logger.info(
             f"Starting PDF to KSeF XML conversion",
             extra={'extra_fields': {
@@ -649,71 +1782,82 @@ Important:
             }}
         )
 
-        try:
-            text = self.extract_text_from_pdf(pdf_path)
-            log_file_operation(logger, 'pdf_text_extraction', pdf_path, True)
-        except Exception as e:
-            log_file_operation(logger, 'pdf_text_extraction', pdf_path, False, str(e))
-            raise
-
-        invoice_data = None
-        parsing_method = None
+        # Invoice data embedded by our own generator needs no parsing at all
+        if not force_ai and self.use_embedded_data:
+            with timed_stage('embedded_read'):
+                invoice_data = self.read_embedded_invoice_data(pdf_path)
+            if invoice_data is not None:
+                logger.info(
+                    "Using invoice data embedded in PDF",
+                    extra={'extra_fields': {
+                        'parsing_method': 'embedded',
+                        'event_type': 'embedded_data_used'
+                    }}
+                )
+                return '', invoice_data, "embedded"
 
         # Try rule-based parsing first (unless force_ai is True)
+        if not force_ai and self.lazy_pdf_extraction:
+            try:
+                # Rule parsing between pages is timed as its own stage
+                with timed_stage('text_extraction') as timer:
+                    text, invoice_data, success = self.extract_and_parse_lazily(pdf_path)
+                log_file_operation(logger, 'pdf_text_extraction', pdf_path, True, duration_ms=timer.duration_ms)
+            except Exception as e:
+                log_file_operation(logger, 'pdf_text_extraction', pdf_path, False, str(e))
+                raise
+        else:
+            try:
+                with timed_stage('text_extraction') as timer:
+                    text = self.extract_text_from_pdf(pdf_path)
+                log_file_operation(logger, 'pdf_text_extraction', pdf_path, True, duration_ms=timer.duration_ms)
+            except Exception as e:
+                log_file_operation(logger, 'pdf_text_extraction', pdf_path, False, str(e))
+                raise
+            if not force_ai:
+                invoice_data, success = self.parse_invoice_with_rules(text)
+
         if not force_ai:
-            invoice_data, success = self.parse_invoice_with_rules(text)
             if success:
-                parsing_method = "rule-based"
-            else:
-                logger.warning(
-                    "Rule-based parsing failed, falling back to Claude AI",
-                    extra={'extra_fields': {'event_type': 'fallback_to_ai'}}
-                )
-                invoice_data = None
+                return text, invoice_data, "rule-based"
+            logger.warning(
+                "Rule-based parsing failed, falling back to Claude AI",
+                extra={'extra_fields': {'event_type': 'fallback_to_ai'}}
+            )
 
         # Fall back to Claude AI if rule-based parsing failed
-        if invoice_data is None:
-            if not self.anthropic_client:
-                logger.error(
-                    "Claude AI not configured and rule-based parsing failed",
-                    extra={'extra_fields': {'event_type': 'parsing_failed'}}
-                )
-                raise ValueError(
-                    "Rule-based parsing failed and Claude AI is not configured. "
-                    "Set ANTHROPIC_API_KEY environment variable or pass api_key to constructor."
-                )
-
-            logger.info(
-                "Using Claude AI for intelligent parsing",
-                extra={'extra_fields': {'parsing_method': 'claude_ai'}}
+        if not self.anthropic_client and self._async_ai_parser is None:
+            logger.error(
+                "Claude AI not configured and rule-based parsing failed",
+                extra={'extra_fields': {'event_type': 'parsing_failed'}}
+            )
+            raise AIConfigurationError(
+                "Rule-based parsing failed and Claude AI is not configured. "
+                "Set ANTHROPIC_API_KEY environment variable or pass api_key to constructor."
             )
-
-            try:
-                invoice_data = self.parse_invoice_from_text(text)
-                parsing_method = "Claude AI"
-                log_api_call(logger, '/messages', 'POST', 200, None)
-            except Exception as e:
-                logger.error(
-                    f"Claude AI parsing failed: {str(e)}",
-                    extra={'extra_fields': {'event_type': 'ai_parsing_failed'}},
-                    exc_info=True
-                )
-                raise
 
         logger.info(
-            f"Successfully parsed invoice",
-            extra={'extra_fields': {
-                'parsing_method': parsing_method,
-                'invoice_number': invoice_data.get('number'),
-                'event_type': 'parsing_complete'
-            }}
+            "Using Claude AI for intelligent parsing",
+            extra={'extra_fields': {'parsing_method': 'claude_ai'}}
+        )
+        return text, None, "Claude AI"
+
+    def _log_ai_parsing_failed(self, error: Exception):
+        """Log a failed Claude AI parse."""
+        logger.error(
+            f"Claude AI parsing failed: {str(error)}",
+            extra={'extra_fields': {'event_type': 'ai_parsing_failed'}},
+            exc_info=True
         )
 
+    def _build_and_validate(self, invoice_data: Dict) -> str:
+        """Build the XML tree, validate it against the full XSD schema and serialize it."""
         try:
-            xml_content = self.convert_to_ksef_xml(invoice_data)
+            with timed_stage('xml_build') as timer:
+                root = self.build_ksef_tree(invoice_data)
             logger.info(
                 "Successfully converted to KSeF XML format",
-                extra={'extra_fields': {'event_type': 'xml_conversion_complete'}}
+                extra={'extra_fields': {'duration_ms': timer.duration_ms, 'event_type': 'xml_conversion_complete'}}
             )
         except Exception as e:
             logger.error(
@@ -725,7 +1869,7 @@ Important:
 
         # Validate XML against XSD schema
         try:
-            is_valid, error_message = self.validate_against_xsd(xml_content)
+            is_valid, error_message = self.validate_against_xsd(root)
             if not is_valid:
                 logger.error(
                     f"XSD validation failed: {error_message}",
@@ -740,11 +1884,55 @@ Important:
             )
             raise
 
+        with timed_stage('xml_build'):
+            return self.serialize_ksef_tree(root)
+
+    def _finish_conversion(self, invoice_data: Dict, parsing_method: str, output_path: Optional[str]) -> str:
+        """Pre-validate, build, validate (if sampled) and optionally save the XML for parsed invoice data."""
+        logger.info(
+            f"Successfully parsed invoice",
+            extra={'extra_fields': {
+                'parsing_method': parsing_method,
+                'invoice_number': invoice_data.get('number'),
+                'event_type': 'parsing_complete'
+            }}
+        )
+        self.last_parsing_method = parsing_method
+
+        if self.prevalidate:
+            with timed_stage('prevalidation') as timer:
+                errors = self.prevalidate_invoice(invoice_data)
+            if errors:
+                logger.error(
+                    "Invoice data failed pre-validation",
+                    extra={'extra_fields': {
+                        'schema_type': self.schema_type,
+                        'validation_errors': errors,
+                        'duration_ms': timer.duration_ms,
+                        'event_type': 'prevalidation_failed'
+                    }}
+                )
+                raise ValueError("Invoice data does not conform to KSeF schema:\n" + "\n".join(errors))
+
+        # Unsampled conversions skip the tree and stream the XML text directly
+        schema_validated = self._sample_xsd_validation()
+        self.last_schema_validated = schema_validated
+        if not schema_validated:
+            with timed_stage('xml_build') as timer:
+                xml_content = self.convert_to_ksef_xml(invoice_data)
+            logger.info(
+                "Successfully converted to KSeF XML format",
+                extra={'extra_fields': {'duration_ms': timer.duration_ms, 'event_type': 'xml_conversion_complete'}}
+            )
+        else:
+            xml_content = self._build_and_validate(invoice_data)
+
         if output_path:
             try:
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write(xml_content)
-                log_file_operation(logger, 'xml_save', output_path, True)
+                with timed_stage('file_save') as timer:
+                    with open_xml_output(output_path, self.compression) as f:
+                        f.write(xml_content.encode('utf-8'))
+                log_file_operation(logger, 'xml_save', output_path, True, duration_ms=timer.duration_ms)
             except Exception as e:
                 log_file_operation(logger, 'xml_save', output_path, False, str(e))
                 raise
@@ -754,39 +1942,842 @@ Important:
             extra={'extra_fields': {
                 'parsing_method': parsing_method,
                 'invoice_number': invoice_data.get('number'),
-                'schema_validated': True,
+                'schema_validated': schema_validated,
+                'stage_ms': get_stage_timings(),
                 'event_type': 'conversion_complete'
             }}
         )
 
         return xml_content
 
+    def convert_pdf_to_ksef_xml(self, pdf_path: str, output_path: Optional[str] = None, force_ai: bool = False) -> str:
+        """Convert PDF invoice to KSeF XML format using hybrid approach.
+
+        PDFs from PDFInvoiceGenerator carry their source invoice data, which is used
+        directly. Otherwise this method first attempts rule-based parsing. If that fails
+        or if force_ai is True, it falls back to Claude AI for intelligent parsing.
+
+        Args:
+            pdf_path: Path to the PDF invoice file
+            output_path: Optional path to save the XML file. If not provided, only returns XML string.
+            force_ai: If True, skip rule-based parsing and use Claude AI directly
+
+        Returns:
+            KSeF XML string
+
+        Raises:
+            FileNotFoundError: If PDF file doesn't exist
+            AIConfigurationError: If API key is not configured when AI parsing is needed
+            ValueError: If the invoice data fails pre-validation or XSD validation
+            Exception: If both parsing methods fail
+        """
+        # Set correlation ID and start stage timings for this conversion
+        set_correlation_id()
+        start_stage_timings()
+        self.last_parsing_method = None
+        self.last_schema_validated = None
+
+        invoice_data, parsing_method = self.parse_pdf(pdf_path, force_ai, output_path)
+        return self._finish_conversion(invoice_data, parsing_method, output_path)
+
+    def parse_pdf(self, pdf_path: str, force_ai: bool = False, output_path: Optional[str] = None) -> Tuple[Dict, str]:
+        """Extract invoice data from a PDF with the hybrid approach, without building XML.
+
+        Args:
+            pdf_path: Path to the PDF invoice file
+            force_ai: If True, skip rule-based parsing and use Claude AI directly
+            output_path: Only recorded in the conversion_start log event
+
+        Returns:
+            Tuple of (invoice_data, parsing_method)
+
+        Raises:
+            FileNotFoundError: If PDF file doesn't exist
+            AIConfigurationError: If API key is not configured when AI parsing is needed
+        """
+        text, invoice_data, parsing_method = self._extract_and_parse_with_rules(pdf_path, output_path, force_ai)
+        self.last_parsing_method = parsing_method
+
+        if invoice_data is None:
+            try:
+                invoice_data = self.parse_invoice_from_text(text)
+            except Exception as e:
+                self._log_ai_parsing_failed(e)
+                raise
+
+        return invoice_data, parsing_method
+
+    async def convert_pdf_to_ksef_xml_async(self, pdf_path: str, output_path: Optional[str] = None, force_ai: bool = False) -> str:
+        """Async variant of convert_pdf_to_ksef_xml().
+
+        PDF extraction, rule parsing, XML building and validation run in worker
+        threads; the Claude AI fallback is awaited through AsyncAIParser, so many
+        conversions can wait on the API concurrently, e.g.:
+
+            results = await asyncio.gather(
+                *(converter.convert_pdf_to_ksef_xml_async(p) for p in pdf_paths),
+                return_exceptions=True
+            )
+
+        Arguments, return value and exceptions match convert_pdf_to_ksef_xml().
+        """
+        # Set correlation ID and start stage timings for this conversion (copied into worker threads)
+        set_correlation_id()
+        start_stage_timings()
+        self.last_parsing_method = None
+        self.last_schema_validated = None
+
+        text, invoice_data, parsing_method = await asyncio.to_thread(
+            self._extract_and_parse_with_rules, pdf_path, output_path, force_ai
+        )
+        self.last_parsing_method = parsing_method
+
+        if invoice_data is None:
+            try:
+                invoice_data = await self.parse_invoice_from_text_async(text)
+            except Exception as e:
+                self._log_ai_parsing_failed(e)
+                raise
+
+        return await asyncio.to_thread(self._finish_conversion, invoice_data, parsing_method, output_path)
+
+
+# ============================================================================
+# Batch Conversion
+# ============================================================================
+
+# Converter owned by the current batch worker process (see _init_batch_worker)
+_batch_converter: Optional[KSeFXMLConverter] = None
+
+
+def collect_pdf_paths(inputs: List[str], manifests: Optional[List[str]] = None) -> List[Tuple[Path, Path]]:
+    """Expand CLI inputs into a de-duplicated list of PDF files.
+
+    Args:
+        inputs: PDF files, directories (searched recursively for *.pdf) or glob patterns
+        manifests: Optional text files listing one PDF path per line ('#' starts a comment)
+
+    Returns:
+        List of (pdf_path, relative_output_name) tuples in input order. The relative
+        name keeps sub-directory structure for PDFs found under a directory input.
+
+    Raises:
+        FileNotFoundError: If an input or manifest does not exist
+    """
+    entries: List[Tuple[Path, Path]] = []
+
+    for manifest in manifests or []:
+        manifest_path = Path(manifest)
+        if not manifest_path.is_file():
+            raise FileNotFoundError(f"Manifest file not found: {manifest_path}")
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.split('#', 1)[0].strip()
+                if line:
+                    # Relative manifest entries are resolved against the manifest location
+                    pdf_path = Path(line) if Path(line).is_absolute() else manifest_path.parent / line
+                    entries.append((pdf_path, Path(pdf_path.name)))
+
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            for pdf_path in sorted(path.rglob('*.pdf')):
+                entries.append((pdf_path, pdf_path.relative_to(path)))
+        elif glob.has_magic(item):
+            for match in sorted(glob.glob(item, recursive=True)):
+                if match.lower().endswith('.pdf') and os.path.isfile(match):
+                    entries.append((Path(match), Path(Path(match).name)))
+        elif path.exists():
+            entries.append((path, Path(path.name)))
+        else:
+            raise FileNotFoundError(f"PDF file not found: {path}")
+
+    seen = set()
+    unique_entries = []
+    for pdf_path, relative_name in entries:
+        key = os.path.abspath(pdf_path)
+        if key not in seen:
+            seen.add(key)
+            unique_entries.append((pdf_path, relative_name))
+    return unique_entries
+
+
+def _init_batch_worker(converter_kwargs: Dict):
+    """Create the converter reused by every task in this worker process."""
+    global _batch_converter
+    _batch_converter = KSeFXMLConverter(**converter_kwargs)
+
+
+def _convert_batch_item(pdf_path: str, output_path: str, force_ai: bool) -> Dict:
+    """Convert one PDF in a batch worker and report the outcome instead of raising."""
+    start = time.perf_counter()
+    result = {
+        'pdf_path': pdf_path,
+        'output_path': output_path,
+        'success': False,
+        'parsing_method': None,
+        'error': None
+    }
+    try:
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        _batch_converter.convert_pdf_to_ksef_xml(pdf_path, output_path, force_ai=force_ai)
+        result['success'] = True
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['parsing_method'] = _batch_converter.last_parsing_method
+    result['duration_ms'] = round((time.perf_counter() - start) * 1000, 3)
+    result['stage_ms'] = get_stage_timings()
+    return result
+
+
+def _percentile(values: List[float], percent: float) -> Optional[float]:
+    """Return the nearest-rank percentile of values, or None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize_stages(results: List[Dict]) -> Dict[str, Dict]:
+    """Aggregate per-file stage timings into a latency histogram summary per stage."""
+    histograms: Dict[str, LatencyHistogram] = {}
+    for result in results:
+        for stage, duration_ms in (result.get('stage_ms') or {}).items():
+            histograms.setdefault(stage, LatencyHistogram()).add(duration_ms)
+    return {stage: histogram.summary() for stage, histogram in sorted(histograms.items())}
+
+
+def summarize_batch(results: List[Dict], wall_time_s: float) -> Dict:
+    """Build the batch summary report from per-file results."""
+    durations = [r['duration_ms'] for r in results]
+    succeeded = sum(1 for r in results if r['success'])
+    return {
+        'total': len(results),
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'embedded': sum(1 for r in results if r['parsing_method'] == 'embedded'),
+        'ai_fallback': sum(1 for r in results if r['parsing_method'] == 'Claude AI'),
+        'ai_fallback_failed': sum(1 for r in results if r['parsing_method'] == 'Claude AI' and not r['success']),
+        'wall_time_s': round(wall_time_s, 3),
+        'invoices_per_second': round(len(results) / wall_time_s, 2) if wall_time_s > 0 else None,
+        'latency_ms': {
+            'p50': _percentile(durations, 50),
+            'p95': _percentile(durations, 95),
+            'max': max(durations) if durations else None
+        },
+        'stages_ms': summarize_stages(results),
+        'failures': [
+            {'pdf_path': r['pdf_path'], 'error': r['error']}
+            for r in results if not r['success']
+        ]
+    }
+
+
+def convert_batch(
+    entries: List[Tuple[Path, Path]],
+    output_dir: Optional[str] = None,
+    workers: Optional[int] = None,
+    converter_kwargs: Optional[Dict] = None,
+    force_ai: bool = False,
+    on_result: Optional[Callable[[Dict], None]] = None
+) -> Dict:
+    """Convert many PDFs to KSeF XML across a process pool.
+
+    Each worker process builds one KSeFXMLConverter up front and reuses it
+    (and its cached XSD schema) for every PDF it receives.
+
+    Args:
+        entries: (pdf_path, relative_output_name) tuples from collect_pdf_paths()
+        output_dir: Directory for XML output. If None, each XML is written next to its PDF.
+        workers: Number of worker processes (default: CPU count). 1 converts in-process.
+        converter_kwargs: Keyword arguments for each worker's KSeFXMLConverter
+        force_ai: If True, skip rule-based parsing
+        on_result: Optional callback invoked with each per-file result as it completes
+
+    Returns:
+        Summary dict (see summarize_batch) with an additional 'results' list
+    """
+    workers = workers or os.cpu_count() or 1
+    converter_kwargs = converter_kwargs or {}
+    suffix = xml_output_suffix(converter_kwargs.get('compression', 'none'))
+    tasks = []
+    for pdf_path, relative_name in entries:
+        if output_dir:
+            output_path = Path(output_dir) / relative_name.with_suffix(suffix)
+        else:
+            output_path = pdf_path.with_suffix(suffix)
+        tasks.append((str(pdf_path), str(output_path), force_ai))
+
+    logger.info(
+        "Starting batch conversion",
+        extra={'extra_fields': {
+            'count': len(tasks),
+            'workers': workers,
+            'output_dir': output_dir,
+            'event_type': 'batch_start'
+        }}
+    )
+
+    results = []
+    start = time.perf_counter()
+    if workers <= 1:
+        _init_batch_worker(converter_kwargs)
+        for task in tasks:
+            result = _convert_batch_item(*task)
+            results.append(result)
+            if on_result:
+                on_result(result)
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_batch_worker,
+            initargs=(converter_kwargs,)
+        ) as executor:
+            futures = [executor.submit(_convert_batch_item, *task) for task in tasks]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if on_result:
+                    on_result(result)
+
+    summary = summarize_batch(results, time.perf_counter() - start)
+    logger.info(
+        "Batch conversion completed",
+        extra={'extra_fields': {
+            **{k: v for k, v in summary.items() if k != 'failures'},
+            'event_type': 'batch_complete'
+        }}
+    )
+    summary['results'] = results
+    return summary
+
+
+# ============================================================================
+# Validate-only Bulk Mode
+# ============================================================================
+
+XML_FILE_SUFFIXES = ('.xml', '.xml.gz', '.xml.zst')
+ZIP_SUFFIXES = ('.zip',)
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz')
+VALIDATE_CHUNK_SIZE = 64
+# TAR members are read by the parent; bytes shipped to a worker per task
+VALIDATE_CHUNK_BYTES = 8 * 1024 * 1024
+# Distinct error messages tracked; further ones are only counted
+MAX_ERROR_GROUPS = 100_000
+
+_XML_POSITION_RE = re.compile(r', line \d+, column \d+$')
+
+# Worker-process state for validate_xml_files
+_validate_schema: Optional[etree.XMLSchema] = None
+_validate_parser: Optional[etree.XMLParser] = None
+
+
+def _source_kind(name: str) -> Optional[str]:
+    """Return 'xml', 'zip' or 'tar' for a file name, or None if it is neither."""
+    lowered = name.lower()
+    if lowered.endswith(TAR_SUFFIXES):
+        return 'tar'
+    if lowered.endswith(ZIP_SUFFIXES):
+        return 'zip'
+    if lowered.endswith(XML_FILE_SUFFIXES):
+        return 'xml'
+    return None
+
+
+def _iter_archive_sources(path: str) -> Iterator[Tuple]:
+    """Yield the XML members of a ZIP or TAR archive."""
+    if _source_kind(path) == 'zip':
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(XML_FILE_SUFFIXES):
+                    yield ('zip', path, info.filename)
+        return
+
+    # TAR archives (possibly compressed) are read sequentially, so members travel as bytes
+    with tarfile.open(path, 'r:*') as archive:
+        for member in archive:
+            if member.isfile() and member.name.lower().endswith(XML_FILE_SUFFIXES):
+                yield ('data', f"{path}!{member.name}", archive.extractfile(member).read())
+
+
+def iter_xml_sources(inputs: List[str]) -> Iterator[Tuple]:
+    """Expand CLI inputs into XML sources, lazily and in input order.
+
+    Args:
+        inputs: XML files (.xml, .xml.gz, .xml.zst), ZIP or TAR archives of XML files,
+                directories (searched recursively for both) or glob patterns
+
+    Yields:
+        ('file', path), ('zip', archive path, member name) or ('data', label, bytes)
+
+    Raises:
+        FileNotFoundError: If an input does not exist
+    """
+    for item in inputs:
+        if not glob.has_magic(item) and not os.path.exists(item):
+            raise FileNotFoundError(f"XML file not found: {item}")
+
+    def expand(path: str) -> Iterator[Tuple]:
+        kind = _source_kind(path)
+        if kind in ('zip', 'tar'):
+            yield from _iter_archive_sources(path)
+        elif kind == 'xml':
+            yield ('file', path)
+
+    for item in inputs:
+        if os.path.isdir(item):
+            for directory, subdirectories, files in os.walk(item):
+                subdirectories.sort()
+                for name in sorted(files):
+                    yield from expand(os.path.join(directory, name))
+        elif glob.has_magic(item):
+            for match in sorted(glob.iglob(item, recursive=True)):
+                if os.path.isfile(match):
+                    yield from expand(match)
+        elif _source_kind(item) in ('zip', 'tar'):
+            yield from _iter_archive_sources(item)
+        else:
+            # Explicitly named files are validated whatever their extension
+            yield ('file', item)
+
+
+def _chunk_sources(sources: Iterable[Tuple], chunk_size: int) -> Iterator[List[Tuple]]:
+    """Group sources into worker tasks of chunk_size files, or fewer for large in-memory members."""
+    chunk: List[Tuple] = []
+    chunk_bytes = 0
+    for source in sources:
+        chunk.append(source)
+        if source[0] == 'data':
+            chunk_bytes += len(source[2])
+        if len(chunk) >= chunk_size or chunk_bytes >= VALIDATE_CHUNK_BYTES:
+            yield chunk
+            chunk = []
+            chunk_bytes = 0
+    if chunk:
+        yield chunk
+
+
+def _init_validate_worker(schema_type: str, schema_path: str):
+    """Compile the schema used by every task in this worker process."""
+    global _validate_schema, _validate_parser
+    _validate_schema = schema_registry.get_schema(schema_type, Path(schema_path))
+    # Files to validate are untrusted input: no entity expansion or network access
+    _validate_parser = etree.XMLParser(resolve_entities=False, no_network=True)
+
+
+def _read_xml_source(source: Tuple, archives: Dict[str, zipfile.ZipFile]) -> bytes:
+    """Return the (decompressed) XML bytes of a source."""
+    kind, label = source[0], source[1]
+    if kind == 'file':
+        with open(label, 'rb') as f:
+            data = f.read()
+    elif kind == 'zip':
+        archive = archives.get(label)
+        if archive is None:
+            archive = archives[label] = zipfile.ZipFile(label)
+        label = source[2]
+        data = archive.read(label)
+    else:
+        data = source[2]
+
+    lowered = label.lower()
+    if lowered.endswith('.gz'):
+        return gzip.decompress(data)
+    if lowered.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError("zstd input requires the zstandard package (pip install zstandard)")
+        return zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data)).read()
+    return data
+
+
+def _validate_xml_source(source: Tuple, archives: Dict[str, zipfile.ZipFile]) -> Dict:
+    """Validate one source against the worker's schema and report the outcome instead of raising."""
+    path = f"{source[1]}!{source[2]}" if source[0] == 'zip' else source[1]
+    result = {'path': path, 'valid': False, 'errors': []}
+    try:
+        document = etree.fromstring(_read_xml_source(source, archives), _validate_parser)
+        if _validate_schema.validate(document):
+            result['valid'] = True
+        else:
+            result['errors'] = [{'line': error.line, 'message': error.message} for error in _validate_schema.error_log]
+    except etree.XMLSyntaxError as e:
+        message = _XML_POSITION_RE.sub('', e.msg or str(e))
+        result['errors'] = [{'line': e.lineno, 'message': f"XML syntax error: {message}"}]
+    except Exception as e:
+        result['errors'] = [{'line': None, 'message': f"{type(e).__name__}: {e}"}]
+    return result
+
+
+def _validate_xml_chunk(sources: List[Tuple]) -> List[Dict]:
+    """Validate a chunk of sources in a worker, opening each ZIP archive once."""
+    archives: Dict[str, zipfile.ZipFile] = {}
+    try:
+        return [_validate_xml_source(source, archives) for source in sources]
+    finally:
+        for archive in archives.values():
+            archive.close()
+
+
+class _ValidationTally:
+    """Running counts and error message groups of a validation run."""
+
+    def __init__(self):
+        self.total = 0
+        self.valid = 0
+        # message -> [count, first file with it]
+        self.groups: Dict[str, List] = {}
+        self.ungrouped_errors = 0
+
+    def add(self, result: Dict):
+        """Count one per-file result."""
+        self.total += 1
+        if result['valid']:
+            self.valid += 1
+            return
+        # Each message counts once per file, however often the file repeats it
+        for message in dict.fromkeys(error['message'] for error in result['errors']):
+            group = self.groups.get(message)
+            if group is not None:
+                group[0] += 1
+            elif len(self.groups) < MAX_ERROR_GROUPS:
+                self.groups[message] = [1, result['path']]
+            else:
+                self.ungrouped_errors += 1
+
+    def summary(self, wall_time_s: float) -> Dict:
+        """Build the summary report, error groups by descending file count."""
+        groups = sorted(self.groups.items(), key=lambda item: -item[1][0])
+        return {
+            'total': self.total,
+            'valid': self.valid,
+            'invalid': self.total - self.valid,
+            'wall_time_s': round(wall_time_s, 3),
+            'files_per_second': round(self.total / wall_time_s, 2) if wall_time_s > 0 else None,
+            'error_groups': [
+                {'message': message, 'files': count, 'example': example}
+                for message, (count, example) in groups
+            ],
+            'ungrouped_errors': self.ungrouped_errors
+        }
+
+
+def validate_xml_files(
+    inputs: List[str],
+    schema_type: str = 'FA2',
+    schema_path: Optional[Union[str, Path]] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = VALIDATE_CHUNK_SIZE,
+    on_result: Optional[Callable[[Dict], None]] = None
+) -> Dict:
+    """Validate existing XML files against one XSD schema across a process pool.
+
+    Inputs are expanded lazily and handed to workers in chunks, with a bounded
+    number of chunks in flight, so memory use does not grow with the number
+    of files. Each worker compiles the schema once. Per-file results are not
+    kept; pass on_result to stream them, e.g. to a JSONL file.
+
+    Args:
+        inputs: XML files, ZIP/TAR archives, directories or glob patterns (see iter_xml_sources)
+        schema_type: Schema type ('FA2' or 'FA3'); selects the bundled XSD if schema_path is None
+        schema_path: XSD to validate against, e.g. a new schema revision
+        workers: Number of worker processes (default: CPU count). 1 validates in-process.
+        chunk_size: Files per worker task
+        on_result: Optional callback invoked with each per-file result
+                   ({'path', 'valid', 'errors': [{'line', 'message'}]}) as it completes
+
+    Returns:
+        Summary dict with counts, throughput and error messages grouped with file counts
+
+    Raises:
+        FileNotFoundError: If an input or the XSD does not exist
+        etree.XMLSchemaParseError: If the XSD cannot be compiled
+    """
+    workers = workers or os.cpu_count() or 1
+    schema_path = Path(schema_path) if schema_path else default_schema_path(schema_type)
+    if not schema_path.exists():
+        raise FileNotFoundError(f"XSD schema file not found: {schema_path}")
+    # Fail fast on a broken schema instead of in every worker
+    schema_registry.get_schema(schema_type, schema_path)
+
+    logger.info(
+        "Starting bulk XML validation",
+        extra={'extra_fields': {
+            'schema_type': schema_type,
+            'schema_path': str(schema_path),
+            'workers': workers,
+            'event_type': 'bulk_validation_start'
+        }}
+    )
+
+    tally = _ValidationTally()
+
+    def handle(results: List[Dict]):
+        for result in results:
+            tally.add(result)
+            if on_result:
+                on_result(result)
+
+    start = time.perf_counter()
+    chunks = _chunk_sources(iter_xml_sources(inputs), chunk_size)
+    if workers <= 1:
+        _init_validate_worker(schema_type, str(schema_path))
+        for chunk in chunks:
+            handle(_validate_xml_chunk(chunk))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_validate_worker,
+            initargs=(schema_type, str(schema_path))
+        ) as executor:
+            pending = set()
+            for chunk in chunks:
+                pending.add(executor.submit(_validate_xml_chunk, chunk))
+                # Bound the chunks in flight so inputs are read only as fast as they are validated
+                if len(pending) >= workers * 4:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        handle(future.result())
+            for future in as_completed(pending):
+                handle(future.result())
+
+    summary = tally.summary(time.perf_counter() - start)
+    logger.info(
+        "Bulk XML validation completed",
+        extra={'extra_fields': {
+            **{k: v for k, v in summary.items() if k != 'error_groups'},
+            'error_group_count': len(summary['error_groups']),
+            'event_type': 'bulk_validation_complete'
+        }}
+    )
+    return summary
+
 
 # ============================================================================
 # CLI Interface
 # ============================================================================
 
+def converter_kwargs_from_args(args) -> Dict:
+    """Map parsed CLI arguments to KSeFXMLConverter keyword arguments."""
+    return {
+        'anthropic_api_key': args.api_key,
+        'schema_type': args.schema_type,
+        'use_ai_cache': not args.no_ai_cache,
+        'ai_cache_path': args.ai_cache,
+        'lazy_pdf_extraction': not args.full_extraction,
+        'pdf_backend': args.pdf_backend,
+        'use_embedded_data': args.use_embedded,
+        'output_format': args.output_format,
+        'compression': args.compress,
+        'prevalidate': not args.no_prevalidate,
+        'xsd_sample_rate': args.xsd_sample_rate
+    }
+
+
+def run_batch_cli(args) -> int:
+    """Run batch conversion for parsed CLI arguments and print a summary.
+
+    Returns:
+        Process exit code: 0 if every invoice converted, 1 otherwise
+    """
+    import sys
+
+    try:
+        entries = collect_pdf_paths(args.pdf_paths, args.manifest)
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    if not entries:
+        print("Error: no PDF files found in the given inputs", file=sys.stderr)
+        return 1
+
+    print(f"\n{'='*60}")
+    print(f"PDF to KSeF XML Converter - batch mode")
+    print(f"{'='*60}")
+    print(f"Files:   {len(entries)}")
+    print(f"Workers: {args.workers}")
+    print(f"Output:  {args.output_dir or 'next to each PDF'}")
+    print(f"{'='*60}\n")
+
+    def print_result(result: Dict):
+        if result['success']:
+            print(f"✓ {result['pdf_path']} ({result['duration_ms']:.0f} ms, {result['parsing_method']})")
+        else:
+            print(f"✗ {result['pdf_path']}: {result['error']}", file=sys.stderr)
+
+    summary = convert_batch(
+        entries,
+        output_dir=args.output_dir,
+        workers=args.workers,
+        converter_kwargs=converter_kwargs_from_args(args),
+        force_ai=args.force_ai,
+        on_result=print_result
+    )
+
+    latency = summary['latency_ms']
+    print(f"\n{'='*60}")
+    print(f"Converted:   {summary['succeeded']}/{summary['total']}")
+    print(f"Failed:      {summary['failed']}")
+    print(f"Embedded:    {summary['embedded']}")
+    print(f"AI fallback: {summary['ai_fallback']} ({summary['ai_fallback_failed']} failed)")
+    print(f"Latency:     p50 {latency['p50']} ms, p95 {latency['p95']} ms")
+    print(f"Wall time:   {summary['wall_time_s']} s ({summary['invoices_per_second']} invoices/s)")
+    if summary['stages_ms']:
+        print("Stages:      (ms per invoice)")
+        for stage, histogram in summary['stages_ms'].items():
+            print(f"  {stage:<16} mean {histogram['mean_ms']:>9}  p50 <= {histogram['p50_ms']:<7g} p95 <= {histogram['p95_ms']:g}")
+    print(f"{'='*60}\n")
+
+    if args.report:
+        report_path = Path(args.report)
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        print(f"Report saved to: {report_path}")
+
+    return 1 if summary['failed'] else 0
+
+
+def run_validate_cli(argv: List[str]) -> int:
+    """Run the 'validate' subcommand: bulk XSD validation of existing XML files.
+
+    Returns:
+        Process exit code: 0 if every file is valid, 1 if any is invalid, 2 on errors
+    """
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(
+        prog='invoice_pdf_to_ksef_xml.py validate',
+        description='Validate existing KSeF XML files against an XSD schema in parallel',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+Examples:
+  # Validate a directory tree and a ZIP archive, one JSON line per file
+  python invoice_pdf_to_ksef_xml.py validate output/ archive.zip -o results.jsonl
+
+  # Re-check against a new schema revision with 16 workers, writing a summary report
+  python invoice_pdf_to_ksef_xml.py validate "out/**/*.xml.gz" --schema new/schemat.xsd -w 16 --report summary.json
+
+Results:
+  Each JSONL line is {"path": ..., "valid": ..., "errors": [{"line": ..., "message": ...}]}.
+  Archive members are reported as archive.zip!member.xml. Identical error messages
+  are grouped in the summary with the number of files they occur in.
+        '''
+    )
+    parser.add_argument('inputs', nargs='+', metavar='input',
+                        help='XML files (.xml, .xml.gz, .xml.zst), ZIP/TAR archives, directories or glob patterns')
+    parser.add_argument('--schema-type', choices=['FA2', 'FA3'], default='FA2',
+                        help='KSeF schema type of the bundled XSD (default: FA2)')
+    parser.add_argument('--schema', type=str,
+                        help='XSD file to validate against instead of the bundled one')
+    parser.add_argument('-o', '--output', type=str, default='-',
+                        help='JSONL results file, - for standard output (default: -)')
+    parser.add_argument('--invalid-only', action='store_true',
+                        help='Write only invalid files to the JSONL results')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(),
+                        help='Number of worker processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=VALIDATE_CHUNK_SIZE,
+                        help=f'Files per worker task (default: {VALIDATE_CHUNK_SIZE})')
+    parser.add_argument('--top', type=int, default=10,
+                        help='Number of error groups to print (default: 10)')
+    parser.add_argument('--report', type=str,
+                        help='Write JSON summary report with all error groups to this path')
+    args = parser.parse_args(argv)
+    if args.chunk_size < 1:
+        parser.error('--chunk-size must be at least 1')
+
+    # With JSONL on standard output, the human-readable summary goes to stderr
+    to_stdout = args.output == '-'
+    out = sys.stderr if to_stdout else sys.stdout
+    results_file = sys.stdout if to_stdout else None
+    if not to_stdout:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        results_file = open(args.output, 'w', encoding='utf-8')
+
+    def write_result(result: Dict):
+        if result['valid'] and args.invalid_only:
+            return
+        results_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    try:
+        summary = validate_xml_files(
+            args.inputs,
+            schema_type=args.schema_type,
+            schema_path=args.schema,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            on_result=write_result
+        )
+    except (FileNotFoundError, etree.XMLSchemaParseError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    finally:
+        if not to_stdout:
+            results_file.close()
+
+    print(f"\n{'='*60}", file=out)
+    print(f"KSeF XML validation ({args.schema or args.schema_type})", file=out)
+    print(f"{'='*60}", file=out)
+    print(f"Files:     {summary['total']}", file=out)
+    print(f"Valid:     {summary['valid']}", file=out)
+    print(f"Invalid:   {summary['invalid']}", file=out)
+    print(f"Wall time: {summary['wall_time_s']} s ({summary['files_per_second']} files/s)", file=out)
+    groups = summary['error_groups']
+    if groups:
+        print(f"Errors:    {len(groups)} distinct messages, most frequent:", file=out)
+        for group in groups[:args.top]:
+            print(f"  {group['files']:>8}  {group['message']}", file=out)
+    print(f"{'='*60}\n", file=out)
+
+    if args.report:
+        report_path = Path(args.report)
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        print(f"Report saved to: {report_path}", file=out)
+
+    return 1 if summary['invalid'] else 0
+
+
 def main():
     """Command-line interface for PDF to KSeF XML conversion."""
     import argparse
     import sys
 
+    if sys.argv[1:2] == ['validate']:
+        sys.exit(run_validate_cli(sys.argv[2:]))
+
     parser = argparse.ArgumentParser(
         description='Convert PDF invoice to KSeF XML format',
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog='''
 Examples:
   # Convert PDF to XML (tries rule-based first, AI fallback)
-  python ksef_xml_converter.py invoice.pdf
+  python invoice_pdf_to_ksef_xml.py invoice.pdf
 
   # Convert with custom output path
-  python ksef_xml_converter.py invoice.pdf -o output/invoice.xml
+  python invoice_pdf_to_ksef_xml.py invoice.pdf -o output/invoice.xml
 
   # Force use of Claude AI (skip rule-based parsing)
-  python ksef_xml_converter.py invoice.pdf --force-ai
+  python invoice_pdf_to_ksef_xml.py invoice.pdf --force-ai
 
   # Use custom API key
-  python ksef_xml_converter.py invoice.pdf --api-key sk-ant-xxx
+  python invoice_pdf_to_ksef_xml.py invoice.pdf --api-key sk-ant-xxx
+
+  # Batch convert a directory with 8 worker processes
+  python invoice_pdf_to_ksef_xml.py invoices/ --output-dir output/ -w 8
+
+  # Write compact, gzip-compressed XML (invoice.xml.gz)
+  python invoice_pdf_to_ksef_xml.py invoice.pdf --output-format compact --compress gzip
+
+  # Batch convert, validating every 100th invoice against the full XSD
+  # (all invoices still get the fast facet pre-validation)
+  python invoice_pdf_to_ksef_xml.py invoices/ --output-dir output/ --xsd-sample-rate 0.01
+
+  # Batch convert a glob and a manifest, writing a JSON summary report
+  python invoice_pdf_to_ksef_xml.py "invoices/**/*.pdf" --manifest todo.txt --report report.json
 
 Parsing Methods:
   1. Rule-based (default): Fast regex parsing for standard Polish invoices
@@ -794,12 +2785,22 @@ Parsing Methods:
 
   The script automatically falls back to Claude AI if rule-based parsing fails.
   API key is only required when Claude AI is needed.
+
+Batch Mode:
+  Used when more than one input, a directory, a glob pattern or --manifest is given.
+  Exits with status 1 only if at least one invoice failed.
+
+Validate-only Mode:
+  python invoice_pdf_to_ksef_xml.py validate output/ archive.zip -o results.jsonl
+  Validates existing XML files in parallel; see "validate --help".
         '''
     )
     parser.add_argument(
-        'pdf_path',
+        'pdf_paths',
         type=str,
-        help='Path to the PDF invoice file'
+        nargs='*',
+        metavar='pdf_path',
+        help='PDF invoice file(s), directories or glob patterns'
     )
     parser.add_argument(
         '-o', '--output',
@@ -816,12 +2817,109 @@ Parsing Methods:
         action='store_true',
         help='Force use of Claude AI, skip rule-based parsing'
     )
+    parser.add_argument(
+        '--no-ai-cache',
+        action='store_true',
+        help='Always call Claude AI, ignoring and not updating the AI parse cache'
+    )
+    parser.add_argument(
+        '--ai-cache',
+        type=str,
+        default=DEFAULT_AI_CACHE_PATH,
+        help=f'Path to the AI parse cache database (default: {DEFAULT_AI_CACHE_PATH})'
+    )
+    parser.add_argument(
+        '--full-extraction',
+        action='store_true',
+        help='Extract every PDF page before parsing (disables first/last page early stop)'
+    )
+    parser.add_argument(
+        '--use-embedded',
+        action='store_true',
+        help='Use invoice data embedded by the PDF generator instead of parsing the PDF text '
+             '(not checked against the printed invoice; only for PDFs you generated)'
+    )
+    parser.add_argument(
+        '--pdf-backend',
+        type=str,
+        default=DEFAULT_BACKEND,
+        help=f'PDF text extraction backend: pdfplumber, pypdfium2, pymupdf or auto (default: {DEFAULT_BACKEND})'
+    )
+    parser.add_argument(
+        '--schema-type',
+        choices=['FA2', 'FA3'],
+        default='FA2',
+        help='KSeF schema type (default: FA2)'
+    )
+    parser.add_argument(
+        '--output-format',
+        choices=OUTPUT_FORMATS,
+        default='pretty',
+        help='XML layout: pretty (indented) or compact (no whitespace between elements) (default: pretty)'
+    )
+    parser.add_argument(
+        '--compress',
+        choices=list(COMPRESSION_SUFFIXES),
+        default='none',
+        help='Compress XML output; adds .gz or .zst to default output names (zstd requires zstandard) (default: none)'
+    )
+    parser.add_argument(
+        '--no-prevalidate',
+        action='store_true',
+        help='Skip the fast XSD facet check of parsed invoice data before building the XML'
+    )
+    parser.add_argument(
+        '--xsd-sample-rate',
+        type=float,
+        default=1.0,
+        help='Fraction of invoices validated against the full XSD schema, 0.0-1.0 (default: 1.0)'
+    )
+    parser.add_argument(
+        '--manifest',
+        action='append',
+        default=[],
+        help='Batch mode: text file listing one PDF path per line (can be repeated)'
+    )
+    parser.add_argument(
+        '--output-dir',
+        type=str,
+        help='Batch mode: directory for XML output (default: next to each PDF)'
+    )
+    parser.add_argument(
+        '-w', '--workers',
+        type=int,
+        default=os.cpu_count(),
+        help='Batch mode: number of worker processes (default: CPU count)'
+    )
+    parser.add_argument(
+        '--report',
+        type=str,
+        help='Batch mode: write JSON summary report to this path'
+    )
 
     args = parser.parse_args()
 
+    if not args.pdf_paths and not args.manifest:
+        parser.error('at least one pdf_path or --manifest is required')
+    try:
+        check_output_mode(args.output_format, args.compress)
+    except ImportError as e:
+        parser.error(str(e))
+    if not 0.0 <= args.xsd_sample_rate <= 1.0:
+        parser.error('--xsd-sample-rate must be between 0.0 and 1.0')
+
+    batch_mode = (
+        bool(args.manifest)
+        or len(args.pdf_paths) > 1
+        or any(Path(p).is_dir() or glob.has_magic(p) for p in args.pdf_paths)
+    )
+    if batch_mode:
+        if args.output:
+            parser.error('-o/--output cannot be used in batch mode, use --output-dir')
+        sys.exit(run_batch_cli(args))
+
     # Validate input file
-    from pathlib import Path
-    pdf_path = Path(args.pdf_path)
+    pdf_path = Path(args.pdf_paths[0])
     if not pdf_path.exists():
         print(f"Error: PDF file not found: {pdf_path}", file=sys.stderr)
         sys.exit(1)
@@ -830,14 +2928,14 @@ Parsing Methods:
     if args.output:
         output_path = Path(args.output)
     else:
-        output_path = pdf_path.with_suffix('.xml')
+        output_path = pdf_path.with_suffix(xml_output_suffix(args.compress))
 
     # Create output directory if needed
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
     # Initialize converter
     try:
-        converter = KSeFXMLConverter(anthropic_api_key=args.api_key)
+        converter = KSeFXMLConverter(**converter_kwargs_from_args(args))
     except Exception as e:
         print(f"Error initializing converter: {e}", file=sys.stderr)
         sys.exit(1)
@@ -865,10 +2963,13 @@ Parsing Methods:
     except FileNotFoundError as e:
         print(f"\nError: {e}", file=sys.stderr)
         sys.exit(1)
-    except ValueError as e:
+    except AIConfigurationError as e:
         print(f"\nError: {e}", file=sys.stderr)
         print("\nHint: Set ANTHROPIC_API_KEY environment variable or use --api-key option.")
         sys.exit(1)
+    except ValueError as e:
+        print(f"\nError: {e}", file=sys.stderr)
+        sys.exit(1)
     except Exception as e:
         print(f"\nError converting PDF: {e}", file=sys.stderr)
         sys.exit(1)
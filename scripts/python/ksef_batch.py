@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+KSeF Batch Package Builder
+
+Streams KSeF XML invoices into a ZIP archive and splits it into parts for a
+KSeF batch session, doing what FilesUtil.createZip / FilesUtil.splitZip do
+in memory for InvoiceService.openBatchSessionAndSendInvoicesParts.
+
+The archive is never held in memory: ZIP bytes go straight into part files,
+and SHA-256 hashes and sizes of the whole archive and of every part are
+computed in the same pass. A JSON manifest describes the package.
+
+This is a Python-only tool: nothing in this repository reads the manifest.
+The Java InvoiceService still builds its own ZIP from InvoiceData and
+always opens FA (2) sessions. Use the parts and manifest with an uploader
+of your own, or to check a package's sizes and hashes.
+
+Usage:
+    python ksef_batch.py output/xml/ -o batch/
+    python ksef_batch.py "output/**/*.xml" -o batch/ --max-part-size 50M --name load-test
+"""
+
+import argparse
+import base64
+import glob
+import hashlib
+import json
+import os
+import re
+import shutil
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple, Union
+
+from logging_config import setup_logging, get_logger, set_correlation_id
+
+# Initialize logger
+logger = get_logger(__name__)
+
+# KSeF accepts parts of up to 100 MB; AES-256-CBC padding adds up to 16 bytes per part
+AES_BLOCK_SIZE = 16
+DEFAULT_MAX_PART_SIZE = 100 * 1000 * 1000 - AES_BLOCK_SIZE
+MAX_PARTS = 50
+MANIFEST_VERSION = 1
+
+# Form code per schema type, as in OpenBatchSessionRequestBuilder.withFormCode
+FORM_CODES = {
+    'FA2': {'system_code': 'FA (2)', 'schema_version': '1-0E', 'value': 'FA'},
+    'FA3': {'system_code': 'FA (3)', 'schema_version': '1-0E', 'value': 'FA'},
+}
+
+InvoiceSource = Union[str, Path, Tuple[str, bytes]]
+
+
+def _b64(digest: bytes) -> str:
+    """Base64-encode a hash digest the way the KSeF API expects it."""
+    return base64.b64encode(digest).decode('ascii')
+
+
+def parse_size(value: str) -> int:
+    """Parse a byte size such as '100000000', '512K', '50M' or '1G' (binary units)."""
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    value = value.strip().upper().rstrip('B')
+    try:
+        if value and value[-1] in units:
+            return int(float(value[:-1]) * units[value[-1]])
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: {value!r}")
+
+
+class SplitHashingWriter:
+    """Write-only stream that splits its output into part files and hashes it.
+
+    Passed to zipfile.ZipFile as the target file object. It is not seekable,
+    so ZipFile writes data descriptors instead of rewriting local headers,
+    and the archive is produced strictly sequentially.
+    """
+
+    def __init__(self, output_dir: Path, base_name: str, max_part_size: int):
+        """Initialize the writer.
+
+        Args:
+            output_dir: Directory for the part files
+            base_name: Archive name; parts are named <base_name>.001, .002, ...
+            max_part_size: Maximum size of a part in bytes
+        """
+        if max_part_size <= 0:
+            raise ValueError("max_part_size must be positive")
+        self.output_dir = output_dir
+        self.base_name = base_name
+        self.max_part_size = max_part_size
+
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self.parts: List[Dict] = []
+        self._part_file: Optional[BinaryIO] = None
+        self._part_hash = None
+        self._part_size = 0
+
+    def _open_part(self):
+        """Start the next part file."""
+        ordinal = len(self.parts) + 1
+        file_name = f"{self.base_name}.{ordinal:03d}"
+        self._part_file = open(self.output_dir / file_name, 'wb')
+        self._part_hash = hashlib.sha256()
+        self._part_size = 0
+        self.parts.append({'ordinal_number': ordinal, 'file_name': file_name})
+
+    def _close_part(self):
+        """Finish the current part file and record its size and hash."""
+        if self._part_file is None:
+            return
+        self._part_file.close()
+        self.parts[-1]['file_size'] = self._part_size
+        self.parts[-1]['sha256_base64'] = _b64(self._part_hash.digest())
+        self._part_file = None
+
+    def write(self, data: bytes) -> int:
+        """Append data to the archive, rolling over to a new part when full."""
+        view = memoryview(data)
+        self._hash.update(view)
+        self.size += len(view)
+
+        while view:
+            if self._part_file is None or self._part_size >= self.max_part_size:
+                self._close_part()
+                self._open_part()
+            chunk = view[:self.max_part_size - self._part_size]
+            self._part_file.write(chunk)
+            self._part_hash.update(chunk)
+            self._part_size += len(chunk)
+            view = view[len(chunk):]
+        return len(data)
+
+    def tell(self) -> int:
+        """Return the number of bytes written so far."""
+        return self.size
+
+    def flush(self):
+        """Flush the current part file."""
+        if self._part_file is not None:
+            self._part_file.flush()
+
+    def close(self):
+        """Finish the last part."""
+        self._close_part()
+
+    @property
+    def sha256_base64(self) -> str:
+        """Base64 SHA-256 of the whole archive written so far."""
+        return _b64(self._hash.digest())
+
+
+def collect_xml_paths(inputs: Iterable[str]) -> List[Path]:
+    """Expand files, directories (searched recursively) and glob patterns into XML paths.
+
+    Raises:
+        FileNotFoundError: If an input does not exist
+    """
+    paths: List[Path] = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            paths.extend(sorted(path.rglob('*.xml')))
+        elif glob.has_magic(item):
+            paths.extend(Path(match) for match in sorted(glob.glob(item, recursive=True))
+                         if match.lower().endswith('.xml') and os.path.isfile(match))
+        elif path.exists():
+            paths.append(path)
+        else:
+            raise FileNotFoundError(f"XML file not found: {path}")
+    return paths
+
+
+def _remove_stale_package(output_dir: Path, zip_name: str, manifest_path: Path):
+    """Delete the manifest and <zip_name>.NNN parts of an earlier package.
+
+    A smaller package would otherwise leave the old trailing parts next to
+    the new ones.
+    """
+    part_re = re.compile(re.escape(zip_name) + r'\.\d{3,}')
+    stale = [path for path in output_dir.glob(glob.escape(zip_name) + '.*') if part_re.fullmatch(path.name)]
+    if manifest_path.exists():
+        stale.append(manifest_path)
+    for path in stale:
+        path.unlink()
+    if stale:
+        logger.info(
+            f"Removed {len(stale)} files of an earlier batch package",
+            extra={'extra_fields': {
+                'removed_files': [path.name for path in stale],
+                'event_type': 'batch_package_stale_removed'
+            }}
+        )
+
+
+def build_batch_package(
+    invoices: Iterable[InvoiceSource],
+    output_dir: Union[str, Path],
+    name: str = 'batch',
+    max_part_size: int = DEFAULT_MAX_PART_SIZE,
+    schema_type: str = 'FA2',
+    compresslevel: Optional[int] = None
+) -> Dict:
+    """Stream XML invoices into a split ZIP package and write its manifest.
+
+    Part files and the manifest left in output_dir by an earlier package of
+    the same name are deleted first, so the directory never mixes packages.
+
+    Args:
+        invoices: XML file paths, or (archive_name, xml_bytes) tuples for
+                  invoices produced in memory (e.g. by convert_to_ksef_xml)
+        output_dir: Directory for part files and the manifest
+        name: Package name; parts are <name>.zip.001, ... and the manifest <name>.manifest.json
+        max_part_size: Maximum part size in bytes (before encryption)
+        schema_type: 'FA2' or 'FA3', recorded as the batch form code
+        compresslevel: Deflate level 0-9 (default: zlib default)
+
+    Returns:
+        The manifest dictionary
+
+    Raises:
+        ValueError: If two invoices share an archive name or the schema type is unknown
+    """
+    if schema_type not in FORM_CODES:
+        raise ValueError(f"Unknown schema type: {schema_type}")
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    zip_name = f"{name}.zip"
+    manifest_path = output_dir / f"{name}.manifest.json"
+    _remove_stale_package(output_dir, zip_name, manifest_path)
+
+    logger.info(
+        "Building KSeF batch package",
+        extra={'extra_fields': {
+            'output_dir': str(output_dir),
+            'package_name': name,
+            'max_part_size': max_part_size,
+            'event_type': 'batch_package_start'
+        }}
+    )
+
+    entries: List[Dict] = []
+    seen = set()
+    writer = SplitHashingWriter(output_dir, zip_name, max_part_size)
+    try:
+        with zipfile.ZipFile(writer, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=compresslevel) as archive:
+            for invoice in invoices:
+                if isinstance(invoice, tuple):
+                    arcname, content = invoice
+                else:
+                    arcname, content = Path(invoice).name, None
+                if arcname in seen:
+                    raise ValueError(f"Duplicate invoice file name in package: {arcname}")
+                seen.add(arcname)
+
+                digest = hashlib.sha256()
+                size = 0
+                with archive.open(arcname, 'w') as target:
+                    if content is not None:
+                        target.write(content)
+                        digest.update(content)
+                        size = len(content)
+                    else:
+                        with open(invoice, 'rb') as source:
+                            while True:
+                                chunk = source.read(1024 * 1024)
+                                if not chunk:
+                                    break
+                                target.write(chunk)
+                                digest.update(chunk)
+                                size += len(chunk)
+                entries.append({'file_name': arcname, 'file_size': size, 'sha256_base64': _b64(digest.digest())})
+    finally:
+        writer.close()
+
+    if len(writer.parts) > MAX_PARTS:
+        logger.warning(
+            f"Batch package has {len(writer.parts)} parts, KSeF accepts at most {MAX_PARTS}",
+            extra={'extra_fields': {'parts': len(writer.parts), 'event_type': 'batch_package_too_many_parts'}}
+        )
+
+    manifest = {
+        'manifest_version': MANIFEST_VERSION,
+        'form_code': FORM_CODES[schema_type],
+        'invoice_count': len(entries),
+        'batch_file': {
+            'file_name': zip_name,
+            'file_size': writer.size,
+            'sha256_base64': writer.sha256_base64
+        },
+        'parts': writer.parts,
+        'invoices': entries
+    }
+
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    logger.info(
+        "KSeF batch package built",
+        extra={'extra_fields': {
+            'manifest_path': str(manifest_path),
+            'invoice_count': len(entries),
+            'zip_size': writer.size,
+            'parts': len(writer.parts),
+            'event_type': 'batch_package_complete'
+        }}
+    )
+    return manifest
+
+
+def join_parts(manifest_path: Union[str, Path], output_path: Union[str, Path]):
+    """Concatenate the parts listed in a manifest back into the ZIP archive."""
+    manifest_path = Path(manifest_path)
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    with open(output_path, 'wb') as target:
+        for part in manifest['parts']:
+            with open(manifest_path.parent / part['file_name'], 'rb') as source:
+                shutil.copyfileobj(source, target)
+
+
+def main():
+    """Command-line entry point."""
+    # Initialize logging
+    setup_logging(log_level="INFO", log_file="logs/ksef_batch.log", log_format="json")
+
+    parser = argparse.ArgumentParser(
+        description='Package KSeF XML invoices into a split ZIP for a KSeF batch session'
+    )
+    parser.add_argument(
+        'inputs',
+        nargs='+',
+        metavar='xml_path',
+        help='XML files, directories (searched recursively) or glob patterns'
+    )
+    parser.add_argument(
+        '-o', '--output-dir',
+        type=str,
+        required=True,
+        help='Directory for the ZIP parts and the manifest'
+    )
+    parser.add_argument(
+        '--name',
+        type=str,
+        default='batch',
+        help='Package name (default: batch)'
+    )
+    parser.add_argument(
+        '--max-part-size',
+        type=parse_size,
+        default=DEFAULT_MAX_PART_SIZE,
+        help=f'Maximum part size in bytes, K/M/G suffixes allowed (default: {DEFAULT_MAX_PART_SIZE})'
+    )
+    parser.add_argument(
+        '--schema-type',
+        choices=sorted(FORM_CODES),
+        default='FA2',
+        help='KSeF schema type of the invoices (default: FA2)'
+    )
+    parser.add_argument(
+        '--compresslevel',
+        type=int,
+        choices=range(10),
+        metavar='0-9',
+        help='Deflate compression level (default: zlib default)'
+    )
+
+    args = parser.parse_args()
+
+    # Set correlation ID for this package
+    set_correlation_id()
+
+    xml_paths = collect_xml_paths(args.inputs)
+    if not xml_paths:
+        parser.error("no XML files found")
+
+    manifest = build_batch_package(
+        xml_paths,
+        args.output_dir,
+        name=args.name,
+        max_part_size=args.max_part_size,
+        schema_type=args.schema_type,
+        compresslevel=args.compresslevel
+    )
+
+    print(f"\n{'='*60}")
+    print(f"Invoices:   {manifest['invoice_count']}")
+    print(f"ZIP size:   {manifest['batch_file']['file_size']} bytes")
+    print(f"ZIP SHA256: {manifest['batch_file']['sha256_base64']}")
+    print(f"Parts:      {len(manifest['parts'])}")
+    for part in manifest['parts']:
+        print(f"  {part['file_name']}  {part['file_size']} bytes  {part['sha256_base64']}")
+    print(f"Manifest:   {Path(args.output_dir) / (args.name + '.manifest.json')}")
+    print(f"{'='*60}\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,29 +2,112 @@
 Logging Configuration for KSeF Invoice Processing
 
 Provides structured logging with JSON format, log rotation, and correlation IDs.
+Optionally hands records to a background thread (QueueHandler/QueueListener)
+so logging callers never wait on console or file I/O. Also provides per-stage
+timing (timed_stage) with in-process latency histograms.
 """
 
+import abc
+import atexit
+import bisect
+import copy
 import logging
 import logging.handlers
 import json
+import math
+import multiprocessing.util
+import os
+import queue
 import sys
+import threading
+import time
 import uuid
-from datetime import datetime
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterable, Iterator, List, Optional
 import contextvars
 
+try:
+    import orjson
+except ImportError:  # optional dependency, JSONFormatter falls back to json
+    orjson = None
+
 # Context variable for correlation ID (thread-safe)
 correlation_id_var = contextvars.ContextVar('correlation_id', default=None)
 
+# Reused by JSONFormatter; json.dumps(default=...) would build a new encoder per call.
+# Compact and unescaped UTF-8, so lines look the same as with orjson.
+_json_encoder = json.JSONEncoder(default=str, separators=(',', ':'), ensure_ascii=False)
+
+# What BoundedQueueHandler does when the log queue is full
+QUEUE_FULL_DROP = "drop"
+QUEUE_FULL_BLOCK = "block"
+DEFAULT_QUEUE_SIZE = 10_000
+
+# Suggested sample rates for high-volume batch runs: keep 1% of routine successes
+BATCH_SAMPLE_RATES = {
+    'validation_start': 0.01,
+    'validation_success': 0.01,
+    'parsing_success': 0.01,
+    'file_operation': 0.01,
+}
+
+# Record attribute holding the sampling decision, shared by every handler
+_SAMPLING_DECISION_ATTR = '_ksef_sampling_decision'
+
+# Sampling/rate limiting filters installed by setup_logging
+_sampling_filters: List["_CountingFilter"] = []
+
+# Active background listener, if setup_logging(async_logging=True) was used
+_queue_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["BoundedQueueHandler"] = None
+
 
 class JSONFormatter(logging.Formatter):
-    """Custom JSON formatter for structured logging."""
+    """Custom JSON formatter for structured logging.
+
+    Serializes with orjson when it is installed and with the standard json
+    module otherwise; both write compact, unescaped UTF-8, so log lines do
+    not depend on which one is used. The timestamp is the record's creation
+    time, so queued records keep the time they were logged at.
+    """
+
+    def __init__(self, use_orjson: Optional[bool] = None):
+        """
+        Initialize the formatter.
+
+        Args:
+            use_orjson: Force (True) or disable (False) the orjson backend.
+                        Default: use orjson if it is installed.
+
+        Raises:
+            ValueError: If use_orjson is True but orjson is not installed
+        """
+        super().__init__()
+        if use_orjson and orjson is None:
+            raise ValueError("orjson is not installed: pip install orjson")
+        self.use_orjson = orjson is not None if use_orjson is None else use_orjson
+        # (epoch second, formatted second) of the last record
+        self._second_cache = (None, '')
+
+    def format_timestamp(self, created: float) -> str:
+        """Format an epoch time as ISO 8601 UTC with microseconds."""
+        # Same rounding as datetime.fromtimestamp
+        fraction, second = math.modf(created)
+        second, microsecond = int(second), round(fraction * 1_000_000)
+        if microsecond >= 1_000_000:
+            second, microsecond = second + 1, microsecond - 1_000_000
+        cached_second, prefix = self._second_cache
+        if second != cached_second:
+            # Records mostly arrive within the same second, so strftime runs rarely
+            prefix = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(second))
+            self._second_cache = (second, prefix)
+        return f"{prefix}.{microsecond:06d}Z"
 
     def format(self, record: logging.LogRecord) -> str:
         """Format log record as JSON."""
         log_data = {
-            'timestamp': datetime.utcnow().isoformat() + 'Z',
+            'timestamp': self.format_timestamp(record.created),
             'level': record.levelname,
             'logger': record.name,
             'message': record.getMessage(),
@@ -33,20 +116,29 @@ class JSONFormatter(logging.Formatter):
             'line': record.lineno,
         }
 
-        # Add correlation ID if available
-        correlation_id = correlation_id_var.get()
+        # Record attributes set via extra=... or by filters; dict lookups avoid
+        # the AttributeError that getattr/hasattr raise internally when absent
+        attributes = record.__dict__
+
+        # Add correlation ID if available (records from the log queue carry their own)
+        correlation_id = attributes.get('correlation_id') or correlation_id_var.get()
         if correlation_id:
             log_data['correlation_id'] = correlation_id
 
         # Add exception info if present
         if record.exc_info:
             log_data['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            log_data['exception'] = record.exc_text
 
         # Add extra fields
-        if hasattr(record, 'extra_fields'):
-            log_data.update(record.extra_fields)
+        extra_fields = attributes.get('extra_fields')
+        if extra_fields:
+            log_data.update(extra_fields)
 
-        return json.dumps(log_data)
+        if self.use_orjson:
+            return orjson.dumps(log_data, default=str, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        return _json_encoder.encode(log_data)
 
 
 class CorrelationIDFilter(logging.Filter):
@@ -60,12 +152,318 @@ class CorrelationIDFilter(logging.Filter):
         return True
 
 
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler for a bounded queue that drops or blocks when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue, policy: str = QUEUE_FULL_DROP):
+        """
+        Initialize the handler.
+
+        Args:
+            log_queue: Bounded queue shared with the QueueListener
+            policy: 'drop' to discard records while the queue is full,
+                    'block' to wait for the listener to catch up
+        """
+        if policy not in (QUEUE_FULL_DROP, QUEUE_FULL_BLOCK):
+            raise ValueError(f"Unknown queue full policy: {policy}")
+        super().__init__(log_queue)
+        self.policy = policy
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Make the record safe to format later on the listener thread.
+
+        Interpolates the message, renders the traceback and captures the
+        correlation ID now, because the listener thread cannot see the
+        caller's context variables or exception frames.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if getattr(record, 'correlation_id', None) is None:
+            record.correlation_id = correlation_id_var.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        """Put the record on the queue according to the full-queue policy."""
+        if self.policy == QUEUE_FULL_BLOCK:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+
+class _CountingFilter(logging.Filter, abc.ABC):
+    """Base for filters that drop records and count what they dropped.
+
+    Records at or above keep_level (WARNING by default) always pass, so
+    failures are never sampled out. The decision is stored on the record,
+    so a filter attached to several handlers decides and counts once.
+    """
+
+    def __init__(self, keep_level: int = logging.WARNING):
+        super().__init__()
+        self.keep_level = keep_level
+        self.passed: Dict[str, int] = {}
+        self.dropped: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @abc.abstractmethod
+    def _decide(self, record: logging.LogRecord) -> bool:
+        """Return True to keep the record; called once per record."""
+
+    @abc.abstractmethod
+    def _count_key(self, record: logging.LogRecord) -> str:
+        """Return the key the record is counted under."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        decisions = record.__dict__.setdefault(_SAMPLING_DECISION_ATTR, {})
+        keep = decisions.get(id(self))
+        if keep is None:
+            if record.levelno >= self.keep_level:
+                keep = True
+            else:
+                with self._lock:
+                    keep = self._decide(record)
+                    counters = self.passed if keep else self.dropped
+                    key = self._count_key(record)
+                    counters[key] = counters.get(key, 0) + 1
+            decisions[id(self)] = keep
+        return keep
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return passed and dropped record counts per key."""
+        with self._lock:
+            return {'passed': dict(self.passed), 'dropped': dict(self.dropped)}
+
+    def reset(self):
+        """Zero the counters."""
+        with self._lock:
+            self.passed.clear()
+            self.dropped.clear()
+
+    def _reinit_after_fork(self):
+        """Start a forked child with a fresh lock and zeroed counters."""
+        self._lock = threading.Lock()
+        self.passed.clear()
+        self.dropped.clear()
+
+
+class SamplingFilter(_CountingFilter):
+    """Keep a fixed fraction of records per event_type.
+
+    Sampling is deterministic: with rate 0.01 the 1st, 101st, 201st, ... record
+    of an event type is kept. Kept records get a 'sample_rate' field, so counts
+    can be scaled back up (count / sample_rate) in log analysis.
+    """
+
+    def __init__(self, rates: Dict[str, float], default_rate: float = 1.0, keep_level: int = logging.WARNING):
+        """
+        Initialize the filter.
+
+        Args:
+            rates: Fraction of records to keep per event_type, 0.0 to 1.0
+            default_rate: Fraction for event types not listed (and records without one)
+            keep_level: Records at or above this level are always kept
+
+        Raises:
+            ValueError: If a rate is outside 0.0-1.0
+        """
+        super().__init__(keep_level)
+        for event_type, rate in list(rates.items()) + [('default', default_rate)]:
+            if not 0.0 <= rate <= 1.0:
+                raise ValueError(f"Sample rate for {event_type} must be between 0 and 1, got {rate}")
+        self.rates = dict(rates)
+        self.default_rate = default_rate
+
+    def _count_key(self, record: logging.LogRecord) -> str:
+        extra_fields = record.__dict__.get('extra_fields') or {}
+        return extra_fields.get('event_type') or 'none'
+
+    def _decide(self, record: logging.LogRecord) -> bool:
+        event_type = self._count_key(record)
+        rate = self.rates.get(event_type, self.default_rate)
+        if rate >= 1.0:
+            return True
+        seen = self.passed.get(event_type, 0) + self.dropped.get(event_type, 0)
+        # Keep the record whenever the expected kept count reaches a new integer;
+        # rounding up keeps the first record of every event type
+        if math.ceil((seen + 1) * rate) <= math.ceil(seen * rate):
+            return False
+        record.extra_fields = {**record.__dict__.get('extra_fields', {}), 'sample_rate': rate}
+        return True
+
+
+class RateLimitFilter(_CountingFilter):
+    """Token bucket per logger name: at most `rate` records/second, bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None, keep_level: int = logging.WARNING):
+        """
+        Initialize the filter.
+
+        Args:
+            rate: Records per second allowed per logger
+            burst: Bucket size (default: one second's worth, at least 1)
+            keep_level: Records at or above this level are never rate limited
+
+        Raises:
+            ValueError: If rate or burst is not positive
+        """
+        super().__init__(keep_level)
+        burst = max(rate, 1.0) if burst is None else burst
+        if rate <= 0 or burst <= 0:
+            raise ValueError("Rate limit and burst must be positive")
+        self.rate = rate
+        self.burst = burst
+        # logger name -> (tokens, monotonic time of last refill)
+        self._buckets: Dict[str, tuple] = {}
+
+    def _count_key(self, record: logging.LogRecord) -> str:
+        return record.name
+
+    def _reinit_after_fork(self):
+        super()._reinit_after_fork()
+        self._buckets.clear()
+
+    def _decide(self, record: logging.LogRecord) -> bool:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(record.name, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        keep = tokens >= 1.0
+        self._buckets[record.name] = (tokens - 1.0 if keep else tokens, now)
+        return keep
+
+
+def sampling_stats() -> Dict[str, Dict[str, Dict[str, int]]]:
+    """Return counters of the installed SamplingFilter/RateLimitFilter, keyed by class name."""
+    return {type(f).__name__: f.stats() for f in _sampling_filters}
+
+
+def log_sampling_summary():
+    """Log how many records the sampling and rate limiting filters dropped.
+
+    Written straight to the handlers, past the filters, so it is never
+    sampled out itself. Done automatically by shutdown_logging() and at exit.
+    """
+    stats = sampling_stats()
+    dropped = {name: counts['dropped'] for name, counts in stats.items() if counts['dropped']}
+    if not dropped:
+        return
+    record = logging.makeLogRecord({
+        'name': __name__,
+        'levelno': logging.INFO,
+        'levelname': 'INFO',
+        'msg': f"Log records dropped by sampling: {sum(sum(c.values()) for c in dropped.values())}",
+        'module': 'logging_config',
+        'funcName': 'log_sampling_summary',
+        'correlation_id': correlation_id_var.get(),
+        'extra_fields': {'sampling': stats, 'event_type': 'log_sampling_summary'}
+    })
+    handlers = _queue_listener.handlers if _queue_listener is not None else logging.getLogger().handlers
+    for target in handlers:
+        if isinstance(target, logging.handlers.QueueHandler):
+            continue
+        if record.levelno >= target.level:
+            target.acquire()
+            try:
+                target.emit(record)
+            finally:
+                target.release()
+    for f in _sampling_filters:
+        f.reset()
+
+
+def _stop_queue_listener():
+    """Flush queued records and stop the background listener, reporting drops."""
+    global _queue_listener, _queue_handler
+    listener, handler = _queue_listener, _queue_handler
+    _queue_listener = _queue_handler = None
+    if listener is None:
+        return
+
+    root = logging.getLogger()
+    root.removeHandler(handler)
+    # stop() enqueues a sentinel and waits until every earlier record is handled
+    listener.stop()
+    # Anything logged from now on is written synchronously
+    for target in listener.handlers:
+        root.addHandler(target)
+
+    if handler.dropped:
+        record = logging.makeLogRecord({
+            'name': __name__,
+            'levelno': logging.WARNING,
+            'levelname': 'WARNING',
+            'msg': f"Log queue was full, dropped {handler.dropped} records",
+            'module': 'logging_config',
+            'funcName': 'shutdown_logging',
+            'extra_fields': {'dropped_records': handler.dropped, 'event_type': 'log_records_dropped'}
+        })
+        for target in listener.handlers:
+            target.handle(record)
+    for target in listener.handlers:
+        target.flush()
+
+
+def _acquire_listener_handlers_before_fork():
+    """Keep the listener thread from being mid-write when the process forks.
+
+    A child forked during a write would inherit a locked file buffer. The
+    handler locks are re-created in the child by the logging module itself.
+    """
+    if _queue_listener is not None:
+        for target in _queue_listener.handlers:
+            target.acquire()
+
+
+def _release_listener_handlers_after_fork():
+    """Release the handler locks taken before fork, in the parent."""
+    if _queue_listener is not None:
+        for target in _queue_listener.handlers:
+            target.release()
+
+
+def _restart_queue_listener_in_child():
+    """Give a forked child its own queue and listener thread.
+
+    Threads do not survive fork, so without this a child process (e.g. a
+    ProcessPoolExecutor worker) would fill the inherited queue forever.
+    """
+    global _queue_listener
+    # Counts inherited from the parent are reported by the parent
+    for f in _sampling_filters:
+        f._reinit_after_fork()
+    if _queue_listener is None:
+        return
+    _queue_handler.queue = queue.Queue(maxsize=_queue_handler.queue.maxsize)
+    _queue_handler.dropped = 0
+    _queue_handler._dropped_lock = threading.Lock()
+    _queue_listener = logging.handlers.QueueListener(
+        _queue_handler.queue, *_queue_listener.handlers, respect_handler_level=True
+    )
+    _queue_listener.start()
+
+
 def setup_logging(
     log_level: str = "INFO",
     log_file: Optional[str] = None,
     log_format: str = "json",
     max_bytes: int = 10 * 1024 * 1024,  # 10 MB
-    backup_count: int = 5
+    backup_count: int = 5,
+    async_logging: bool = False,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    queue_full_policy: str = QUEUE_FULL_DROP,
+    sample_rates: Optional[Dict[str, float]] = None,
+    rate_limit: Optional[float] = None,
+    rate_limit_burst: Optional[float] = None
 ) -> logging.Logger:
     """
     Configure logging for the application.
@@ -76,10 +474,25 @@ def setup_logging(
         log_format: Format for logs ('json' or 'text')
         max_bytes: Maximum size of log file before rotation
         backup_count: Number of backup files to keep
+        async_logging: If True, format and write records on a background thread.
+                       Callers only put records on a bounded queue.
+        queue_size: Maximum number of records waiting in the queue (async mode)
+        queue_full_policy: 'drop' (count and discard) or 'block' (wait) when the
+                           queue is full (async mode)
+        sample_rates: Fraction of records to keep per event_type (e.g.
+                      BATCH_SAMPLE_RATES). WARNING and above are always kept.
+        rate_limit: Maximum records per second per logger below WARNING
+        rate_limit_burst: Token bucket size for rate_limit (default: one second's worth)
 
     Returns:
         Configured logger instance
     """
+    global _queue_listener, _queue_handler
+
+    # Flush and stop a listener left by an earlier call, report its sampling
+    _stop_queue_listener()
+    log_sampling_summary()
+
     # Create logs directory if it doesn't exist
     if log_file:
         log_path = Path(log_file)
@@ -121,9 +534,84 @@ def setup_logging(
         file_handler.addFilter(CorrelationIDFilter())
         logger.addHandler(file_handler)
 
+    # Sampling and rate limiting; each record is decided once, whichever handler sees it first
+    _sampling_filters.clear()
+    if sample_rates:
+        _sampling_filters.append(SamplingFilter(sample_rates))
+    if rate_limit:
+        _sampling_filters.append(RateLimitFilter(rate_limit, rate_limit_burst))
+    for target in logger.handlers:
+        for sampling_filter in _sampling_filters:
+            target.addFilter(sampling_filter)
+
+    if async_logging:
+        handlers = list(logger.handlers)
+        logger.handlers.clear()
+        _queue_handler = BoundedQueueHandler(queue.Queue(maxsize=queue_size), queue_full_policy)
+        # Filter before enqueueing so sampled-out records cost no queue space
+        for sampling_filter in _sampling_filters:
+            _queue_handler.addFilter(sampling_filter)
+        _queue_listener = logging.handlers.QueueListener(
+            _queue_handler.queue, *handlers, respect_handler_level=True
+        )
+        _queue_listener.start()
+        logger.addHandler(_queue_handler)
+
     return logger
 
 
+def shutdown_logging():
+    """Flush and stop asynchronous logging and log the sampling summary.
+
+    Later records are written synchronously. Also registered with atexit, so
+    calling it explicitly is only needed before the interpreter exits (e.g.
+    before reading the log file).
+    """
+    _stop_queue_listener()
+    log_sampling_summary()
+    for target in logging.getLogger().handlers:
+        target.flush()
+
+
+def parse_sample_rates(values: List[str]) -> Dict[str, float]:
+    """Parse command-line sample rates: EVENT_TYPE=RATE items or 'batch' for BATCH_SAMPLE_RATES.
+
+    Raises:
+        ValueError: If an item is malformed
+    """
+    rates: Dict[str, float] = {}
+    for value in values:
+        if value == 'batch':
+            rates.update(BATCH_SAMPLE_RATES)
+            continue
+        event_type, separator, rate = value.partition('=')
+        if not separator or not event_type:
+            raise ValueError(f"Expected EVENT_TYPE=RATE or 'batch', got {value!r}")
+        rates[event_type] = float(rate)
+        if not 0.0 <= rates[event_type] <= 1.0:
+            raise ValueError(f"Sample rate for {event_type} must be between 0 and 1, got {rate}")
+    return rates
+
+
+def dropped_log_records() -> int:
+    """Return how many records the asynchronous log queue has dropped so far."""
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+atexit.register(shutdown_logging)
+# multiprocessing children leave through os._exit() and skip atexit; their
+# finalizer registry is reset after fork, so register once it has been
+multiprocessing.util.register_after_fork(
+    shutdown_logging, lambda func: multiprocessing.util.Finalize(None, func, exitpriority=100)
+)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(
+        before=_acquire_listener_handlers_before_fork,
+        after_in_parent=_release_listener_handlers_after_fork,
+        after_in_child=_restart_queue_listener_in_child
+    )
+
+
 def get_logger(name: str) -> logging.Logger:
     """
     Get a logger instance with the given name.
@@ -168,6 +656,178 @@ def clear_correlation_id():
     correlation_id_var.set(None)
 
 
+class LatencyHistogram:
+    """Fixed-bucket latency histogram in milliseconds.
+
+    Buckets follow a 1-2-5 series from 10 µs to 100 s, so memory is constant
+    however many values are added. Percentiles are bucket upper bounds
+    (capped at the exact maximum), accurate to within one bucket.
+    """
+
+    BOUNDS_MS = tuple(round(m * 10.0 ** e, 2) for e in range(-2, 5) for m in (1, 2, 5)) + (100_000.0,)
+
+    def __init__(self, values: Iterable[float] = ()):
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms: Optional[float] = None
+        self._lock = threading.Lock()
+        for value in values:
+            self.add(value)
+
+    def add(self, value_ms: float):
+        """Add one duration."""
+        index = bisect.bisect_left(self.BOUNDS_MS, value_ms)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total_ms += value_ms
+            if self.max_ms is None or value_ms > self.max_ms:
+                self.max_ms = value_ms
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """Return the nearest-rank percentile, or None if empty."""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = max(1, math.ceil(percent / 100 * self.count))
+            seen = 0
+            for index, bucket_count in enumerate(self.counts):
+                seen += bucket_count
+                if seen >= rank:
+                    bound = self.BOUNDS_MS[index] if index < len(self.BOUNDS_MS) else self.max_ms
+                    return min(bound, self.max_ms)
+
+    def summary(self) -> Dict:
+        """Return count, total, mean, p50/p95/p99, max and the non-empty buckets."""
+        with self._lock:
+            count, total_ms, max_ms = self.count, self.total_ms, self.max_ms
+            buckets = {
+                (f"<={self.BOUNDS_MS[i]:g}" if i < len(self.BOUNDS_MS) else f">{self.BOUNDS_MS[-1]:g}"): n
+                for i, n in enumerate(self.counts) if n
+            }
+        return {
+            'count': count,
+            'total_ms': round(total_ms, 3),
+            'mean_ms': round(total_ms / count, 3) if count else None,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'max_ms': round(max_ms, 3) if max_ms is not None else None,
+            'buckets': buckets
+        }
+
+
+class StageTimer:
+    """One timed_stage block; duration_ms is set when the block exits."""
+
+    __slots__ = ('stage', 'child_ns', 'duration_ms')
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.child_ns = 0
+        self.duration_ms: Optional[float] = None
+
+
+class StageTimings:
+    """Stage durations of one unit of work (e.g. one invoice)."""
+
+    def __init__(self):
+        self.durations_ns: Dict[str, int] = {}
+        self.stack: List[StageTimer] = []
+
+    def as_ms(self) -> Dict[str, float]:
+        """Return the accumulated duration per stage in milliseconds."""
+        return {stage: round(ns / 1_000_000, 3) for stage, ns in self.durations_ns.items()}
+
+
+# Stage timings of the current context (see start_stage_timings)
+_stage_timings_var = contextvars.ContextVar('stage_timings', default=None)
+
+# Process-wide histogram per stage name
+_stage_histograms: Dict[str, LatencyHistogram] = {}
+_stage_histograms_lock = threading.Lock()
+
+
+def start_stage_timings() -> StageTimings:
+    """Start collecting stage durations for a new unit of work in the current context."""
+    timings = StageTimings()
+    _stage_timings_var.set(timings)
+    return timings
+
+
+def get_stage_timings() -> Dict[str, float]:
+    """Return the stage durations (ms) collected since start_stage_timings()."""
+    timings = _stage_timings_var.get()
+    return timings.as_ms() if timings is not None else {}
+
+
+def record_stage_duration(stage: str, duration_ms: float):
+    """Add a duration to the process-wide histogram of a stage."""
+    histogram = _stage_histograms.get(stage)
+    if histogram is None:
+        with _stage_histograms_lock:
+            histogram = _stage_histograms.setdefault(stage, LatencyHistogram())
+    histogram.add(duration_ms)
+
+
+def stage_histograms() -> Dict[str, Dict]:
+    """Return the summary of every stage histogram in this process."""
+    with _stage_histograms_lock:
+        histograms = dict(_stage_histograms)
+    return {stage: histogram.summary() for stage, histogram in sorted(histograms.items())}
+
+
+def reset_stage_histograms():
+    """Discard all stage histograms in this process."""
+    with _stage_histograms_lock:
+        _stage_histograms.clear()
+
+
+@contextmanager
+def timed_stage(stage: str) -> Iterator[StageTimer]:
+    """
+    Time a pipeline stage with time.perf_counter_ns.
+
+    Usable as a context manager or a decorator. The duration is added to the
+    current StageTimings and to the stage's process-wide histogram. A stage
+    nested in another is subtracted from the outer one, so stage durations
+    add up to the total instead of overlapping.
+
+        with timed_stage('xml_build') as timer:
+            root = converter.build_ksef_tree(invoice_data)
+        logger.info("Built", extra={'extra_fields': {'duration_ms': timer.duration_ms}})
+
+    Args:
+        stage: Stage name, e.g. 'text_extraction' or 'xsd_validation'
+
+    Yields:
+        StageTimer whose duration_ms is set on exit
+    """
+    timings = _stage_timings_var.get()
+    if timings is None:
+        timings = start_stage_timings()
+    timer = StageTimer(stage)
+    timings.stack.append(timer)
+    start = time.perf_counter_ns()
+    try:
+        yield timer
+    finally:
+        elapsed_ns = time.perf_counter_ns() - start
+        timings.stack.pop()
+        if timings.stack:
+            timings.stack[-1].child_ns += elapsed_ns
+        own_ns = elapsed_ns - timer.child_ns
+        timer.duration_ms = round(own_ns / 1_000_000, 3)
+        timings.durations_ns[stage] = timings.durations_ns.get(stage, 0) + own_ns
+        record_stage_duration(stage, own_ns / 1_000_000)
+
+
+def _enabled(logger: logging.Logger, level: str) -> bool:
+    """Return True if the logger would emit a record at this level name."""
+    return logger.isEnabledFor(logging.getLevelName(level.upper()))
+
+
 def log_with_extra(logger: logging.Logger, level: str, message: str, **extra_fields):
     """
     Log a message with extra fields.
@@ -178,6 +838,10 @@ def log_with_extra(logger: logging.Logger, level: str, message: str, **extra_fie
         message: Log message
         **extra_fields: Additional fields to include in the log
     """
+    # Skip building the record for disabled levels
+    if not _enabled(logger, level):
+        return
+
     log_func = getattr(logger, level.lower())
 
     # Create a log record with extra fields
@@ -188,6 +852,8 @@ def log_with_extra(logger: logging.Logger, level: str, message: str, **extra_fie
 # Example usage functions
 def log_api_call(logger: logging.Logger, endpoint: str, method: str, status_code: Optional[int] = None, duration_ms: Optional[float] = None):
     """Log an API call with structured data."""
+    if not _enabled(logger, 'info'):
+        return
     log_with_extra(
         logger, 'info', f'API call: {method} {endpoint}',
         endpoint=endpoint,
@@ -198,8 +864,11 @@ def log_api_call(logger: logging.Logger, endpoint: str, method: str, status_code
     )
 
 
-def log_file_operation(logger: logging.Logger, operation: str, file_path: str, success: bool, error: Optional[str] = None):
+def log_file_operation(logger: logging.Logger, operation: str, file_path: str, success: bool, error: Optional[str] = None, duration_ms: Optional[float] = None):
     """Log a file operation with structured data."""
+    if not _enabled(logger, 'info' if success else 'error'):
+        return
+    timing = {'duration_ms': duration_ms} if duration_ms is not None else {}
     log_with_extra(
         logger, 'info' if success else 'error',
         f'File operation: {operation} {file_path}',
@@ -207,12 +876,15 @@ def log_file_operation(logger: logging.Logger, operation: str, file_path: str, s
         file_path=file_path,
         success=success,
         error=error,
+        **timing,
         event_type='file_operation'
     )
 
 
 def log_invoice_processing(logger: logging.Logger, invoice_number: str, stage: str, success: bool, error: Optional[str] = None):
     """Log invoice processing with structured data."""
+    if not _enabled(logger, 'info' if success else 'error'):
+        return
     log_with_extra(
         logger, 'info' if success else 'error',
         f'Invoice {invoice_number} - {stage}',
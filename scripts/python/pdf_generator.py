@@ -13,9 +13,13 @@ from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.enums import TA_LEFT, TA_RIGHT, TA_CENTER
 from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+from reportlab.pdfbase.pdfdoc import PDFArray, PDFDictionary, PDFName, PDFStream, PDFString
 from typing import Dict, List
+import json
 import os
 
+from pdf_text_backends import INVOICE_DATA_ATTACHMENT
+
 # Import logging configuration
 from logging_config import get_logger, log_file_operation
 
@@ -26,8 +30,14 @@ logger = get_logger(__name__)
 class PDFInvoiceGenerator:
     """Generate PDF invoice with Polish layout."""
 
-    def __init__(self):
-        """Initialize PDF generator."""
+    def __init__(self, invariant: bool = False):
+        """Initialize PDF generator.
+
+        Args:
+            invariant: If True, omit creation timestamps and random document IDs
+                       so identical invoice data yields byte-identical PDFs
+        """
+        self.invariant = invariant
         # Register Unicode fonts for Polish characters
         self._register_fonts()
         self.styles = getSampleStyleSheet()
@@ -212,8 +222,15 @@ class PDFInvoiceGenerator:
 
         return result
 
-    def generate_pdf(self, invoice_data: Dict, output_path: str):
-        """Generate PDF invoice from invoice data."""
+    def generate_pdf(self, invoice_data: Dict, output_path: str, embed_data: bool = True):
+        """Generate PDF invoice from invoice data.
+
+        Args:
+            invoice_data: Invoice dictionary
+            output_path: Path of the PDF file to write
+            embed_data: Attach invoice_data as JSON so KSeFXMLConverter can
+                        read it back without text extraction
+        """
         invoice_number = invoice_data.get('number', 'unknown')
         logger.info("Starting PDF generation", extra={'extra_fields': {
             'invoice_number': invoice_number,
@@ -228,7 +245,8 @@ class PDFInvoiceGenerator:
                 rightMargin=2*cm,
                 leftMargin=2*cm,
                 topMargin=2*cm,
-                bottomMargin=2*cm
+                bottomMargin=2*cm,
+                invariant=self.invariant
             )
 
             story = []
@@ -264,7 +282,10 @@ class PDFInvoiceGenerator:
             # Footer
             story.append(self._create_footer(invoice_data))
 
-            doc.build(story)
+            if embed_data:
+                doc.build(story, onFirstPage=lambda canvas, _: self._embed_invoice_data(canvas, invoice_data))
+            else:
+                doc.build(story)
 
             log_file_operation(logger, 'pdf_generation', output_path, True)
             logger.info("PDF generated successfully", extra={'extra_fields': {
@@ -283,6 +304,32 @@ class PDFInvoiceGenerator:
             }}, exc_info=True)
             raise
 
+    def _embed_invoice_data(self, canvas, data: Dict):
+        """Attach invoice data as an embedded JSON file (PDF /EmbeddedFiles name tree)."""
+        document = canvas._doc
+        payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+        embedded_file = PDFStream(
+            dictionary=PDFDictionary({
+                'Type': PDFName('EmbeddedFile'),
+                'Subtype': PDFName('application#2Fjson')
+            }),
+            content=payload
+        )
+        file_spec = PDFDictionary({
+            'Type': PDFName('Filespec'),
+            'F': PDFString(INVOICE_DATA_ATTACHMENT),
+            'UF': PDFString(INVOICE_DATA_ATTACHMENT),
+            'Desc': PDFString('Source invoice data'),
+            'AFRelationship': PDFName('Data'),
+            'EF': PDFDictionary({'F': document.Reference(embedded_file)})
+        })
+        document.Catalog.Names = PDFDictionary({
+            'EmbeddedFiles': PDFDictionary({
+                'Names': PDFArray([PDFString(INVOICE_DATA_ATTACHMENT), document.Reference(file_spec)])
+            })
+        })
+
     def _create_top_summary(self, data: Dict) -> Table:
         """Create top summary section with totals."""
         summary_data = [
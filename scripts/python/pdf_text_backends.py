@@ -0,0 +1,303 @@
+"""
+PDF Text Extraction Backends
+
+Pluggable text extraction for KSeFXMLConverter. Every backend opens a PDF
+as a PDFTextDocument exposing a page count and per-page text, so the
+converter can extract pages lazily regardless of the library underneath.
+
+Backends:
+- pdfplumber: default, pure Python (pdfminer.six); groups words into visual lines
+- pypdfium2: PDFium (C) bindings, optional, much faster
+- pymupdf: MuPDF (C) bindings, optional, much faster
+
+The C-based backends rebuild pdfplumber's visual lines from word positions,
+so the rule parser sees the same text whichever backend extracted it. Use
+`python benchmark.py extract` to check parity and throughput on a corpus
+before switching backends.
+"""
+
+import abc
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Tuple, Type
+
+import pdfplumber
+from pdfminer.pdftypes import resolve1
+
+try:
+    import pypdfium2
+except ImportError:  # optional dependency
+    pypdfium2 = None
+
+try:
+    import pymupdf
+except ImportError:  # optional dependency
+    pymupdf = None
+
+DEFAULT_BACKEND = "pdfplumber"
+AUTO_BACKEND = "auto"
+
+# Embedded file carrying the source invoice data in PDFs from PDFInvoiceGenerator
+INVOICE_DATA_ATTACHMENT = "invoice.json"
+
+# Preference order for AUTO_BACKEND, fastest first
+_AUTO_ORDER = ["pymupdf", "pypdfium2", "pdfplumber"]
+
+# pdfplumber's default tolerances: words whose tops are this close share a line,
+# characters closer than this horizontally share a word
+LINE_Y_TOLERANCE = 3
+WORD_X_TOLERANCE = 3
+
+_BACKENDS: Dict[str, Type["PDFTextBackend"]] = {}
+
+
+class PDFTextDocument(abc.ABC):
+    """An open PDF document. Use as a context manager."""
+
+    page_count: int = 0
+
+    @abc.abstractmethod
+    def page_text(self, index: int) -> str:
+        """Return the text of a zero-based page ('' if it has none)."""
+
+    def attachment(self, name: str) -> Optional[bytes]:
+        """Return the contents of an embedded file by name, or None if absent."""
+        return None
+
+    def close(self):
+        """Release the document."""
+
+    def __enter__(self) -> "PDFTextDocument":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class PDFTextBackend(abc.ABC):
+    """Text extraction backend interface."""
+
+    name: str = ""
+
+    @classmethod
+    def is_available(cls) -> bool:
+        """Return True if the backend's library is installed."""
+        return True
+
+    @abc.abstractmethod
+    def open(self, pdf_path: str) -> PDFTextDocument:
+        """Open a PDF for page-by-page text extraction."""
+
+
+def register_backend(backend_cls: Type[PDFTextBackend]) -> Type[PDFTextBackend]:
+    """Register a backend class under its name (usable as a class decorator)."""
+    _BACKENDS[backend_cls.name] = backend_cls
+    return backend_cls
+
+
+def available_backends() -> List[str]:
+    """Return names of registered backends whose libraries are installed."""
+    return [name for name, backend_cls in _BACKENDS.items() if backend_cls.is_available()]
+
+
+def get_backend(name: str = DEFAULT_BACKEND) -> PDFTextBackend:
+    """Instantiate a backend by name.
+
+    Args:
+        name: Registered backend name, or 'auto' for the fastest installed backend
+
+    Raises:
+        ValueError: If the backend is unknown or its library is not installed
+    """
+    if name == AUTO_BACKEND:
+        name = next(n for n in _AUTO_ORDER if n in _BACKENDS and _BACKENDS[n].is_available())
+
+    backend_cls = _BACKENDS.get(name)
+    if backend_cls is None:
+        raise ValueError(f"Unknown PDF text backend: {name}. Registered: {', '.join(sorted(_BACKENDS))}")
+    if not backend_cls.is_available():
+        raise ValueError(f"PDF text backend '{name}' is not available, install its library first")
+    return backend_cls()
+
+
+def _visual_lines(words: Iterable[Tuple[float, float, str]], y_tolerance: float = LINE_Y_TOLERANCE) -> str:
+    """Join (top, x0, text) words into lines the way pdfplumber's extract_text() does.
+
+    Words are clustered by top, each within y_tolerance of the previous one,
+    then ordered left to right and joined by single spaces. Sorting is stable,
+    so words sharing a position (e.g. from one text run) keep their order.
+    """
+    lines: List[List[Tuple[float, str]]] = []
+    last_top = None
+    for top, x0, text in sorted(words, key=itemgetter(0, 1)):
+        if last_top is None or top > last_top + y_tolerance:
+            lines.append([])
+        lines[-1].append((x0, text))
+        last_top = top
+    return '\n'.join(' '.join(text for _, text in sorted(line, key=itemgetter(0))) for line in lines)
+
+
+# ============================================================================
+# pdfplumber
+# ============================================================================
+
+class _PdfplumberDocument(PDFTextDocument):
+    """Open pdfplumber document."""
+
+    def __init__(self, pdf_path: str):
+        self._pdf = pdfplumber.open(pdf_path)
+        self._pages = self._pdf.pages
+        self.page_count = len(self._pages)
+
+    def page_text(self, index: int) -> str:
+        page = self._pages[index]
+        try:
+            return page.extract_text() or ''
+        finally:
+            # Release cached layout objects once the page's text is out
+            page.close()
+
+    def attachment(self, name: str) -> Optional[bytes]:
+        names_tree = resolve1(self._pdf.doc.catalog.get('Names'))
+        if not names_tree:
+            return None
+        embedded_files = resolve1(names_tree.get('EmbeddedFiles'))
+        # Flat name tree: [name1, filespec1, name2, filespec2, ...]
+        entries = resolve1(embedded_files.get('Names')) if embedded_files else None
+        for key, file_spec in zip((entries or [])[::2], (entries or [])[1::2]):
+            key = resolve1(key)
+            if isinstance(key, bytes):
+                key = key.decode('latin-1')
+            if key == name:
+                stream = resolve1(resolve1(resolve1(file_spec).get('EF', {})).get('F'))
+                return stream.get_data() if stream is not None else None
+        return None
+
+    def close(self):
+        self._pdf.close()
+
+
+@register_backend
+class PdfplumberBackend(PDFTextBackend):
+    """pdfplumber (pdfminer.six) backend."""
+
+    name = "pdfplumber"
+
+    def open(self, pdf_path: str) -> PDFTextDocument:
+        return _PdfplumberDocument(pdf_path)
+
+
+# ============================================================================
+# pypdfium2
+# ============================================================================
+
+class _PdfiumDocument(PDFTextDocument):
+    """Open PDFium document."""
+
+    def __init__(self, pdf_path: str):
+        self._pdf = pypdfium2.PdfDocument(pdf_path)
+        self.page_count = len(self._pdf)
+
+    def page_text(self, index: int) -> str:
+        page = self._pdf[index]
+        try:
+            height = page.get_height()
+            text_page = page.get_textpage()
+            try:
+                return _visual_lines(self._words(text_page, height))
+            finally:
+                text_page.close()
+        finally:
+            page.close()
+
+    @staticmethod
+    def _words(text_page, height: float) -> List[Tuple[float, float, str]]:
+        """Group characters into (top, x0, text) words like pdfplumber.
+
+        A word ends at whitespace (including spaces PDFium inserts), at a gap
+        wider than WORD_X_TOLERANCE or when the next character is on another
+        line. Loose boxes span the font's ascent and descent, like pdfplumber's.
+        """
+        words = []
+        chars: List[str] = []
+        word_top = word_x0 = last_x1 = 0.0
+        for index, char in enumerate(text_page.get_text_range()):
+            if char.isspace():
+                if chars:
+                    words.append((word_top, word_x0, ''.join(chars)))
+                    chars = []
+                continue
+            left, bottom, right, top = text_page.get_charbox(index, loose=True)
+            # PDF y grows upwards, pdfplumber's top downwards
+            top = height - top
+            if chars and (left - last_x1 > WORD_X_TOLERANCE or abs(top - word_top) > LINE_Y_TOLERANCE):
+                words.append((word_top, word_x0, ''.join(chars)))
+                chars = []
+            if not chars:
+                word_top, word_x0 = top, left
+            chars.append(char)
+            last_x1 = right
+        if chars:
+            words.append((word_top, word_x0, ''.join(chars)))
+        return words
+
+    def attachment(self, name: str) -> Optional[bytes]:
+        for index in range(self._pdf.count_attachments()):
+            attachment = self._pdf.get_attachment(index)
+            if attachment.get_name() == name:
+                return bytes(attachment.get_data())
+        return None
+
+    def close(self):
+        self._pdf.close()
+
+
+@register_backend
+class PdfiumBackend(PDFTextBackend):
+    """pypdfium2 (PDFium) backend."""
+
+    name = "pypdfium2"
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return pypdfium2 is not None
+
+    def open(self, pdf_path: str) -> PDFTextDocument:
+        return _PdfiumDocument(pdf_path)
+
+
+# ============================================================================
+# PyMuPDF
+# ============================================================================
+
+class _PyMuPDFDocument(PDFTextDocument):
+    """Open MuPDF document."""
+
+    def __init__(self, pdf_path: str):
+        self._pdf = pymupdf.open(pdf_path)
+        self.page_count = self._pdf.page_count
+
+    def page_text(self, index: int) -> str:
+        # (x0, y0, x1, y1, word, block, line, word_no); y0 is the top
+        return _visual_lines((word[1], word[0], word[4]) for word in self._pdf[index].get_text('words'))
+
+    def attachment(self, name: str) -> Optional[bytes]:
+        if name not in self._pdf.embfile_names():
+            return None
+        return self._pdf.embfile_get(name)
+
+    def close(self):
+        self._pdf.close()
+
+
+@register_backend
+class PyMuPDFBackend(PDFTextBackend):
+    """PyMuPDF (MuPDF) backend."""
+
+    name = "pymupdf"
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return pymupdf is not None
+
+    def open(self, pdf_path: str) -> PDFTextDocument:
+        return _PyMuPDFDocument(pdf_path)
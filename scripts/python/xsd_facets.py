@@ -0,0 +1,619 @@
+"""
+XSD Facet Pre-Validator
+
+Compiles the simple-type facets (patterns, length limits, enumerations,
+digit counts and value ranges) of selected elements of a KSeF XSD into a
+lookup table of plain Python checks. Checking an invoice field against its
+rule takes microseconds, so bad data can be rejected before any XML is built;
+full XSD validation stays the authority for everything else.
+
+Restriction chains are followed through named types, including types from
+imported schemas. An imported schema is looked up next to the main XSD (by
+file name) before its schemaLocation is fetched; when it cannot be loaded,
+SchemaImportError is raised rather than leaving its types unchecked.
+"""
+
+import calendar
+import os
+import re
+import threading
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urljoin
+
+from lxml import etree
+
+from logging_config import get_logger
+
+# Initialize logger
+logger = get_logger(__name__)
+
+XSD_NAMESPACE = "http://www.w3.org/2001/XMLSchema"
+_XSD = f"{{{XSD_NAMESPACE}}}"
+
+# Built-in XSD types: value kind and whiteSpace facet
+_BUILTIN_TYPES = {
+    'string': ('string', 'preserve'),
+    'normalizedString': ('string', 'replace'),
+    'decimal': ('decimal', 'collapse'),
+    'date': ('date', 'collapse'),
+    'dateTime': ('dateTime', 'collapse'),
+}
+for _name in ('token', 'language', 'Name', 'NCName', 'NMTOKEN', 'ID', 'IDREF', 'ENTITY'):
+    _BUILTIN_TYPES[_name] = ('string', 'collapse')
+
+# Built-in integer types and their implicit (min, max) value range
+_INTEGER_RANGES = {
+    'integer': (None, None),
+    'nonNegativeInteger': (0, None),
+    'positiveInteger': (1, None),
+    'nonPositiveInteger': (None, 0),
+    'negativeInteger': (None, -1),
+    'long': (-2 ** 63, 2 ** 63 - 1),
+    'int': (-2 ** 31, 2 ** 31 - 1),
+    'short': (-2 ** 15, 2 ** 15 - 1),
+    'byte': (-2 ** 7, 2 ** 7 - 1),
+    'unsignedLong': (0, 2 ** 64 - 1),
+    'unsignedInt': (0, 2 ** 32 - 1),
+    'unsignedShort': (0, 2 ** 16 - 1),
+    'unsignedByte': (0, 2 ** 8 - 1),
+}
+
+_LEXICAL_RES = {
+    'decimal': re.compile(r'[+-]?(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)'),
+    'integer': re.compile(r'[+-]?[0-9]+'),
+    'date': re.compile(r'(-?[0-9]{4,})-([0-9]{2})-([0-9]{2})(?:Z|[+-][0-9]{2}:[0-9]{2})?'),
+    'dateTime': re.compile(
+        r'(-?[0-9]{4,})-([0-9]{2})-([0-9]{2})T([0-9]{2}):([0-9]{2}):([0-9]{2}(?:\.[0-9]+)?)'
+        r'(?:Z|[+-][0-9]{2}:[0-9]{2})?'
+    ),
+}
+
+_RANGE_FACETS = ('minInclusive', 'maxInclusive', 'minExclusive', 'maxExclusive')
+_LENGTH_FACETS = ('length', 'minLength', 'maxLength')
+_DIGIT_FACETS = ('totalDigits', 'fractionDigits')
+
+# XSD regex constructs with no Python equivalent: such patterns are left to full validation
+_UNSUPPORTED_PATTERN_RE = re.compile(r'\\[pPiIcC]|-\[')
+# Imported schemas are usually referenced by http URL
+_SCHEMA_PARSER = etree.XMLParser(no_network=False, remove_comments=True)
+_WHITESPACE_RE = re.compile(r'[\t\n\r ]+')
+_NEEDS_NORMALIZING_RE = re.compile(r'^ | $|[\t\n\r]|  ')
+_REPLACED_WHITESPACE_RE = re.compile(r'[\t\n\r]')
+
+
+def _python_pattern(xsd_pattern: str) -> Optional[str]:
+    """Translate an XSD regular expression to Python syntax, or None if unsupported.
+
+    XSD patterns are implicitly anchored (matched with fullmatch) and treat
+    ^ and $ as ordinary characters outside character classes.
+    """
+    if _UNSUPPORTED_PATTERN_RE.search(xsd_pattern):
+        return None
+    out = []
+    in_class = escaped = False
+    for char in xsd_pattern:
+        if escaped:
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif in_class:
+            if char == ']':
+                in_class = False
+            elif char == '[':
+                char = '\\['
+        elif char == '[':
+            in_class = True
+        elif char in '^$':
+            char = '\\' + char
+        out.append(char)
+    return "".join(out)
+
+
+def _date_key(kind: str, value: str) -> Optional[Tuple]:
+    """Return a comparable key for a date or dateTime, or None if it cannot be compared.
+
+    Timezones are ignored, so comparisons against range facets are exact only
+    for values in the same timezone as the facet.
+    """
+    match = _LEXICAL_RES[kind].fullmatch(value)
+    if match is None or match.group(1).startswith('-'):
+        return None
+    parts = match.groups()
+    key = tuple(int(part) for part in parts[:5])
+    if kind == 'dateTime':
+        key += (Decimal(parts[5]),)
+    return key
+
+
+def _valid_date_fields(kind: str, value: str) -> bool:
+    """Check month, day and time fields of a lexically valid date or dateTime."""
+    key = _date_key(kind, value)
+    if key is None:
+        return True
+    year, month, day = key[:3]
+    if not 1 <= month <= 12 or year == 0:
+        return False
+    if not 1 <= day <= calendar.monthrange(year, month)[1]:
+        return False
+    if kind == 'dateTime':
+        hour, minute, second = key[3:]
+        if (hour, minute, second) == (24, 0, 0):
+            return True
+        return hour < 24 and minute < 60 and second < 60
+    return True
+
+
+def _digit_counts(value: Decimal) -> Tuple[int, int]:
+    """Return (total digits, fraction digits) of a decimal in the XSD value space."""
+    _, digits, exponent = value.as_tuple()
+    digits = list(digits)
+    # Trailing fractional zeros are not significant
+    while exponent < 0 and len(digits) > 1 and digits[-1] == 0:
+        digits.pop()
+        exponent += 1
+    fraction_digits = max(0, -exponent)
+    return max(len(digits) + max(0, exponent), fraction_digits), fraction_digits
+
+
+class SchemaImportError(OSError):
+    """An imported or included schema could not be loaded."""
+
+
+class FacetRule:
+    """Compiled facets of one simple type.
+
+    Facets are collected along the whole restriction chain: patterns of one
+    derivation step are alternatives, patterns of different steps must all
+    match, the most derived enumeration applies and length, digit and range
+    limits are the tightest found.
+
+    Attributes:
+        type_name: Name of the type the rule was compiled from
+        kind: Value kind of the built-in base type ('string', 'decimal', 'integer',
+              'date', 'dateTime', 'other'), or None if the base type was not resolved
+        complete: False if part of the restriction chain could not be resolved
+    """
+
+    __slots__ = ('type_name', 'kind', 'whitespace', 'patterns', 'enumeration', 'limits', 'ranges', 'complete')
+
+    def __init__(self, type_name: str):
+        """Initialize a rule without facets."""
+        self.type_name = type_name
+        self.kind: Optional[str] = None
+        self.whitespace: Optional[str] = None
+        # (compiled regex, XSD source) per derivation step
+        self.patterns: List[Tuple[re.Pattern, str]] = []
+        self.enumeration: Optional[frozenset] = None
+        # Length and digit facets -> int
+        self.limits: Dict[str, int] = {}
+        # Range facets -> (comparable key, XSD source)
+        self.ranges: Dict[str, Tuple[object, str]] = {}
+        self.complete = True
+
+    def normalize(self, value: str) -> str:
+        """Apply the whiteSpace facet; unresolved types are treated as collapsed."""
+        if self.whitespace == 'preserve':
+            return value
+        if self.whitespace == 'replace':
+            return _REPLACED_WHITESPACE_RE.sub(' ', value)
+        return _WHITESPACE_RE.sub(' ', value).strip(' ')
+
+    def check(self, value: str) -> Optional[str]:
+        """Check a value against the rule.
+
+        Args:
+            value: Element text as it will be written to the XML
+
+        Returns:
+            None if the value passes every compiled facet, else an error message
+            worded like the XML schema validator's
+        """
+        if self.whitespace != 'preserve' and _NEEDS_NORMALIZING_RE.search(value):
+            value = self.normalize(value)
+        kind = self.kind
+
+        lexical = _LEXICAL_RES.get(kind)
+        if lexical is not None and (lexical.fullmatch(value) is None or not self._valid_fields(value)):
+            return f"The value '{value}' is not a valid value of the atomic type '{self.type_name}'."
+
+        for regex, source in self.patterns:
+            if regex.fullmatch(value) is None:
+                return f"[facet 'pattern'] The value '{value}' is not accepted by the pattern '{source}'."
+
+        if self.enumeration is not None and value not in self.enumeration:
+            return f"[facet 'enumeration'] The value '{value}' is not an element of the set of allowed values."
+
+        limits = self.limits
+        if kind in (None, 'string', 'other'):
+            length = len(value)
+            if 'length' in limits and length != limits['length']:
+                return f"[facet 'length'] The value has a length of '{length}'; this differs from the allowed length of '{limits['length']}'."
+            if 'minLength' in limits and length < limits['minLength']:
+                return f"[facet 'minLength'] The value has a length of '{length}'; this underruns the allowed minimum length of '{limits['minLength']}'."
+            if 'maxLength' in limits and length > limits['maxLength']:
+                return f"[facet 'maxLength'] The value has a length of '{length}'; this exceeds the allowed maximum length of '{limits['maxLength']}'."
+            return None
+
+        if kind in ('decimal', 'integer'):
+            if limits and self._may_exceed_digits(value):
+                total_digits, fraction_digits = _digit_counts(Decimal(value))
+                if total_digits > limits.get('totalDigits', total_digits):
+                    return f"[facet 'totalDigits'] The value '{value}' has more digits than are allowed ('{limits['totalDigits']}')."
+                if fraction_digits > limits.get('fractionDigits', fraction_digits):
+                    return f"[facet 'fractionDigits'] The value '{value}' has more fractional digits than are allowed ('{limits['fractionDigits']}')."
+            if not self.ranges:
+                return None
+            key = Decimal(value)
+        else:
+            if not self.ranges:
+                return None
+            key = _date_key(kind, value)
+            if key is None:
+                return None
+        return self._check_range(value, key)
+
+    def _may_exceed_digits(self, value: str) -> bool:
+        """Cheap check on the lexical form: value space digits never exceed the written ones."""
+        limits = self.limits
+        point = value.find('.')
+        fraction_chars = len(value) - point - 1 if point >= 0 else 0
+        digit_chars = len(value) - (point >= 0) - (value[0] in '+-')
+        return (digit_chars > limits.get('totalDigits', digit_chars)
+                or fraction_chars > limits.get('fractionDigits', fraction_chars))
+
+    def _valid_fields(self, value: str) -> bool:
+        """Check the parts of a value the lexical regex cannot (calendar dates)."""
+        if self.kind in ('date', 'dateTime'):
+            return _valid_date_fields(self.kind, value)
+        return True
+
+    def _check_range(self, value: str, key) -> Optional[str]:
+        """Check a comparable value against the range facets."""
+        ranges = self.ranges
+        if 'minInclusive' in ranges and key < ranges['minInclusive'][0]:
+            return f"[facet 'minInclusive'] The value '{value}' is less than the minimum value allowed ('{ranges['minInclusive'][1]}')."
+        if 'maxInclusive' in ranges and key > ranges['maxInclusive'][0]:
+            return f"[facet 'maxInclusive'] The value '{value}' is greater than the maximum value allowed ('{ranges['maxInclusive'][1]}')."
+        if 'minExclusive' in ranges and key <= ranges['minExclusive'][0]:
+            return f"[facet 'minExclusive'] The value '{value}' must be greater than '{ranges['minExclusive'][1]}'."
+        if 'maxExclusive' in ranges and key >= ranges['maxExclusive'][0]:
+            return f"[facet 'maxExclusive'] The value '{value}' must be less than '{ranges['maxExclusive'][1]}'."
+        return None
+
+    def _range_key(self, value: str):
+        """Convert a range facet value to a comparable key, or None if the kind is unknown."""
+        if self.kind in ('decimal', 'integer'):
+            return Decimal(value)
+        if self.kind in ('date', 'dateTime'):
+            return _date_key(self.kind, value)
+        return None
+
+    def describe(self) -> Dict:
+        """Return the compiled facets as a JSON-serializable dict."""
+        return {
+            'type': self.type_name,
+            'kind': self.kind,
+            'complete': self.complete,
+            'patterns': [source for _, source in self.patterns],
+            'enumeration': sorted(self.enumeration) if self.enumeration is not None else None,
+            **self.limits,
+            **{name: source for name, (_, source) in self.ranges.items()}
+        }
+
+
+class XSDFacetCompiler:
+    """Reads a schema and its imports once and compiles element rules on request.
+
+    Args:
+        schema_path: Path to the main XSD file
+
+    Raises:
+        SchemaImportError: If a schema it imports or includes cannot be loaded
+    """
+
+    def __init__(self, schema_path: Path):
+        self.schema_path = Path(schema_path)
+        self._simple_types: Dict[str, etree._Element] = {}
+        self._complex_types: Dict[str, etree._Element] = {}
+        self._elements: Dict[str, etree._Element] = {}
+        self._rules: Dict[str, FacetRule] = {}
+        self.target_namespace: Optional[str] = None
+        self._load(str(self.schema_path), set())
+
+    def _load(self, location: str, loaded: Set[str]):
+        """Index the global declarations of a schema document and of its imports."""
+        if location in loaded:
+            return
+        loaded.add(location)
+        schema = etree.parse(location, _SCHEMA_PARSER).getroot()
+        namespace = schema.get('targetNamespace')
+        if self.target_namespace is None:
+            self.target_namespace = namespace
+
+        for node in schema:
+            name = node.get('name')
+            if node.tag == f"{_XSD}simpleType":
+                self._simple_types[f"{{{namespace}}}{name}"] = node
+            elif node.tag == f"{_XSD}complexType":
+                self._complex_types[f"{{{namespace}}}{name}"] = node
+            elif node.tag == f"{_XSD}element":
+                self._elements[f"{{{namespace}}}{name}"] = node
+            elif node.tag in (f"{_XSD}import", f"{_XSD}include") and node.get('schemaLocation'):
+                self._load_import(location, node.get('schemaLocation'), node.get('namespace') or namespace, loaded)
+
+    def _load_import(self, base_location: str, schema_location: str, namespace: str, loaded: Set[str]):
+        """Load an imported schema, preferring a local copy next to the main XSD.
+
+        Raises:
+            SchemaImportError: If neither the local copy nor schemaLocation can be loaded
+        """
+        local_copy = self.schema_path.parent / schema_location.rsplit('/', 1)[-1]
+        candidates = [str(local_copy)] if local_copy.is_file() else []
+        candidates.append(urljoin(base_location, schema_location))
+
+        error = None
+        for candidate in candidates:
+            try:
+                self._load(candidate, loaded)
+                return
+            except SchemaImportError:
+                # A nested import failed; report that one
+                raise
+            except (OSError, etree.XMLSyntaxError) as e:
+                error = e
+
+        logger.warning(
+            f"Could not load imported schema {schema_location}",
+            extra={'extra_fields': {
+                'schema_location': schema_location,
+                'namespace': namespace,
+                'error': str(error),
+                'event_type': 'xsd_import_unresolved'
+            }}
+        )
+        raise SchemaImportError(
+            f"Cannot load schema {schema_location} imported by {base_location}: {error}. "
+            f"Save a copy (and the schemas it includes) next to {self.schema_path} to pre-validate offline"
+        ) from error
+
+    @staticmethod
+    def _qname(node: etree._Element, value: str) -> str:
+        """Resolve a prefixed type name from the scope of a schema node to Clark notation."""
+        prefix, _, local = value.rpartition(':')
+        return f"{{{node.nsmap.get(prefix or None)}}}{local}"
+
+    def type_rule(self, type_qname: str) -> FacetRule:
+        """Return the rule of a named simple type, in Clark notation."""
+        rule = self._rules.get(type_qname)
+        if rule is None:
+            rule = FacetRule(type_qname.rpartition('}')[2])
+            self._collect(type_qname, rule, set())
+            self._rules[type_qname] = rule
+        return rule
+
+    def _collect(self, type_qname: str, rule: FacetRule, seen: Set[str]):
+        """Add the facets of a named type and its bases to a rule."""
+        namespace, _, local = type_qname[1:].partition('}')
+        if namespace == XSD_NAMESPACE:
+            self._collect_builtin(local, rule)
+            return
+        node = self._simple_types.get(type_qname)
+        if node is None or type_qname in seen:
+            rule.complete = False
+            return
+        seen.add(type_qname)
+        self._collect_node(node, rule, seen)
+
+    def _collect_builtin(self, local: str, rule: FacetRule):
+        """Set the value kind and implicit facets of a built-in base type."""
+        if local in _INTEGER_RANGES:
+            rule.kind = 'integer'
+            low, high = _INTEGER_RANGES[local]
+            if low is not None:
+                rule.ranges.setdefault('minInclusive', (Decimal(low), str(low)))
+            if high is not None:
+                rule.ranges.setdefault('maxInclusive', (Decimal(high), str(high)))
+        else:
+            rule.kind = _BUILTIN_TYPES.get(local, ('other', None))[0]
+        if rule.whitespace is None:
+            rule.whitespace = _BUILTIN_TYPES.get(local, (None, 'collapse'))[1]
+
+    def _collect_node(self, simple_type: etree._Element, rule: FacetRule, seen: Set[str]):
+        """Add the facets of a simpleType node (most derived first) and of its base."""
+        restriction = simple_type.find(f"{_XSD}restriction")
+        if restriction is None:
+            # xsd:list and xsd:union are left to full validation
+            rule.kind = rule.kind or 'other'
+            rule.complete = False
+            return
+
+        pattern_sources = []
+        enumeration = []
+        facets = {}
+        for facet in restriction:
+            name = etree.QName(facet).localname
+            value = facet.get('value')
+            if name == 'pattern':
+                pattern_sources.append(value)
+            elif name == 'enumeration':
+                enumeration.append(value)
+            elif value is not None:
+                facets[name] = value
+
+        if pattern_sources:
+            python_patterns = [_python_pattern(source) for source in pattern_sources]
+            if all(pattern is not None for pattern in python_patterns):
+                regex = re.compile("|".join(f"(?:{pattern})" for pattern in python_patterns))
+                rule.patterns.append((regex, "|".join(pattern_sources)))
+            else:
+                rule.complete = False
+        if enumeration and rule.enumeration is None:
+            rule.enumeration = frozenset(enumeration)
+        if 'whiteSpace' in facets and rule.whitespace is None:
+            rule.whitespace = facets['whiteSpace']
+
+        base = restriction.get('base')
+        if base is not None:
+            self._collect(self._qname(restriction, base), rule, seen)
+        else:
+            inline = restriction.find(f"{_XSD}simpleType")
+            if inline is not None:
+                self._collect_node(inline, rule, seen)
+
+        # Limits are applied once the base is known, the base kind decides how to compare
+        for name, value in facets.items():
+            if name in _LENGTH_FACETS or name in _DIGIT_FACETS:
+                limit = int(value)
+                current = rule.limits.get(name)
+                if name == 'minLength':
+                    rule.limits[name] = max(limit, current) if current is not None else limit
+                else:
+                    rule.limits[name] = min(limit, current) if current is not None else limit
+            elif name in _RANGE_FACETS:
+                key = rule._range_key(value)
+                if key is None:
+                    rule.complete = False
+                    continue
+                current = rule.ranges.get(name)
+                tighter = current is None or (key > current[0] if name.startswith('min') else key < current[0])
+                if tighter:
+                    rule.ranges[name] = (key, value)
+
+    def element_rule(self, path: Iterable[str]) -> Optional[FacetRule]:
+        """Return the rule of the simple content of an element.
+
+        Args:
+            path: Local names from the global root element down to the element,
+                  e.g. ('Faktura', 'Fa', 'P_1'); names are in the target namespace
+
+        Returns:
+            The compiled rule, or None if the element is not declared, has
+            element-only content or its type cannot be resolved at all
+        """
+        path = list(path)
+        element = self._elements.get(f"{{{self.target_namespace}}}{path[0]}")
+        for name in path[1:]:
+            if element is None:
+                return None
+            complex_type = self._complex_type_of(element)
+            element = None
+            if complex_type is not None:
+                element = next(
+                    (child for child in self._child_elements(complex_type) if child.get('name') == name),
+                    None
+                )
+        if element is None:
+            return None
+        return self._simple_rule_of(element, '/'.join(path))
+
+    def _complex_type_of(self, element: etree._Element) -> Optional[etree._Element]:
+        """Return the complexType node of an element declaration."""
+        inline = element.find(f"{_XSD}complexType")
+        if inline is not None:
+            return inline
+        type_name = element.get('type')
+        if type_name is None:
+            return None
+        return self._complex_types.get(self._qname(element, type_name))
+
+    def _child_elements(self, node: etree._Element) -> Iterator[etree._Element]:
+        """Yield the element declarations of a content model, including inherited ones."""
+        for child in node:
+            if child.tag == f"{_XSD}element":
+                yield child
+            elif child.tag in (f"{_XSD}sequence", f"{_XSD}choice", f"{_XSD}all", f"{_XSD}complexContent"):
+                yield from self._child_elements(child)
+            elif child.tag in (f"{_XSD}extension", f"{_XSD}restriction"):
+                if child.tag == f"{_XSD}extension" and child.get('base'):
+                    base = self._complex_types.get(self._qname(child, child.get('base')))
+                    if base is not None:
+                        yield from self._child_elements(base)
+                yield from self._child_elements(child)
+
+    def _simple_rule_of(self, element: etree._Element, name: str) -> Optional[FacetRule]:
+        """Return the rule of an element with a simple type or simple content."""
+        type_name = element.get('type')
+        if type_name is not None:
+            qname = self._qname(element, type_name)
+            if qname in self._complex_types:
+                return None
+            return self.type_rule(qname)
+
+        inline = element.find(f"{_XSD}simpleType")
+        if inline is None:
+            complex_type = element.find(f"{_XSD}complexType")
+            extension = None if complex_type is None else complex_type.find(f"{_XSD}simpleContent/{_XSD}extension")
+            if extension is None or extension.get('base') is None:
+                return None
+            return self.type_rule(self._qname(extension, extension.get('base')))
+
+        rule = self._rules.get(name)
+        if rule is None:
+            rule = FacetRule(element.get('name'))
+            self._collect_node(inline, rule, set())
+            self._rules[name] = rule
+        return rule
+
+
+class FacetTableRegistry:
+    """Process-wide cache of compiled facet tables.
+
+    A table maps element paths to rules. It is compiled once per
+    (schema path, mtime, element paths); a changed file mtime invalidates it.
+    """
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._lock = threading.Lock()
+        self._tables: Dict[Tuple[str, Tuple[Tuple[str, ...], ...]], Tuple[int, Dict]] = {}
+
+    def get_table(self, schema_path: Path, paths: Iterable[Tuple[str, ...]]) -> Dict[Tuple[str, ...], Optional[FacetRule]]:
+        """Return the rules of the given element paths, compiling them on first use.
+
+        Args:
+            schema_path: Path to the main XSD file
+            paths: Element paths as accepted by XSDFacetCompiler.element_rule()
+
+        Returns:
+            Dict of element path -> FacetRule, or None for elements that cannot be checked
+
+        Raises:
+            OSError: If the main XSD cannot be read
+            SchemaImportError: If a schema it imports cannot be loaded
+            etree.XMLSyntaxError: If the main XSD is not well-formed
+        """
+        paths = tuple(tuple(path) for path in paths)
+        key = (str(schema_path), paths)
+        mtime_ns = os.stat(schema_path).st_mtime_ns
+
+        with self._lock:
+            entry = self._tables.get(key)
+            if entry is not None and entry[0] == mtime_ns:
+                return entry[1]
+
+            compiler = XSDFacetCompiler(schema_path)
+            table = {path: compiler.element_rule(path) for path in paths}
+            self._tables[key] = (mtime_ns, table)
+
+        unchecked = ['/'.join(path) for path, rule in table.items() if rule is None or not rule.complete]
+        logger.info(
+            "Compiled XSD facet table",
+            extra={'extra_fields': {
+                'schema_path': str(schema_path),
+                'elements': len(table),
+                'partially_checked': unchecked,
+                'event_type': 'facet_table_compiled'
+            }}
+        )
+        return table
+
+    def clear(self):
+        """Drop all compiled tables."""
+        with self._lock:
+            self._tables.clear()
+
+
+# Shared by all pre-validators in this process
+facet_registry = FacetTableRegistry()